@@ -0,0 +1 @@
+"""Benchmark DMS - chạy bằng: python -m benchmarks.<tên_module>"""
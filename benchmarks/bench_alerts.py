@@ -0,0 +1,106 @@
+"""
+Benchmark: BoDieuPhoiCanhBao - chi phí trên luồng phân tích và độ trễ phân phối
+
+Mô phỏng chuỗi cảnh báo ngẫu nhiên (có chập chờn để kiểm tra gộp) cho cả 4
+AlertType, gửi tới: file JSONL, webhook tới máy chủ HTTP cục bộ dựng tạm
+trong script, và một đích cố tình chậm (kiểm tra hàng đợi có giới hạn không
+làm chậm luồng phân tích hay các đích khác).
+
+Chạy: python -m benchmarks.bench_alerts [--khung 3000] [--cham-ms 50]
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from dms.alerts import BoDieuPhoiCanhBao, DichCanhBao, DichTepJSONL, DichWebhook, SuKienCanhBao
+from dms.constants import AlertType
+
+
+class DichCham(DichCanhBao):
+    ten = "cham"
+
+    def __init__(self, giay: float) -> None:
+        self.giay = giay
+
+    async def gui(self, su_kien: SuKienCanhBao) -> None:
+        await asyncio.sleep(self.giay)
+
+
+def may_chu_webhook() -> tuple:
+    """Máy chủ nhận webhook tạm (đứng thay dịch vụ thật); đếm số POST."""
+    dem = [0]
+
+    class _XuLy(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            dem[0] += 1
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args) -> None:
+            pass
+
+    may_chu = ThreadingHTTPServer(("127.0.0.1", 0), _XuLy)
+    threading.Thread(target=may_chu.serve_forever, daemon=True).start()
+    return may_chu, dem
+
+
+def chuoi_canh_bao(so_khung: int, hat_giong: int = 0) -> np.ndarray:
+    """(so_khung, 4) bool: các đợt cảnh báo dài + nhiễu chập chờn 1-2 khung."""
+    rng = np.random.default_rng(hat_giong)
+    trang_thai = np.zeros((so_khung, len(AlertType)), dtype=bool)
+    for k in range(len(AlertType)):
+        i = 0
+        while i < so_khung:
+            i += int(rng.integers(30, 300))
+            dai = int(rng.integers(15, 200))
+            trang_thai[i:i + dai, k] = True
+            i += dai
+    chap_chon = rng.random(trang_thai.shape) < 0.02
+    return trang_thai ^ chap_chon
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--khung", type=int, default=3000)
+    parser.add_argument("--fps", type=float, default=30.0, help="Nhịp mô phỏng (timestamp)")
+    parser.add_argument("--cham-ms", type=float, default=50.0, help="Thời gian xử lý của đích chậm")
+    parser.add_argument("--suc-chua", type=int, default=8)
+    args = parser.parse_args()
+
+    may_chu, dem_post = may_chu_webhook()
+    url = f"http://127.0.0.1:{may_chu.server_port}/alerts"
+    cac_loai = list(AlertType)
+    trang_thai = chuoi_canh_bao(args.khung)
+    with tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False) as tep:
+        duong_dan = tep.name
+
+    dieu_phoi = BoDieuPhoiCanhBao([DichTepJSONL(duong_dan), DichWebhook(url), DichCham(args.cham_ms / 1000)],
+                                  suc_chua=args.suc_chua)
+    dieu_phoi.bat_dau()
+    chi_phi = np.empty(args.khung)
+    for i, hang in enumerate(trang_thai):
+        dang_bat = [loai for loai, bat in zip(cac_loai, hang) if bat]
+        bat_dau = time.perf_counter()
+        dieu_phoi.cap_nhat(1000.0 + i / args.fps, dang_bat)
+        chi_phi[i] = time.perf_counter() - bat_dau
+        time.sleep(0.0005)
+    dieu_phoi.dong(thoi_gian_cho=5.0)
+    may_chu.shutdown()
+
+    so_canh_cao_tho = int(np.sum(trang_thai[1:] & ~trang_thai[:-1]) + trang_thai[0].sum())
+    print(f"cap_nhat (luồng phân tích): p50 {np.percentile(chi_phi, 50)*1e6:.1f}µs, "
+          f"p99 {np.percentile(chi_phi, 99)*1e6:.1f}µs, max {chi_phi.max()*1e6:.1f}µs")
+    print(f"Cạnh lên thô: {so_canh_cao_tho}; webhook nhận {dem_post[0]} POST; sự kiện ghi ở {duong_dan}")
+    for ten, tk in dieu_phoi.thong_ke().items():
+        print(f"  {ten:<8} gửi {tk['gui']:>4}  bỏ {tk['bo']:>4}  lỗi {tk['loi']:>2}  "
+              f"p50 ≤{tk['p50_ms']:.2f}ms  p99 ≤{tk['p99_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: độ trễ yêu cầu → bắt đầu phát của BoPhatAmThanh
+
+So với cách cũ (mỗi cảnh báo một threading.Thread tự import playsound): đo
+thời gian từ lúc gọi đến lúc luồng phát gọi hậu trường. Với hậu trường null
+chỉ còn chi phí hàng đợi + đánh thức luồng; với thiết bị thật cộng thêm thời
+gian sd.play mở stream (PCM đã giải mã sẵn). Cũng kiểm tra việc gộp yêu cầu.
+
+Chạy: python -m benchmarks.bench_audio [--hau-truong auto] [--am-thanh chiken-on-tree.mp3]
+"""
+
+from __future__ import annotations
+import argparse
+import threading
+import time
+import numpy as np
+from dms.audio import BoPhatAmThanh, HAU_TRUONG_TU_DONG
+from dms.constants import AlertType
+
+
+def do_luong_cu(so_lan: int) -> np.ndarray:
+    """Cách cũ, bỏ phần phát: chỉ chi phí tạo luồng + import đến lúc bắt đầu chạy."""
+    do_tre = []
+    for _ in range(so_lan):
+        bat_dau = time.perf_counter()
+        da_chay = threading.Event()
+
+        def chay() -> None:
+            try:
+                import playsound  # noqa: F401
+            except ImportError:
+                pass
+            do_tre.append(time.perf_counter() - bat_dau)
+            da_chay.set()
+        threading.Thread(target=chay, daemon=True).start()
+        da_chay.wait()
+    return np.asarray(do_tre)
+
+
+def do_luong_moi(hau_truong: str, am_thanh: str, so_lan: int, khoang_cach: float) -> BoPhatAmThanh:
+    bo_phat = BoPhatAmThanh(mac_dinh=am_thanh, hau_truong=hau_truong)
+    bo_phat.bat_dau()
+    try:
+        for i in range(so_lan):
+            bo_phat.phat(list(AlertType)[i % len(AlertType)])
+            time.sleep(khoang_cach)
+        # Dồn dập cùng một loại: chỉ một lần phát, phần còn lại bị gộp
+        for _ in range(50):
+            bo_phat.phat(AlertType.DROWSINESS)
+        time.sleep(0.05)
+    finally:
+        bo_phat.dong()
+    return bo_phat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hau-truong", default="null",
+                        choices=[HAU_TRUONG_TU_DONG, "sounddevice", "playsound", "null"])
+    parser.add_argument("--am-thanh", default="chiken-on-tree.mp3")
+    parser.add_argument("--lan", type=int, default=200)
+    parser.add_argument("--khoang-cach", type=float, default=0.005, help="Giây giữa các yêu cầu")
+    args = parser.parse_args()
+
+    cu = do_luong_cu(args.lan) * 1000
+    print(f"Cũ (thread/cảnh báo): p50 {np.percentile(cu, 50):.3f}ms, p99 {np.percentile(cu, 99):.3f}ms, "
+          f"max {cu.max():.3f}ms")
+    bo_phat = do_luong_moi(args.hau_truong, args.am_thanh, args.lan, args.khoang_cach)
+    print(f"Mới ({bo_phat.ten_hau_truong}): p50 ≤{bo_phat.do_tre.phan_vi(0.5)*1000:.3f}ms, "
+          f"p99 ≤{bo_phat.do_tre.phan_vi(0.99)*1000:.3f}ms, "
+          f"TB {bo_phat.do_tre.tong / max(bo_phat.do_tre.so_mau, 1)*1000:.3f}ms")
+    print(f"  {bo_phat.so_yeu_cau} yêu cầu → {bo_phat.so_da_phat} lần phát, {bo_phat.so_gop} gộp")
+
+
+if __name__ == "__main__":
+    main()
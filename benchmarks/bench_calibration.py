@@ -0,0 +1,109 @@
+"""
+Benchmark: quét lưới ngưỡng (dms.calibration) - vector hóa và nhiều tiến trình
+
+Sinh các chuyến đi giả có nhãn buồn ngủ / ngáp (EAR tụt kéo dài, chớp mắt
+ngắn, mất mặt ngẫu nhiên), rồi so sánh:
+- vòng lặp Python từng khung × từng tổ hợp (cách làm tay) trên một chuyến đi
+- tín hiệu vector hóa cho cả lưới trên cùng chuyến đi
+- hieu_chinh() cho mọi chuyến đi với 1 tiến trình và với --jobs tiến trình
+
+Chạy: python -m benchmarks.bench_calibration [--chuyen 8] [--phut 30] [--jobs 4]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from dms.calibration import LuoiNguong, TIN_HIEU, hieu_chinh, nap_chuyen_di
+from dms.constants import AlertType
+from dms.output import CoKetQua, DTYPE_BAN_GHI
+
+
+def sinh_chuyen_di(thu_muc: str, so_chuyen: int, so_phut: float, fps: float = 30.0) -> list:
+    rng = np.random.default_rng(0)
+    cac_duong_dan = []
+    for k in range(so_chuyen):
+        so_khung = int(so_phut * 60 * fps)
+        ban_ghi = np.zeros(so_khung, dtype=DTYPE_BAN_GHI)
+        ts = 1000.0 + np.arange(so_khung) / fps
+        ear = 0.3 + 0.02 * rng.standard_normal(so_khung)
+        mar = 0.5 + 0.1 * rng.standard_normal(so_khung)
+        nhan = {'DROWSINESS': [], 'YAWN': []}
+        for _ in range(int(so_phut / 2)):
+            i, dai = int(rng.integers(0, so_khung - 300)), int(rng.integers(20, 120))
+            ear[i:i + dai] = 0.16 + 0.02 * rng.standard_normal(dai)
+            nhan['DROWSINESS'].append([ts[i], ts[i + dai - 1]])
+        for _ in range(int(so_phut * 2)):  # Chớp mắt: không phải buồn ngủ
+            i = int(rng.integers(0, so_khung - 10))
+            ear[i:i + int(rng.integers(2, 8))] = 0.12
+        for _ in range(int(so_phut / 4)):
+            i, dai = int(rng.integers(0, so_khung - 300)), int(rng.integers(60, 150))
+            mar[i:i + dai] = 1.2 + 0.3 * rng.random()
+            nhan['YAWN'].append([ts[i], ts[i + dai - 1]])
+        co_mat = rng.random(so_khung) > 0.02
+        ban_ghi['timestamp'] = ts
+        ban_ghi['ear'] = np.where(co_mat, ear, 0.0)
+        ban_ghi['mar'] = np.where(co_mat, mar, 0.0)
+        ban_ghi['co'] = np.where(co_mat, int(CoKetQua.MAT_PHAT_HIEN), 0)
+        duong_dan = os.path.join(thu_muc, f"chuyen_{k}.bin")
+        ban_ghi.tofile(duong_dan)
+        with open(os.path.join(thu_muc, f"chuyen_{k}.labels.json"), "w") as tep:
+            json.dump(nhan, tep)
+        cac_duong_dan.append(duong_dan)
+    return cac_duong_dan
+
+
+def vong_lap_python(ban_ghi: np.ndarray, to_hop: np.ndarray) -> np.ndarray:
+    """Như PhanTichMat: mốc đầu chuỗi EAR thấp, cảnh báo khi kéo dài ≥ thoi_gian_ear."""
+    ts, ear = ban_ghi['timestamp'].tolist(), ban_ghi['ear'].tolist()
+    co_mat = ((ban_ghi['co'] & 1) != 0).tolist()
+    ket_qua = np.zeros((len(to_hop), len(ban_ghi)), dtype=bool)
+    for g, (nguong, thoi_gian) in enumerate(to_hop.tolist()):
+        thap_tu = None
+        for t in range(len(ear)):
+            if co_mat[t] and ear[t] < nguong:
+                thap_tu = ts[t] if thap_tu is None else thap_tu
+                ket_qua[g, t] = ts[t] - thap_tu >= thoi_gian
+            else:
+                thap_tu = None
+    return ket_qua
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chuyen", type=int, default=8)
+    parser.add_argument("--phut", type=float, default=30.0)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    luoi = LuoiNguong()
+    with tempfile.TemporaryDirectory() as thu_muc:
+        cac_duong_dan = sinh_chuyen_di(thu_muc, args.chuyen, args.phut)
+        ban_ghi, _ = nap_chuyen_di(cac_duong_dan[0])
+        to_hop = luoi.to_hop(AlertType.DROWSINESS)
+        print(f"{args.chuyen} chuyến × {args.phut:g} phút, lưới buồn ngủ {len(to_hop)} tổ hợp")
+
+        mau = to_hop[::max(1, len(to_hop) // 8)]  # Vòng lặp Python chậm: đo trên 1/8 lưới rồi nhân lên
+        bat_dau = time.perf_counter()
+        tham_chieu = vong_lap_python(ban_ghi, mau)
+        python_s = (time.perf_counter() - bat_dau) * len(to_hop) / len(mau)
+        bat_dau = time.perf_counter()
+        tin_hieu = TIN_HIEU[AlertType.DROWSINESS](ban_ghi, luoi)
+        vector_s = time.perf_counter() - bat_dau
+        assert np.array_equal(tin_hieu[::max(1, len(to_hop) // 8)], tham_chieu)
+        print(f"Tín hiệu 1 chuyến: Python ~{python_s:.1f}s (ước lượng), vector {vector_s*1000:.1f}ms "
+              f"(×{python_s / vector_s:.0f}), kết quả khớp")
+
+        for so_tien_trinh in sorted({1, args.jobs}):
+            bat_dau = time.perf_counter()
+            ket_qua = hieu_chinh(cac_duong_dan, luoi, so_tien_trinh)
+            print(f"hieu_chinh, {so_tien_trinh} tiến trình: {time.perf_counter() - bat_dau:.2f}s")
+        kq = ket_qua[AlertType.DROWSINESS]
+        print(f"Tốt nhất: {kq.dong(int(kq.tot_nhat(1)[0]))}")
+
+
+if __name__ == "__main__":
+    main()
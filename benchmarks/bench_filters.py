@@ -0,0 +1,67 @@
+"""
+Benchmark: BoLocOneEuroNhieuKenh (list các bộ lọc vô hướng) vs BoLocOneEuroVector
+
+Kiểm tra kết quả trùng khớp với bộ lọc vô hướng rồi đo µs/khung cho
+3 kênh (pose), 2×21×3 (landmark tay) và 478×3 (landmark mặt).
+
+Chạy: python -m benchmarks.bench_filters [--khung 300]
+"""
+
+from __future__ import annotations
+import argparse
+import time
+import numpy as np
+from dms.filters import BoLocOneEuroNhieuKenh, BoLocOneEuroVector
+
+CAC_KICH_THUOC = {"pose (3)": (3,), "tay (2x21x3)": (2, 21, 3), "mat (478x3)": (478, 3)}
+
+
+def tao_chuoi(hinh_dang: tuple, so_khung: int, hat_giong: int = 0):
+    """Tín hiệu nhiễu + bước nhảy, timestamp giãn cách không đều (20-60ms)."""
+    rng = np.random.default_rng(hat_giong)
+    ts = 1000.0 + np.cumsum(rng.uniform(0.02, 0.06, so_khung))
+    tin_hieu = np.cumsum(rng.normal(0.0, 0.01, (so_khung,) + hinh_dang), axis=0)
+    tin_hieu[so_khung // 2:] += 0.5
+    return ts, tin_hieu
+
+
+def kiem_tra_trung_khop(hinh_dang: tuple, so_khung: int) -> float:
+    ts, tin_hieu = tao_chuoi(hinh_dang, so_khung)
+    so_kenh = int(np.prod(hinh_dang))
+    vo_huong, vector = BoLocOneEuroNhieuKenh(so_kenh), BoLocOneEuroVector(so_kenh)
+    sai_lech = 0.0
+    for t, x in zip(ts, tin_hieu):
+        a = np.asarray(vo_huong.loc(x.ravel().tolist(), t)).reshape(hinh_dang)
+        b = vector.loc(x, t)
+        sai_lech = max(sai_lech, float(np.abs(a - b).max()))
+    return sai_lech
+
+
+def do(bo_loc, du_lieu, ts) -> float:
+    bat_dau = time.perf_counter()
+    for t, x in zip(ts, du_lieu):
+        bo_loc.loc(x, t)
+    return (time.perf_counter() - bat_dau) / len(ts) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--khung", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'Kích thước':<16}{'sai lệch max':>14}{'vô hướng µs':>14}{'vector µs':>12}{'tăng tốc':>10}")
+    for ten, hinh_dang in CAC_KICH_THUOC.items():
+        sai_lech = kiem_tra_trung_khop(hinh_dang, min(args.khung, 100))
+        if not sai_lech < 1e-12:
+            raise SystemExit(f"{ten}: lệch {sai_lech}")
+        ts, tin_hieu = tao_chuoi(hinh_dang, args.khung)
+        so_kenh = int(np.prod(hinh_dang))
+        danh_sach = [x.ravel().tolist() for x in tin_hieu]
+        t_vo_huong = do(BoLocOneEuroNhieuKenh(so_kenh), danh_sach, ts)
+        t_vector = do(BoLocOneEuroVector(so_kenh), tin_hieu, ts)
+        print(f"{ten:<16}{sai_lech:>14.1e}{t_vo_huong:>14.1f}{t_vector:>12.1f}"
+              f"{t_vo_huong/t_vector:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: các solver tư thế đầu của BoUocLuongTuThe
+
+Chuỗi tư thế tổng hợp (quay đầu chậm, mượt) chiếu qua camera giả lập, thêm
+nhiễu pixel và nhiễu z như landmark thật. Với mỗi solver đo µs/khung, sai số
+góc so với ground truth và độ rung khung-khung (jitter) trước bộ lọc.
+
+Chạy: python -m benchmarks.bench_head_pose [--khung 600] [--nhieu 0.8]
+"""
+
+from __future__ import annotations
+import argparse
+import time
+import cv2
+import numpy as np
+from dms.constants import DIEM_MAT_3D
+from dms.head_pose import BoUocLuongTuThe, PhuongPhapPnP
+
+CHIEU_RONG, CHIEU_CAO = 1280, 720
+
+
+def tao_chuoi(so_khung: int, nhieu_px: float, hat_giong: int = 0):
+    """
+    Trả về (góc thật (N,3) độ, điểm pixel (N,6,2), landmark chuẩn hóa (N,6,3)).
+    Tư thế là tổng các sóng sin chậm: pitch ±15°, yaw ±30°, roll ±10°.
+    """
+    rng = np.random.default_rng(hat_giong)
+    t = np.arange(so_khung) / 30.0
+    goc = np.stack([15*np.sin(0.4*t), 30*np.sin(0.25*t + 1), 10*np.sin(0.3*t + 2)], axis=1)
+    f = float(CHIEU_RONG)
+    c = np.array([CHIEU_RONG/2, CHIEU_CAO/2])
+    diem_px = np.empty((so_khung, 6, 2))
+    diem_3d = np.empty((so_khung, 6, 3))
+    for i, (pitch, yaw, roll) in enumerate(np.radians(goc)):
+        ma_tran_quay = _quay_euler(pitch, yaw, roll)
+        cam = DIEM_MAT_3D @ ma_tran_quay.T + (0.0, 0.0, 6000.0 + 300*np.sin(0.2*t[i]))
+        diem_px[i] = f * cam[:, :2] / cam[:, 2:] + c
+        # z kiểu MediaPipe: độ sâu tương đối, cùng thang với x (đơn vị chiều rộng ảnh)
+        sau = cam[:, 2].mean()
+        diem_3d[i, :, 2] = f * (cam[:, 2] - sau) / sau / CHIEU_RONG
+    diem_px += rng.normal(0.0, nhieu_px, diem_px.shape)
+    diem_3d[:, :, 0] = diem_px[:, :, 0] / CHIEU_RONG
+    diem_3d[:, :, 1] = diem_px[:, :, 1] / CHIEU_CAO
+    diem_3d[:, :, 2] += rng.normal(0.0, 2 * nhieu_px / CHIEU_RONG, (so_khung, 6))
+    return goc, diem_px, diem_3d
+
+
+def _quay_euler(pitch: float, yaw: float, roll: float) -> np.ndarray:
+    """Nghịch đảo của BoUocLuongTuThe.goc_euler: R = Rz(yaw) · Ry(pitch) · Rx(roll)."""
+    cx, sx = np.cos(roll), np.sin(roll)
+    cy, sy = np.cos(pitch), np.sin(pitch)
+    cz, sz = np.cos(yaw), np.sin(yaw)
+    rx = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    ry = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rz = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+def _lech_goc(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Hiệu góc quấn về [-180, 180) để roll quanh ±180 không bị tính là 360."""
+    return (a - b + 180.0) % 360.0 - 180.0
+
+
+def chay(bo_uoc_luong: BoUocLuongTuThe, diem_px, diem_3d):
+    goc = np.empty((len(diem_px), 3))
+    bat_dau = time.perf_counter()
+    for i in range(len(diem_px)):
+        tu_the = bo_uoc_luong.uoc_luong(diem_px[i], CHIEU_RONG, CHIEU_CAO, diem_3d[i])
+        goc[i] = tu_the.pitch, tu_the.yaw, tu_the.roll
+    return (time.perf_counter() - bat_dau) / len(diem_px) * 1e6, goc
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--khung", type=int, default=600)
+    parser.add_argument("--nhieu", type=float, default=0.8, help="Độ lệch chuẩn nhiễu pixel")
+    args = parser.parse_args()
+    cv2.setNumThreads(1)
+
+    goc_that, diem_px, diem_3d = tao_chuoi(args.khung, args.nhieu)
+    cac_cau_hinh = [("iterative (lạnh)", BoUocLuongTuThe(PhuongPhapPnP.ITERATIVE, khoi_dong_am=False)),
+                    ("iterative (ấm)", BoUocLuongTuThe(PhuongPhapPnP.ITERATIVE))]
+    cac_cau_hinh += [(p.value, BoUocLuongTuThe(p)) for p in PhuongPhapPnP if p is not PhuongPhapPnP.ITERATIVE]
+
+    print(f"{args.khung} khung {CHIEU_RONG}x{CHIEU_CAO}, nhiễu {args.nhieu}px")
+    print(f"{'Solver':<18}{'µs/khung':>10}{'sai số TB °':>13}{'sai số max °':>14}{'jitter °':>10}")
+    for ten, bo_uoc_luong in cac_cau_hinh:
+        chay(bo_uoc_luong, diem_px[:20], diem_3d[:20])  # làm nóng
+        bo_uoc_luong.dat_lai()
+        thoi_gian, goc = chay(bo_uoc_luong, diem_px, diem_3d)
+        sai_so = np.abs(_lech_goc(goc, goc_that))
+        # Jitter = rung khung-khung vượt quá chuyển động thật
+        jitter = np.abs(_lech_goc(np.diff(goc, axis=0), np.diff(goc_that, axis=0)))
+        print(f"{ten:<18}{thoi_gian:>10.1f}{sai_so.mean():>13.2f}{sai_so.max():>14.2f}"
+              f"{jitter.mean():>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Micro-benchmark: chi phí hình học landmark mỗi khung (bbox, EAR, MAR, điểm PnP)
+
+So sánh cách cũ (duyệt proto bằng Python, np.array từng điểm, norm từng cặp)
+với đường vector hóa trên mảng (478, 3) float32 của PhanTichMat.
+Không cần camera hay mô hình MediaPipe: landmark được sinh ngẫu nhiên.
+DanhSachGiaLap trả bytes serialize dựng sẵn (protobuf thật serialize bằng C,
+vài µs cho 478 điểm) nên số "đọc bytes" là cận dưới.
+
+Chạy: python -m benchmarks.bench_landmarks [--lap 5000]
+"""
+
+from __future__ import annotations
+import argparse
+import struct
+import time
+from types import SimpleNamespace
+from typing import Callable, List
+import numpy as np
+from dms.constants import CHI_SO_MAT_PHAI, CHI_SO_MAT_TRAI, CHI_SO_MIENG_NGOAI, CHI_SO_TU_THE
+from dms.face_analysis import PhanTichMat, SO_DIEM_MOC_TOI_DA
+
+CHIEU_RONG, CHIEU_CAO = 640, 480
+
+
+class DanhSachGiaLap:
+    """Giả lập NormalizedLandmarkList: .landmark và SerializeToString()."""
+
+    def __init__(self, diem: np.ndarray) -> None:
+        self.landmark = [SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in diem]
+        self._bytes = b"".join(struct.pack('<BBBfBfBf', 0x0A, 15, 0x0D, x, 0x15, y, 0x1D, z)
+                               for x, y, z in diem)
+
+    def SerializeToString(self) -> bytes:
+        return self._bytes
+
+
+def tao_diem_moc(so_diem: int = SO_DIEM_MOC_TOI_DA, hat_giong: int = 0) -> DanhSachGiaLap:
+    rng = np.random.default_rng(hat_giong)
+    return DanhSachGiaLap(rng.uniform(0.2, 0.8, size=(so_diem, 3)).astype(np.float32))
+
+
+# ---------- Cách cũ (trước khi vector hóa) ----------
+
+def _trich_xuat(diem_moc, chi_so) -> List[np.ndarray]:
+    return [np.array([diem_moc[i].x*CHIEU_RONG, diem_moc[i].y*CHIEU_CAO]) for i in chi_so]
+
+
+def _tinh_ear(mat: List[np.ndarray]) -> float:
+    A = np.linalg.norm(mat[1] - mat[5])
+    B = np.linalg.norm(mat[2] - mat[4])
+    C = np.linalg.norm(mat[0] - mat[3])
+    return (A + B) / (2.0 * C) if C > 0 else 0.0
+
+
+def _tinh_mar(mieng: List[np.ndarray]) -> float:
+    A = np.linalg.norm(mieng[1] - mieng[7])
+    B = np.linalg.norm(mieng[2] - mieng[6])
+    C = np.linalg.norm(mieng[3] - mieng[5])
+    D = np.linalg.norm(mieng[0] - mieng[4])
+    return (A + B + C) / (2.0 * D) if D > 0 else 0.0
+
+
+def cach_cu(diem_moc) -> tuple:
+    xs, ys = [l.x for l in diem_moc], [l.y for l in diem_moc]
+    bbox = (min(xs), max(xs), min(ys), max(ys))
+    ear = (_tinh_ear(_trich_xuat(diem_moc, CHI_SO_MAT_PHAI)) +
+           _tinh_ear(_trich_xuat(diem_moc, CHI_SO_MAT_TRAI))) / 2
+    mar = _tinh_mar(_trich_xuat(diem_moc, CHI_SO_MIENG_NGOAI))
+    diem_chieu = np.array([[diem_moc[i].x*CHIEU_RONG, diem_moc[i].y*CHIEU_CAO]
+                           for i in CHI_SO_TU_THE], dtype=np.float64)
+    return bbox, ear, mar, diem_chieu
+
+
+# ---------- Cách mới ----------
+
+_DICH = np.zeros((SO_DIEM_MOC_TOI_DA, 3), dtype=np.float32, order='F')
+
+
+def chi_hinh_hoc(mang: np.ndarray) -> tuple:
+    bbox = PhanTichMat._khung_bbox(mang)
+    _, _, ear, mar, diem_chieu = PhanTichMat._hinh_hoc(mang, CHIEU_RONG, CHIEU_CAO)
+    return bbox, ear, mar, diem_chieu
+
+
+def cach_moi(danh_sach) -> tuple:
+    """Đọc bytes đã serialize → mảng → hình học vector hóa."""
+    return chi_hinh_hoc(PhanTichMat._nap_diem_moc(danh_sach, _DICH))
+
+
+def cach_moi_duyet(danh_sach) -> tuple:
+    """Đường dự phòng: duyệt .x/.y/.z theo cột (landmark có visibility/presence)."""
+    return chi_hinh_hoc(PhanTichMat._nap_diem_moc(danh_sach.landmark, _DICH))
+
+
+def do(ham: Callable, doi_so, so_lap: int) -> float:
+    """Trung vị µs/khung qua 5 lượt."""
+    ket_qua = []
+    for _ in range(5):
+        bat_dau = time.perf_counter()
+        for _ in range(so_lap):
+            ham(doi_so)
+        ket_qua.append((time.perf_counter() - bat_dau) / so_lap * 1e6)
+    return float(np.median(ket_qua))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lap", type=int, default=2000, help="Số khung mỗi lượt")
+    args = parser.parse_args()
+
+    danh_sach = tao_diem_moc()
+    cu = cach_cu(danh_sach.landmark)
+    for moi in (cach_moi(danh_sach), cach_moi_duyet(danh_sach)):
+        assert np.allclose(cu[0], tuple(moi[0]), atol=1e-6)  # KhungBbox: (x_min, x_max, y_min, y_max)
+        assert abs(cu[1] - moi[1]) < 1e-4 and abs(cu[2] - moi[2]) < 1e-4
+        assert np.allclose(cu[3], moi[3], atol=1e-3)
+
+    t_cu = do(cach_cu, danh_sach.landmark, args.lap)
+    cac_dong = [
+        ("Cũ (duyệt proto, từng điểm)", t_cu),
+        ("Mới, đọc bytes serialize", do(cach_moi, danh_sach, args.lap)),
+        ("Mới, duyệt theo cột", do(cach_moi_duyet, danh_sach, args.lap)),
+        ("Mới, chỉ hình học trên mảng", do(chi_hinh_hoc, _DICH, args.lap)),
+    ]
+    print(f"{'Cách':<34}{'µs/khung':>10}{'tăng tốc':>10}")
+    for ten, t in cac_dong:
+        print(f"{ten:<34}{t:>10.1f}{t_cu/t:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
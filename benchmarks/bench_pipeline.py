@@ -0,0 +1,277 @@
+"""
+Benchmark: toàn bộ HeThongGiamSatTaiXe._xu_ly, theo từng giai đoạn
+
+Chạy _xu_ly trên video ghi sẵn (giải mã trước vào RAM để không tính thời gian
+decode), trên một ảnh có mặt (lặp lại với dịch vài pixel + nhiễu) hoặc trên khung
+tổng hợp, ở nhiều độ phân giải. Khung tổng hợp không có mặt: FaceMesh chỉ chạy
+bộ dò rồi trả về, giai đoạn mat / tu_the gần như rỗng - chỉ dùng để thử nhanh.
+Tỉ lệ khung có mặt (ti_le_co_mat) được ghi cùng kết quả; baseline chỉ lưu được
+khi mọi cấu hình có mặt ở phần lớn khung.
+
+Mỗi độ phân giải chạy trong một tiến trình con riêng (spawn): ru_maxrss là
+đỉnh của cả tiến trình và không bao giờ giảm, đo chung một tiến trình thì cấu
+hình sau chỉ lặp lại đỉnh lớn nhất trước đó.
+
+Báo cáo p50/p95/p99 từng giai đoạn (clahe, mat, tu_the, tay, canh_bao, ve, tong),
+khung/s, RSS đỉnh và số cấp phát bộ đệm mỗi khung; ghi JSON và so với baseline.
+
+Chạy:
+    python -m benchmarks.bench_pipeline --video chuyen_di.mp4 --do-phan-giai 640x480 1280x720
+    python -m benchmarks.bench_pipeline --anh tai_xe.jpg --ket-qua ket_qua.json
+    python -m benchmarks.bench_pipeline --video chuyen_di.mp4 --luu-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --video chuyen_di.mp4 --baseline benchmarks/baseline.json --nguong 0.15
+Mã thoát 1 nếu có giai đoạn chậm hơn baseline quá ngưỡng, hoặc tỉ lệ khung có
+mặt khác baseline (đo hai đường xử lý khác nhau thì không so được).
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from main import HeThongGiamSatTaiXe
+
+PHAN_VI = (50, 95, 99)
+GIAI_DOAN = ('clahe', 'mat', 'tu_the', 'tay', 'canh_bao', 've', 'tong')  # tu_the nằm trong mat
+TI_LE_CO_MAT_TOI_THIEU = 0.5  # Dưới mức này kết quả chủ yếu đo đường "dò không thấy"
+CHENH_LECH_CO_MAT_TOI_DA = 0.2  # Lệch tỉ lệ có mặt so với baseline hơn mức này → không so được
+
+
+def phan_tich_do_phan_giai(chuoi: str) -> Tuple[int, int]:
+    rong, cao = chuoi.lower().split('x')
+    return int(rong), int(cao)
+
+
+def khung_tong_hop(chieu_rong: int, chieu_cao: int, so_khung: int, hat_giong: int = 0) -> List[np.ndarray]:
+    """Vài khung khác nhau (gradient + nhiễu) lặp vòng - đủ để CLAHE/FaceMesh không cache được."""
+    rng = np.random.default_rng(hat_giong)
+    gradient = np.linspace(20, 200, chieu_rong, dtype=np.float32)[None, :, None]
+    danh_sach = []
+    for _ in range(min(so_khung, 8)):
+        nhieu = rng.normal(0, 25, (chieu_cao, chieu_rong, 3)).astype(np.float32)
+        danh_sach.append(np.clip(gradient + nhieu, 0, 255).astype(np.uint8))
+    return danh_sach
+
+
+def khung_tu_video(duong_dan: str, so_khung: int) -> List[np.ndarray]:
+    may_quay = cv2.VideoCapture(duong_dan)
+    if not may_quay.isOpened():
+        raise SystemExit(f"Không thể mở video {duong_dan}")
+    danh_sach = []
+    while len(danh_sach) < so_khung:
+        thanh_cong, khung_hinh = may_quay.read()
+        if not thanh_cong:
+            break
+        danh_sach.append(khung_hinh)
+    may_quay.release()
+    if not danh_sach:
+        raise SystemExit(f"Video rỗng: {duong_dan}")
+    return danh_sach
+
+
+def khung_tu_anh(duong_dan: str, chieu_rong: int, chieu_cao: int,
+                 so_khung: int, hat_giong: int = 0) -> List[np.ndarray]:
+    """
+    Ảnh có mặt, resize về độ phân giải đo, lặp thành vài khung dịch ±4 px + nhiễu nhẹ:
+    FaceMesh đi đường bám landmark như video thật nhưng không nhận được khung y hệt.
+    """
+    anh = cv2.imread(duong_dan)
+    if anh is None:
+        raise SystemExit(f"Không thể đọc ảnh {duong_dan}")
+    anh = cv2.resize(anh, (chieu_rong, chieu_cao), interpolation=cv2.INTER_AREA).astype(np.int16)
+    rng = np.random.default_rng(hat_giong)
+    danh_sach = []
+    for _ in range(min(so_khung, 8)):
+        dx, dy = rng.integers(-4, 5, size=2)
+        dich = np.roll(anh, (int(dy), int(dx)), axis=(0, 1))
+        nhieu = rng.integers(-3, 4, size=dich.shape, dtype=np.int16)
+        danh_sach.append(np.clip(dich + nhieu, 0, 255).astype(np.uint8))
+    return danh_sach
+
+
+def rss_dinh_mb() -> float:
+    """ru_maxrss: KB trên Linux, byte trên macOS."""
+    dinh = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return dinh / (1024 * 1024) if sys.platform == 'darwin' else dinh / 1024
+
+
+def chay_mot_cau_hinh(danh_sach_khung: List[np.ndarray], so_khung: int, so_khung_lam_nong: int,
+                      ve: bool, tuy_chon: dict) -> dict:
+    thoi_gian: Dict[str, List[float]] = defaultdict(list)
+    dang_do = [False]
+
+    def ghi(giai_doan: str, giay: float) -> None:
+        if dang_do[0]:
+            thoi_gian[giai_doan].append(giay * 1000)
+
+    he_thong = HeThongGiamSatTaiXe(hien_thi=ve, do_giai_doan=ghi, **tuy_chon)
+    cap_phat = []
+    so_khung_co_mat = 0
+    try:
+        ts = 1000.0
+        bat_dau = 0.0
+        for i in range(so_khung_lam_nong + so_khung):
+            if i == so_khung_lam_nong:
+                dang_do[0] = True
+                bat_dau = time.perf_counter()
+            dau_ra = he_thong._xu_ly(danh_sach_khung[i % len(danh_sach_khung)], ts)
+            he_thong._tra_sau_hien_thi(dau_ra)
+            if dang_do[0]:
+                cap_phat.append(he_thong._be_bo_dem.cap_phat_khung_cuoi)
+                so_khung_co_mat += he_thong._ket_qua_mat.mat_phat_hien
+            ts += 1 / 30
+        tong = time.perf_counter() - bat_dau
+    finally:
+        he_thong._phan_tich_mat.release()
+        he_thong._theo_doi_tay.release()
+
+    giai_doan = {}
+    for ten in GIAI_DOAN:
+        if thoi_gian.get(ten):
+            mau = np.asarray(thoi_gian[ten])
+            giai_doan[ten] = {f"p{p}": float(v) for p, v in zip(PHAN_VI, np.percentile(mau, PHAN_VI))}
+            giai_doan[ten]['tb'] = float(mau.mean())
+            giai_doan[ten]['so_mau'] = int(mau.size)
+    return {
+        'giai_doan_ms': giai_doan,
+        'khung_moi_giay': so_khung / tong,
+        'rss_dinh_mb': rss_dinh_mb(),
+        'cap_phat_moi_khung': float(np.mean(cap_phat)) if cap_phat else 0.0,
+        'ti_le_co_mat': so_khung_co_mat / so_khung,
+    }
+
+
+def do_cau_hinh(chuoi: str, video: Optional[str], anh: Optional[str], so_khung: int,
+                so_khung_lam_nong: int, ve: bool, tuy_chon: dict) -> dict:
+    """Một độ phân giải, chạy trong tiến trình con riêng: tự nạp khung, RSS đỉnh chỉ của cấu hình này."""
+    logging.getLogger().setLevel(logging.WARNING)
+    chieu_rong, chieu_cao = phan_tich_do_phan_giai(chuoi)
+    if video:
+        danh_sach = [cv2.resize(k, (chieu_rong, chieu_cao), interpolation=cv2.INTER_AREA)
+                     for k in khung_tu_video(video, so_khung)]
+    elif anh:
+        danh_sach = khung_tu_anh(anh, chieu_rong, chieu_cao, so_khung)
+    else:
+        danh_sach = khung_tong_hop(chieu_rong, chieu_cao, so_khung)
+    return chay_mot_cau_hinh(danh_sach, so_khung, so_khung_lam_nong, ve, tuy_chon)
+
+
+def thong_tin_may() -> dict:
+    return {
+        'python': platform.python_version(),
+        'he_dieu_hanh': platform.platform(),
+        'cpu': platform.processor() or platform.machine(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'thoi_diem': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def so_sanh(ket_qua: dict, baseline: dict, nguong: float, san_ms: float = 0.1) -> List[str]:
+    """
+    Danh sách hồi quy: p50/p95 chậm hơn hoặc khung/s thấp hơn baseline quá nguong (tỉ lệ).
+    Chênh lệch dưới san_ms bị bỏ qua - giai đoạn vài chục µs dao động >10% là nhiễu.
+    """
+    hoi_quy = []
+    for cau_hinh, moi in ket_qua['cau_hinh'].items():
+        cu = baseline.get('cau_hinh', {}).get(cau_hinh)
+        if cu is None:
+            continue
+        co_mat_cu = cu.get('ti_le_co_mat')
+        if co_mat_cu is not None and abs(moi['ti_le_co_mat'] - co_mat_cu) > CHENH_LECH_CO_MAT_TOI_DA:
+            hoi_quy.append(f"{cau_hinh} tỉ lệ khung có mặt {co_mat_cu:.0%} → {moi['ti_le_co_mat']:.0%}: "
+                           f"nguồn khung khác baseline, không so được thời gian")
+            continue
+        for ten, so_lieu in moi['giai_doan_ms'].items():
+            for phan_vi in ('p50', 'p95'):
+                gia_tri_cu = cu['giai_doan_ms'].get(ten, {}).get(phan_vi)
+                if gia_tri_cu and so_lieu[phan_vi] > gia_tri_cu * (1 + nguong) \
+                        and so_lieu[phan_vi] - gia_tri_cu >= san_ms:
+                    hoi_quy.append(f"{cau_hinh} {ten} {phan_vi}: {gia_tri_cu:.2f} → "
+                                   f"{so_lieu[phan_vi]:.2f} ms (+{so_lieu[phan_vi]/gia_tri_cu - 1:.0%})")
+        if moi['khung_moi_giay'] < cu['khung_moi_giay'] * (1 - nguong):
+            hoi_quy.append(f"{cau_hinh} khung/s: {cu['khung_moi_giay']:.1f} → {moi['khung_moi_giay']:.1f}")
+    return hoi_quy
+
+
+def in_bang(ket_qua: dict) -> None:
+    for cau_hinh, so_lieu in ket_qua['cau_hinh'].items():
+        print(f"\n{cau_hinh}: {so_lieu['khung_moi_giay']:.1f} khung/s, RSS đỉnh {so_lieu['rss_dinh_mb']:.0f} MB, "
+              f"cấp phát/khung {so_lieu['cap_phat_moi_khung']:.2f}, có mặt {so_lieu['ti_le_co_mat']:.0%} khung")
+        print(f"  {'giai đoạn':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'TB ms':>9}")
+        for ten, pv in so_lieu['giai_doan_ms'].items():
+            print(f"  {ten:<10}{pv['p50']:>9.2f}{pv['p95']:>9.2f}{pv['p99']:>9.2f}{pv['tb']:>9.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    nguon = parser.add_mutually_exclusive_group()
+    nguon.add_argument("--video", default=None, help="Video ghi sẵn có mặt tài xế")
+    nguon.add_argument("--anh", default=None, help="Ảnh có mặt, lặp lại với dịch / nhiễu nhẹ")
+    parser.add_argument("--do-phan-giai", nargs="+", default=["640x480", "1280x720"],
+                        help="Độ phân giải RỘNGxCAO; với --video, khung được resize")
+    parser.add_argument("--khung", type=int, default=300)
+    parser.add_argument("--lam-nong", type=int, default=30)
+    parser.add_argument("--khong-ve", action="store_true", help="Bỏ giai đoạn vẽ lớp phủ (như headless)")
+    parser.add_argument("--clahe-thich-ung", action="store_true")
+    parser.add_argument("--lap-lich", action="store_true", help="Bật BoLapLich")
+    parser.add_argument("--ket-qua", default=None, help="Ghi kết quả JSON")
+    parser.add_argument("--baseline", default=None, help="JSON baseline để so sánh")
+    parser.add_argument("--luu-baseline", default=None, help="Ghi kết quả làm baseline mới")
+    parser.add_argument("--nguong", type=float, default=0.10, help="Ngưỡng hồi quy (0.10 = chậm hơn 10%%)")
+    parser.add_argument("--san-ms", type=float, default=0.1, help="Bỏ qua chênh lệch nhỏ hơn (ms)")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    tuy_chon = {'clahe_thich_ung': args.clahe_thich_ung, 'lap_lich_thich_ung': args.lap_lich}
+    ket_qua = {'may': thong_tin_may(), 'nguon': args.video or args.anh or 'tong_hop',
+               'tuy_chon': {**tuy_chon, 've': not args.khong_ve, 'khung': args.khung},
+               'cau_hinh': {}}
+    ngu_canh_con = multiprocessing.get_context('spawn')
+    for chuoi in args.do_phan_giai:
+        phan_tich_do_phan_giai(chuoi)  # Sai cú pháp thì dừng trước khi sinh tiến trình con
+        print(f"Đang đo {chuoi} ({args.khung} khung)...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=ngu_canh_con) as tien_trinh:
+            ket_qua['cau_hinh'][chuoi] = tien_trinh.submit(
+                do_cau_hinh, chuoi, args.video, args.anh, args.khung, args.lam_nong,
+                not args.khong_ve, tuy_chon).result()
+
+    in_bang(ket_qua)
+    khong_mat = [chuoi for chuoi, so_lieu in ket_qua['cau_hinh'].items()
+                 if so_lieu['ti_le_co_mat'] < TI_LE_CO_MAT_TOI_THIEU]
+    if khong_mat:
+        print(f"\nCảnh báo: {', '.join(khong_mat)} có mặt ở dưới {TI_LE_CO_MAT_TOI_THIEU:.0%} khung - "
+              f"giai đoạn mat / tu_the chủ yếu đo đường dò không thấy. Dùng --video hoặc --anh có mặt.",
+              file=sys.stderr)
+    if args.ket_qua:
+        Path(args.ket_qua).write_text(json.dumps(ket_qua, indent=2, ensure_ascii=False), encoding='utf-8')
+    if args.luu_baseline:
+        if khong_mat:
+            print(f"Không lưu baseline {args.luu_baseline}: khung đo không có mặt", file=sys.stderr)
+            return 1
+        Path(args.luu_baseline).write_text(json.dumps(ket_qua, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        hoi_quy = so_sanh(ket_qua, baseline, args.nguong, args.san_ms)
+        if hoi_quy:
+            print(f"\nHồi quy so với {args.baseline} (ngưỡng {args.nguong:.0%}):")
+            for dong in hoi_quy:
+                print(f"  {dong}")
+            return 1
+        print(f"\nKhông có hồi quy so với {args.baseline} (ngưỡng {args.nguong:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,20 +2,159 @@
 Gói Hệ Thống Giám Sát Tài Xế (DMS)
 
 Hệ thống giám sát tài xế thời gian thực cấp sản phẩm sử dụng OpenCV và MediaPipe.
+
+Nạp lười (PEP 562): `import dms` không nạp cv2/MediaPipe hay module con nào;
+mỗi tên trong __all__ (và hằng số của constants) chỉ nạp module của nó ở lần
+truy cập đầu tiên.
 """
 
-from .preprocessing import TienXuLyCLAHE
-from .filters import BoLocOneEuro
-from .face_analysis import PhanTichMat
-from .hand_tracking import TheoDoiTay
-from .visualization import TraoDuaTinhNang
-from .constants import *
+from __future__ import annotations
+import importlib
+from typing import TYPE_CHECKING
+
+# Tên xuất → module con
+_MO_DUN: dict = {
+    "TienXuLyCLAHE": "preprocessing",
+    "BoLocOneEuro": "filters",
+    "BoLocOneEuroVector": "filters",
+    "PhanTichMat": "face_analysis",
+    "BoUocLuongTuThe": "head_pose",
+    "NoiTaiCamera": "head_pose",
+    "PhuongPhapPnP": "head_pose",
+    "TheoDoiTay": "hand_tracking",
+    "KetQuaPhanTichMat": "results",
+    "KetQuaTheoDoiTay": "results",
+    "TraoDuaTinhNang": "visualization",
+    "NguCanhKhungHinh": "frame_context",
+    "BeBoDem": "buffer_pool",
+    "BoDoLuong": "metrics",
+    "BieuDoTanSuat": "metrics",
+    "MayChuDoLuong": "metrics",
+    "BoGhiKetQua": "output",
+    "DinhDangDauRa": "output",
+    "DTYPE_BAN_GHI": "output",
+    "BoGhiHopDen": "black_box",
+    "BoDocHopDen": "black_box",
+    "DTYPE_BAN_GHI_HOP_DEN": "black_box",
+    "BoGhiDiemMoc": "replay",
+    "BoDocDiemMoc": "replay",
+    "LuoiNguong": "calibration",
+    "KetQuaHieuChinh": "calibration",
+    "hieu_chinh": "calibration",
+    "BoPhatAmThanh": "audio",
+    "BoDieuPhoiCanhBao": "alerts",
+    "DichCanhBao": "alerts",
+    "DichTepJSONL": "alerts",
+    "DichWebhook": "alerts",
+    "DichAmThanh": "alerts",
+    "SuKienCanhBao": "alerts",
+    "DuongOngDMS": "pipeline",
+    "HangDoiBoCu": "pipeline",
+    "KhungHinh": "pipeline",
+    "GiamSatDaCamera": "supervisor",
+    "BoLapLich": "scheduler",
+    "CheDoLapLich": "scheduler",
+    "BoDieuKhienNganSach": "budget",
+    "MucGiam": "budget",
+    "CauHinhCamera": "capture",
+    "NguonKhungHinh": "capture",
+    "NguonCamera": "capture",
+    "NguonVideo": "capture",
+    "NguonThuMucAnh": "capture",
+    "tao_nguon": "capture",
+}
+_THIEU = object()
+
+if TYPE_CHECKING:
+    from .preprocessing import TienXuLyCLAHE
+    from .filters import BoLocOneEuro, BoLocOneEuroVector
+    from .face_analysis import PhanTichMat
+    from .head_pose import BoUocLuongTuThe, NoiTaiCamera, PhuongPhapPnP
+    from .hand_tracking import TheoDoiTay
+    from .results import KetQuaPhanTichMat, KetQuaTheoDoiTay
+    from .visualization import TraoDuaTinhNang
+    from .frame_context import NguCanhKhungHinh
+    from .buffer_pool import BeBoDem
+    from .metrics import BoDoLuong, BieuDoTanSuat, MayChuDoLuong
+    from .output import BoGhiKetQua, DinhDangDauRa, DTYPE_BAN_GHI
+    from .black_box import BoGhiHopDen, BoDocHopDen, DTYPE_BAN_GHI_HOP_DEN
+    from .replay import BoGhiDiemMoc, BoDocDiemMoc
+    from .calibration import LuoiNguong, KetQuaHieuChinh, hieu_chinh
+    from .audio import BoPhatAmThanh
+    from .alerts import BoDieuPhoiCanhBao, DichCanhBao, DichTepJSONL, DichWebhook, DichAmThanh, SuKienCanhBao
+    from .pipeline import DuongOngDMS, HangDoiBoCu, KhungHinh
+    from .supervisor import GiamSatDaCamera
+    from .scheduler import BoLapLich, CheDoLapLich
+    from .budget import BoDieuKhienNganSach, MucGiam
+    from .capture import CauHinhCamera, NguonKhungHinh, NguonCamera, NguonVideo, NguonThuMucAnh, tao_nguon
+    from .constants import *
+
+
+def __getattr__(ten: str):
+    mo_dun = _MO_DUN.get(ten)
+    if mo_dun is None:
+        if ten.startswith("_"):
+            raise AttributeError(f"module {__name__!r} has no attribute {ten!r}")
+        mo_dun = "constants"  # Trước đây `from .constants import *`
+    gia_tri = getattr(importlib.import_module(f".{mo_dun}", __name__), ten, _THIEU)
+    if gia_tri is _THIEU:
+        raise AttributeError(f"module {__name__!r} has no attribute {ten!r}")
+    globals()[ten] = gia_tri  # Lần sau không qua __getattr__
+    return gia_tri
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 __version__ = "1.0.0"
 __all__ = [
     "TienXuLyCLAHE",
     "BoLocOneEuro", 
+    "BoLocOneEuroVector",
     "PhanTichMat",
+    "BoUocLuongTuThe",
+    "NoiTaiCamera",
+    "PhuongPhapPnP",
     "TheoDoiTay",
+    "KetQuaPhanTichMat",
+    "KetQuaTheoDoiTay",
     "TraoDuaTinhNang",
+    "NguCanhKhungHinh",
+    "BeBoDem",
+    "BoDoLuong",
+    "BieuDoTanSuat",
+    "MayChuDoLuong",
+    "BoGhiKetQua",
+    "DinhDangDauRa",
+    "DTYPE_BAN_GHI",
+    "BoGhiHopDen",
+    "BoDocHopDen",
+    "DTYPE_BAN_GHI_HOP_DEN",
+    "BoGhiDiemMoc",
+    "BoDocDiemMoc",
+    "LuoiNguong",
+    "KetQuaHieuChinh",
+    "hieu_chinh",
+    "BoPhatAmThanh",
+    "BoDieuPhoiCanhBao",
+    "DichCanhBao",
+    "DichTepJSONL",
+    "DichWebhook",
+    "DichAmThanh",
+    "SuKienCanhBao",
+    "DuongOngDMS",
+    "HangDoiBoCu",
+    "KhungHinh",
+    "CauHinhCamera",
+    "NguonKhungHinh",
+    "NguonCamera",
+    "NguonVideo",
+    "NguonThuMucAnh",
+    "tao_nguon",
+    "GiamSatDaCamera",
+    "BoLapLich",
+    "CheDoLapLich",
+    "BoDieuKhienNganSach",
+    "MucGiam",
 ]
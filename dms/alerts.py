@@ -0,0 +1,265 @@
+"""
+Alerts - Điều phối sự kiện cảnh báo tới nhiều đích (asyncio, luồng riêng)
+
+Luồng phân tích chỉ gọi cap_nhat(ts, các cảnh báo đang bật): phát hiện cạnh
+bắt đầu / kết thúc cho cả 4 AlertType và đẩy sự kiện sang event loop bằng
+call_soon_threadsafe - không bao giờ chặn.
+
+- Gộp: cảnh báo tắt rồi bật lại trong thoi_gian_gop giây được coi là một đợt
+  (không phát sự kiện kết thúc/bắt đầu lặp lại); sự kiện kết thúc ghi số lần gộp.
+- Mỗi đích một hàng đợi asyncio có giới hạn; đầy thì bỏ sự kiện cũ nhất (đếm).
+- Đích chậm / lỗi không ảnh hưởng đích khác; độ trễ phân phối (từ lúc phát
+  hiện đến lúc đích xử lý xong) đo bằng BieuDoTanSuat cho từng đích.
+- Khi đóng, cảnh báo còn đang bật được phát KET_THUC trước khi dừng → mỗi
+  BAT_DAU luôn có KET_THUC tương ứng.
+
+Đích có sẵn: DichTepJSONL, DichWebhook (POST JSON, urllib), DichAmThanh.
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from .audio import BoPhatAmThanh
+from .constants import AlertType
+from .metrics import BieuDoTanSuat
+
+logger = logging.getLogger(__name__)
+
+
+class LoaiSuKien(Enum):
+    BAT_DAU = "start"
+    KET_THUC = "stop"
+
+
+@dataclass(slots=True)
+class SuKienCanhBao:
+    loai: AlertType
+    su_kien: LoaiSuKien
+    thoi_diem: float  # Timestamp khung (time.time() hoặc PTS)
+    thoi_luong: float = 0.0  # Chỉ với KET_THUC: từ lúc bắt đầu đợt đến lúc tắt
+    so_lan_gop: int = 0  # Số lần tắt/bật lại đã gộp vào đợt này
+    thoi_diem_phat_hien: float = field(default_factory=time.perf_counter)
+
+    def thanh_dict(self) -> dict:
+        return {'type': self.loai.name, 'event': self.su_kien.value, 'timestamp': self.thoi_diem,
+                'duration': round(self.thoi_luong, 3), 'merged': self.so_lan_gop}
+
+
+class DichCanhBao(ABC):
+    """Đích nhận sự kiện. gui() chạy trên event loop của bộ điều phối."""
+    ten: str = "dich"
+
+    @abstractmethod
+    async def gui(self, su_kien: SuKienCanhBao) -> None:
+        ...
+
+    async def dong(self) -> None:
+        pass
+
+
+@dataclass
+class DichTepJSONL(DichCanhBao):
+    """Mỗi sự kiện một dòng JSON; ghi file trên thread pool để không chặn loop."""
+    duong_dan: str
+    ten: str = "file"
+    _tep: Optional[object] = field(default=None, repr=False)
+
+    def _ghi(self, dong: str) -> None:
+        if self._tep is None:
+            self._tep = open(self.duong_dan, "a", encoding="utf-8")
+        self._tep.write(dong)
+        self._tep.flush()
+
+    async def gui(self, su_kien: SuKienCanhBao) -> None:
+        await asyncio.to_thread(self._ghi, json.dumps(su_kien.thanh_dict()) + "\n")
+
+    async def dong(self) -> None:
+        if self._tep is not None:
+            self._tep.close()
+            self._tep = None
+
+
+@dataclass
+class DichWebhook(DichCanhBao):
+    """POST JSON tới webhook (VD: dịch vụ cục bộ http://127.0.0.1:8765/alerts)."""
+    url: str
+    thoi_gian_cho: float = 2.0
+    ten: str = "webhook"
+
+    def _post(self, noi_dung: bytes) -> None:
+        yeu_cau = urllib.request.Request(self.url, data=noi_dung, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(yeu_cau, timeout=self.thoi_gian_cho) as phan_hoi:
+            phan_hoi.read()
+
+    async def gui(self, su_kien: SuKienCanhBao) -> None:
+        await asyncio.to_thread(self._post, json.dumps(su_kien.thanh_dict()).encode("utf-8"))
+
+
+@dataclass
+class DichAmThanh(DichCanhBao):
+    """Phát âm khi cảnh báo bắt đầu; cac_loai=None → mọi loại BoPhatAmThanh có âm."""
+    bo_phat: BoPhatAmThanh
+    cac_loai: Optional[FrozenSet[AlertType]] = None
+    ten: str = "audio"
+
+    async def gui(self, su_kien: SuKienCanhBao) -> None:
+        if su_kien.su_kien is LoaiSuKien.BAT_DAU and \
+                (self.cac_loai is None or su_kien.loai in self.cac_loai):
+            self.bo_phat.phat(su_kien.loai)  # Không chặn: BoPhatAmThanh có luồng riêng
+
+
+@dataclass
+class _TrangThaiDich:
+    dich: DichCanhBao
+    hang_doi: asyncio.Queue
+    so_gui: int = 0
+    so_bo: int = 0
+    so_loi: int = 0
+    do_tre: BieuDoTanSuat = field(default_factory=BieuDoTanSuat)
+
+
+@dataclass
+class _DotCanhBao:
+    bat_dau: float
+    tat_luc: Optional[float] = None  # Đang chờ hết thoi_gian_gop để phát KET_THUC
+    so_lan_gop: int = 0
+
+
+@dataclass
+class BoDieuPhoiCanhBao:
+    cac_dich: List[DichCanhBao] = field(default_factory=list)
+    suc_chua: int = 64  # Sự kiện chờ tối đa mỗi đích
+    thoi_gian_gop: float = 0.5  # Giây; tắt rồi bật lại trong khoảng này = cùng một đợt
+
+    _dot: Dict[AlertType, _DotCanhBao] = field(default_factory=dict, repr=False)
+    _ts_cuoi: Optional[float] = field(default=None, repr=False)
+    _trang_thai: List[_TrangThaiDich] = field(default_factory=list, repr=False)
+    _vong_lap: Optional[asyncio.AbstractEventLoop] = field(default=None, repr=False)
+    _luong: Optional[threading.Thread] = field(default=None, repr=False)
+    _tac_vu: List[asyncio.Task] = field(default_factory=list, repr=False)
+
+    # ---------- Luồng phân tích ----------
+
+    def cap_nhat(self, ts: float, dang_bat: Iterable[AlertType]) -> None:
+        """Gọi mỗi khung với các cảnh báo đang bật; chỉ tạo sự kiện khi có chuyển trạng thái."""
+        dang_bat = set(dang_bat)
+        self._ts_cuoi = ts
+        for loai in dang_bat:
+            dot = self._dot.get(loai)
+            if dot is None:
+                self._dot[loai] = _DotCanhBao(ts)
+                self._day(SuKienCanhBao(loai, LoaiSuKien.BAT_DAU, ts))
+            elif dot.tat_luc is not None:
+                dot.tat_luc = None  # Bật lại trong thời gian gộp
+                dot.so_lan_gop += 1
+        for loai, dot in list(self._dot.items()):
+            if loai in dang_bat:
+                continue
+            if dot.tat_luc is None:
+                dot.tat_luc = ts
+            if ts - dot.tat_luc >= self.thoi_gian_gop:
+                del self._dot[loai]
+                self._day(SuKienCanhBao(loai, LoaiSuKien.KET_THUC, ts, dot.tat_luc - dot.bat_dau,
+                                        dot.so_lan_gop))
+
+    def _ket_thuc_tat_ca(self) -> None:
+        """KET_THUC cho mọi đợt còn mở (đang bật hoặc đang chờ gộp) tại khung cuối."""
+        for loai, dot in list(self._dot.items()):
+            tat_luc = dot.tat_luc if dot.tat_luc is not None else self._ts_cuoi
+            self._day(SuKienCanhBao(loai, LoaiSuKien.KET_THUC, self._ts_cuoi, tat_luc - dot.bat_dau,
+                                    dot.so_lan_gop))
+        self._dot.clear()
+
+    def _day(self, su_kien: SuKienCanhBao) -> None:
+        if self._vong_lap is not None:
+            self._vong_lap.call_soon_threadsafe(self._phan_phoi, su_kien)
+
+    # ---------- Event loop ----------
+
+    def _phan_phoi(self, su_kien: SuKienCanhBao) -> None:
+        for tt in self._trang_thai:
+            if tt.hang_doi.full():
+                tt.hang_doi.get_nowait()  # Bỏ sự kiện cũ nhất, không chặn
+                tt.so_bo += 1
+            tt.hang_doi.put_nowait(su_kien)
+
+    async def _vong_dich(self, tt: _TrangThaiDich) -> None:
+        while True:
+            su_kien = await tt.hang_doi.get()
+            if su_kien is None:
+                break
+            try:
+                await tt.dich.gui(su_kien)
+                tt.so_gui += 1
+                tt.do_tre.quan_sat(time.perf_counter() - su_kien.thoi_diem_phat_hien)
+            except Exception as e:
+                tt.so_loi += 1
+                logger.warning(f"Đích cảnh báo {tt.dich.ten}: {e}")
+        await tt.dich.dong()
+
+    def _chay_vong_lap(self, vong_lap: asyncio.AbstractEventLoop, san_sang: threading.Event) -> None:
+        asyncio.set_event_loop(vong_lap)
+        self._trang_thai = [_TrangThaiDich(dich, asyncio.Queue(self.suc_chua)) for dich in self.cac_dich]
+        self._tac_vu = [vong_lap.create_task(self._vong_dich(tt)) for tt in self._trang_thai]
+        san_sang.set()
+        vong_lap.run_forever()
+        vong_lap.close()
+
+    def bat_dau(self) -> None:
+        self._vong_lap = asyncio.new_event_loop()
+        san_sang = threading.Event()
+        self._luong = threading.Thread(target=self._chay_vong_lap, args=(self._vong_lap, san_sang),
+                                       name="dms-canh-bao", daemon=True)
+        self._luong.start()
+        san_sang.wait()
+        logger.info(f"Điều phối cảnh báo: {', '.join(d.ten for d in self.cac_dich) or 'không có đích'}")
+
+    async def _dong_async(self, thoi_gian_cho: float) -> None:
+        for tt in self._trang_thai:
+            if tt.hang_doi.full():
+                tt.hang_doi.get_nowait()
+                tt.so_bo += 1
+            tt.hang_doi.put_nowait(None)
+        _, con_lai = await asyncio.wait(self._tac_vu, timeout=thoi_gian_cho)
+        for tac_vu in con_lai:
+            tac_vu.cancel()
+
+    def dong(self, thoi_gian_cho: float = 2.0) -> None:
+        """Gửi nốt sự kiện đang chờ (tối đa thoi_gian_cho giây) rồi dừng loop."""
+        if self._vong_lap is None:
+            return
+        self._ket_thuc_tat_ca()  # Xếp trước lệnh đóng trên loop → được phân phối trước
+        vong_lap, self._vong_lap = self._vong_lap, None
+        try:
+            asyncio.run_coroutine_threadsafe(self._dong_async(thoi_gian_cho), vong_lap) \
+                .result(thoi_gian_cho + 1.0)
+        except Exception as e:
+            logger.warning(f"Đóng điều phối cảnh báo: {e}")
+        vong_lap.call_soon_threadsafe(vong_lap.stop)
+        self._luong.join(thoi_gian_cho)
+        self._luong = None
+        for ten, tk in self.thong_ke().items():
+            logger.info(f"Đích {ten}: gửi {tk['gui']}, bỏ {tk['bo']}, lỗi {tk['loi']}, "
+                        f"độ trễ p50 ≤{tk['p50_ms']:.2f}ms, p99 ≤{tk['p99_ms']:.2f}ms")
+
+    def thong_ke(self) -> Dict[str, dict]:
+        return {tt.dich.ten: {'gui': tt.so_gui, 'bo': tt.so_bo, 'loi': tt.so_loi,
+                              'p50_ms': tt.do_tre.phan_vi(0.5) * 1000,
+                              'p99_ms': tt.do_tre.phan_vi(0.99) * 1000}
+                for tt in self._trang_thai}
+
+    def __enter__(self):
+        self.bat_dau()
+        return self
+
+    def __exit__(self, *args):
+        self.dong()
@@ -0,0 +1,244 @@
+"""
+Audio - Phát âm thanh cảnh báo độ trễ thấp
+
+Một luồng phát duy nhất sống suốt phiên chạy:
+- Giải mã file âm thanh một lần lúc khởi động vào bộ nhớ
+- Nhận yêu cầu qua hàng đợi; yêu cầu trùng loại đang chờ hoặc đang phát được gộp
+- Mỗi AlertType một âm thanh riêng (thiếu thì dùng âm mặc định)
+- Đo độ trễ từ lúc yêu cầu đến lúc hậu trường bắt đầu phát (BieuDoTanSuat)
+
+Hậu trường chọn theo thứ tự: sounddevice + soundfile (PCM trong RAM),
+playsound (phát từ file, chặn luồng phát), rỗng (không thiết bị / headless /
+kiểm thử - chỉ đếm và đo). Một hậu trường chỉ được chọn khi nạp được mọi file âm
+(VD: libsndfile cũ không giải mã mp3 → thử playsound); rơi xuống rỗng dù có
+âm cần phát thì log lỗi - cảnh báo an toàn không được im lặng mà không báo.
+"""
+
+from __future__ import annotations
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from .constants import AlertType
+from .metrics import BieuDoTanSuat
+
+logger = logging.getLogger(__name__)
+
+HAU_TRUONG_TU_DONG = "auto"
+
+
+def phan_tich_am_thanh(chuoi: str) -> Tuple[AlertType, str]:
+    """'YAWN=ngap.wav' → (AlertType.YAWN, 'ngap.wav'); tên loại không phân biệt hoa thường."""
+    loai, dau_bang, duong_dan = chuoi.partition("=")
+    if not dau_bang or not loai or not duong_dan:
+        raise ValueError(f"Âm cảnh báo không hợp lệ: {chuoi!r} (cần dạng LOAI=FILE)")
+    try:
+        return AlertType[loai.strip().upper()], duong_dan
+    except KeyError:
+        raise ValueError(f"Loại cảnh báo không hợp lệ: {loai!r} "
+                         f"(chọn {', '.join(a.name for a in AlertType)})") from None
+
+
+class _HauTruongRong:
+    """Không phát gì; dùng khi không có thiết bị âm thanh."""
+    ten = "null"
+
+    def nap(self, duong_dan: str) -> Any:
+        return duong_dan
+
+    def phat(self, du_lieu: Any) -> float:
+        """Bắt đầu phát; trả về số giây còn phát sau khi hàm trả về."""
+        return 0.0
+
+    def dong(self) -> None:
+        pass
+
+
+class _HauTruongSoundDevice(_HauTruongRong):
+    """PCM float32 giải mã sẵn; sd.play không chặn (âm mới thay âm đang phát)."""
+    ten = "sounddevice"
+
+    def __init__(self) -> None:
+        import sounddevice
+        import soundfile
+        sounddevice.query_devices(kind='output')  # Lỗi nếu không có thiết bị ra
+        self._sd, self._sf = sounddevice, soundfile
+
+    def nap(self, duong_dan: str) -> Tuple[Any, int]:
+        du_lieu, tan_so = self._sf.read(duong_dan, dtype='float32', always_2d=True)
+        return du_lieu, tan_so
+
+    def phat(self, du_lieu: Tuple[Any, int]) -> float:
+        pcm, tan_so = du_lieu
+        self._sd.play(pcm, tan_so)
+        return len(pcm) / tan_so
+
+    def dong(self) -> None:
+        self._sd.stop()
+
+
+class _HauTruongPlaysound(_HauTruongRong):
+    """Không giải mã trước được; phát chặn trên luồng phát nên không sinh thêm luồng."""
+    ten = "playsound"
+
+    def __init__(self) -> None:
+        import playsound
+        self._playsound = playsound.playsound
+
+    def nap(self, duong_dan: str) -> str:
+        if not os.path.isfile(duong_dan):
+            raise FileNotFoundError(duong_dan)
+        return duong_dan
+
+    def phat(self, du_lieu: str) -> float:
+        self._playsound(du_lieu, block=True)
+        return 0.0
+
+
+_HAU_TRUONG = {h.ten: h for h in (_HauTruongSoundDevice, _HauTruongPlaysound, _HauTruongRong)}
+
+
+def _thu_tu_hau_truong(ten: str) -> List[str]:
+    """auto → cả chuỗi; chọn cụ thể → hậu trường đó trước, các hậu trường còn lại làm dự phòng."""
+    if ten != HAU_TRUONG_TU_DONG and ten not in _HAU_TRUONG:
+        raise ValueError(f"Hậu trường âm thanh không hợp lệ: {ten}")
+    if ten == HAU_TRUONG_TU_DONG:
+        return list(_HAU_TRUONG)
+    if ten == _HauTruongRong.ten:
+        return [ten]
+    return [ten] + [khac for khac in _HAU_TRUONG if khac != ten]
+
+
+def _nap_tat_ca(hau_truong: _HauTruongRong,
+                duong_dan: Dict[AlertType, str]) -> Tuple[Dict[AlertType, Any], List[str]]:
+    """Nạp mỗi file một lần; trả về (dữ liệu theo loại, lỗi theo file)."""
+    du_lieu: Dict[AlertType, Any] = {}
+    loi: List[str] = []
+    for tep in dict.fromkeys(duong_dan.values()):
+        cac_loai = [loai for loai, t in duong_dan.items() if t == tep]
+        try:
+            pcm = hau_truong.nap(tep)
+        except Exception as e:
+            loi.append(f"{tep} ({', '.join(loai.name for loai in cac_loai)}): {e}")
+            continue
+        du_lieu.update(dict.fromkeys(cac_loai, pcm))
+    return du_lieu, loi
+
+
+def _chon_hau_truong(ten: str, duong_dan: Dict[AlertType, str]) -> Tuple[_HauTruongRong, Dict[AlertType, Any]]:
+    """Hậu trường đầu tiên tạo được và nạp được mọi âm; không có thì lấy cái nạp được nhiều nhất."""
+    tot_nhat: Optional[Tuple[_HauTruongRong, Dict[AlertType, Any]]] = None
+    for ten_thu in _thu_tu_hau_truong(ten):
+        try:
+            hau_truong = _HAU_TRUONG[ten_thu]()
+        except Exception as e:  # ImportError, OSError (thiếu PortAudio), không có thiết bị
+            logger.warning(f"Không dùng được âm thanh {ten_thu}: {e}")
+            continue
+        du_lieu, loi = _nap_tat_ca(hau_truong, duong_dan)
+        if not loi:
+            if hau_truong.ten == _HauTruongRong.ten and duong_dan and ten != _HauTruongRong.ten:
+                logger.error("Không hậu trường âm thanh nào phát được: cảnh báo sẽ KHÔNG có tiếng")
+            return hau_truong, du_lieu
+        for dong in loi:
+            logger.warning(f"Âm thanh {ten_thu}: không nạp được {dong}")
+        if tot_nhat is None or len(du_lieu) > len(tot_nhat[1]):
+            if tot_nhat is not None:
+                tot_nhat[0].dong()
+            tot_nhat = hau_truong, du_lieu
+        else:
+            hau_truong.dong()
+    if tot_nhat is None:
+        return _HauTruongRong(), {}
+    logger.error(f"Âm thanh {tot_nhat[0].ten}: chỉ {len(tot_nhat[1])}/{len(duong_dan)} loại cảnh báo có tiếng")
+    return tot_nhat
+
+
+@dataclass
+class BoPhatAmThanh:
+    """
+    phat(loai) không bao giờ chặn luồng gọi. Gộp: yêu cầu cùng loại khi loại đó
+    đang chờ trong hàng đợi hoặc đang phát thì bỏ (đếm ở so_gop).
+    """
+    am_thanh: Dict[AlertType, str] = field(default_factory=dict)
+    mac_dinh: Optional[str] = None  # Cho AlertType không có trong am_thanh
+    hau_truong: str = HAU_TRUONG_TU_DONG  # auto | sounddevice | playsound | null
+    so_yeu_cau: int = field(default=0, init=False)
+    so_gop: int = field(default=0, init=False)
+    so_da_phat: int = field(default=0, init=False)
+    do_tre: BieuDoTanSuat = field(default_factory=BieuDoTanSuat, init=False)
+
+    _hau_truong: _HauTruongRong = field(init=False, repr=False)
+    _du_lieu: Dict[AlertType, Any] = field(default_factory=dict, repr=False)
+    _hang_doi: queue.Queue = field(default_factory=queue.Queue, repr=False)
+    _luong: Optional[threading.Thread] = field(default=None, repr=False)
+    _khoa: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _dang_cho: set = field(default_factory=set, repr=False)
+    _ket_thuc: Dict[AlertType, float] = field(default_factory=dict, repr=False)  # perf_counter hết phát
+
+    def bat_dau(self) -> None:
+        duong_dan = {loai: self.am_thanh.get(loai, self.mac_dinh) for loai in AlertType}
+        duong_dan = {loai: tep for loai, tep in duong_dan.items() if tep is not None}
+        self._hau_truong, self._du_lieu = _chon_hau_truong(self.hau_truong, duong_dan)
+        self._luong = threading.Thread(target=self._vong_phat, name="dms-am-thanh", daemon=True)
+        self._luong.start()
+        logger.info(f"Âm thanh: {self._hau_truong.ten}, {len(self._du_lieu)} loại cảnh báo có âm")
+
+    @property
+    def ten_hau_truong(self) -> str:
+        return self._hau_truong.ten
+
+    def phat(self, loai: AlertType) -> bool:
+        """True nếu yêu cầu được xếp hàng, False nếu bị gộp hoặc loại không có âm."""
+        if loai not in self._du_lieu or self._luong is None:
+            return False
+        bay_gio = time.perf_counter()
+        with self._khoa:
+            self.so_yeu_cau += 1
+            if loai in self._dang_cho or bay_gio < self._ket_thuc.get(loai, 0.0):
+                self.so_gop += 1
+                return False
+            self._dang_cho.add(loai)
+        self._hang_doi.put_nowait((loai, bay_gio))
+        return True
+
+    def _vong_phat(self) -> None:
+        while True:
+            muc = self._hang_doi.get()
+            if muc is None:
+                return
+            loai, thoi_diem_yeu_cau = muc
+            with self._khoa:
+                self._dang_cho.discard(loai)
+                self._ket_thuc[loai] = float('inf')  # Chặn yêu cầu trùng trong lúc bắt đầu phát
+            bat_dau = time.perf_counter()
+            self.do_tre.quan_sat(bat_dau - thoi_diem_yeu_cau)
+            try:
+                con_lai = self._hau_truong.phat(self._du_lieu[loai])
+                self.so_da_phat += 1
+            except Exception as e:
+                logger.warning(f"Lỗi phát âm thanh {loai.name}: {e}")
+                con_lai = 0.0
+            with self._khoa:
+                self._ket_thuc[loai] = time.perf_counter() + con_lai
+
+    def dong(self, thoi_gian_cho: float = 1.0) -> None:
+        if self._luong is None:
+            return
+        self._hang_doi.put(None)
+        self._luong.join(thoi_gian_cho)
+        self._luong = None
+        self._hau_truong.dong()
+        if self.so_yeu_cau:
+            logger.info(f"Âm thanh: {self.so_da_phat} lần phát / {self.so_yeu_cau} yêu cầu "
+                        f"({self.so_gop} gộp), độ trễ p50 ≤{self.do_tre.phan_vi(0.5)*1000:.2f}ms, "
+                        f"p99 ≤{self.do_tre.phan_vi(0.99)*1000:.2f}ms")
+
+    def __enter__(self):
+        self.bat_dau()
+        return self
+
+    def __exit__(self, *args):
+        self.dong()
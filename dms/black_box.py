@@ -0,0 +1,274 @@
+"""
+Black Box - Hộp đen chuyến đi: số liệu từng khung trong file ánh xạ bộ nhớ
+
+Ring buffer cố định gồm các bản ghi DTYPE_BAN_GHI_HOP_DEN (40 byte: timestamp,
+EAR, MAR, pitch/yaw/roll, cờ cảnh báo, tay gần mặt, ... như DTYPE_BAN_GHI,
+2 byte đệm dùng làm số phiên) nằm trong một np.memmap.
+Mỗi khung chỉ là một phép gán bản ghi rồi tăng chỉ số trong header - không
+format chuỗi, không syscall. Dữ liệu nằm trong page cache nên tiến trình chết
+vẫn còn; dong_bo() (msync) để chống mất điện.
+
+Bố cục file: header 64 byte (DTYPE_DAU_HOP_DEN) + suc_chua bản ghi.
+Header.so_da_ghi = tổng số bản ghi đã ghi; bản ghi thứ k ở ô k % suc_chua.
+Bản ghi được ghi trước, chỉ số tăng sau → người đọc không thấy bản ghi dở.
+Header.so_phien tăng mỗi lần mở lại file; mỗi bản ghi mang số phiên của nó.
+Timestamp có thể lùi giữa các phiên (PTS video tính từ lúc mở file, đồng hồ
+hệ thống nhảy) nên không giả định timestamp tăng dần.
+
+File cũ không dùng tiếp được (khác suc_chua do đổi --black-box-hours / fps,
+hỏng header) được đổi tên thành <tên>.<thời điểm><đuôi>, không bao giờ bị xóa.
+
+BoDocHopDen trả mọi bản ghi theo thứ tự ghi (so_thu_tu) dạng view (không
+copy); lọc theo thời gian / phiên bằng mặt nạ.
+"""
+
+from __future__ import annotations
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+import numpy as np
+from .output import DTYPE_BAN_GHI, tao_ban_ghi
+from .results import KetQuaPhanTichMat, KetQuaTheoDoiTay
+
+logger = logging.getLogger(__name__)
+
+MA_HOP_DEN = b"DMSBBOX1"
+PHIEN_BAN_HOP_DEN = 2  # 2: so_phien trong header và bản ghi (file bản 1 đọc được, phiên = 0)
+
+DTYPE_DAU_HOP_DEN = np.dtype([
+    ('ma', 'S8'),
+    ('phien_ban', '<u4'),
+    ('kich_thuoc_ban_ghi', '<u4'),
+    ('suc_chua', '<u8'),
+    ('so_da_ghi', '<u8'),
+    ('thoi_diem_tao', '<f8'),
+    ('so_phien', '<u4'),
+    ('_du', 'V20'),
+])
+KICH_THUOC_DAU = DTYPE_DAU_HOP_DEN.itemsize  # 64
+
+# Như DTYPE_BAN_GHI, trường đệm cuối thành số phiên (mod 2^16) → gán thẳng tuple tao_ban_ghi + (phiên,)
+_TEN_GHI = [ten for ten in DTYPE_BAN_GHI.names if not ten.startswith('_')]
+DTYPE_BAN_GHI_HOP_DEN = np.dtype({
+    'names': _TEN_GHI + ['phien'],
+    'formats': [DTYPE_BAN_GHI.fields[ten][0] for ten in _TEN_GHI] + ['<u2'],
+    'offsets': [DTYPE_BAN_GHI.fields[ten][1] for ten in _TEN_GHI] + [DTYPE_BAN_GHI.fields['_dem'][1]],
+    'itemsize': DTYPE_BAN_GHI.itemsize})
+
+
+def _anh_xa(duong_dan: str, che_do: str) -> Tuple[np.memmap, np.ndarray, np.ndarray]:
+    """memmap cả file → (memmap, header shape (1,), bản ghi shape (suc_chua,))."""
+    mm = np.memmap(duong_dan, dtype=np.uint8, mode=che_do)
+    if mm.size < KICH_THUOC_DAU:
+        raise ValueError(f"{duong_dan}: file hộp đen quá ngắn")
+    dau = mm[:KICH_THUOC_DAU].view(DTYPE_DAU_HOP_DEN)
+    if dau['ma'][0] != MA_HOP_DEN or dau['kich_thuoc_ban_ghi'][0] != DTYPE_BAN_GHI.itemsize:
+        raise ValueError(f"{duong_dan}: không phải file hộp đen DMS (hoặc khác định dạng bản ghi)")
+    suc_chua = int(dau['suc_chua'][0])
+    if mm.size != KICH_THUOC_DAU + suc_chua * DTYPE_BAN_GHI.itemsize:
+        raise ValueError(f"{duong_dan}: kích thước file không khớp header")
+    return mm, dau, mm[KICH_THUOC_DAU:].view(DTYPE_BAN_GHI_HOP_DEN)
+
+
+def _ten_luu_tru(duong_dan: str) -> str:
+    """<tên>.<YYYYmmdd-HHMMSS><đuôi>, thêm -1, -2... nếu trùng."""
+    goc, duoi = os.path.splitext(duong_dan)
+    ten = f"{goc}.{time.strftime('%Y%m%d-%H%M%S')}"
+    ung_vien, i = ten + duoi, 0
+    while os.path.exists(ung_vien):
+        i += 1
+        ung_vien = f"{ten}-{i}{duoi}"
+    return ung_vien
+
+
+def _cac_doan(ban_ghi: np.ndarray, so_da_ghi: int) -> Tuple[np.ndarray, ...]:
+    """Các view theo thứ tự ghi (so_thu_tu, cũ → mới), 1 đoạn nếu chưa quay vòng, 2 nếu đã."""
+    suc_chua = len(ban_ghi)
+    if so_da_ghi <= suc_chua:
+        return (ban_ghi[:so_da_ghi],)
+    o = so_da_ghi % suc_chua
+    return tuple(doan for doan in (ban_ghi[o:], ban_ghi[:o]) if len(doan))
+
+
+@dataclass
+class BoGhiHopDen:
+    """
+    Ghi một bản ghi mỗi khung vào ring buffer ánh xạ bộ nhớ.
+    File đã có (cùng suc_chua) thì ghi tiếp sau bản ghi cuối trong phiên mới -
+    khởi động lại sau sự cố không xóa dữ liệu cũ. File không ghi tiếp được thì
+    đổi tên giữ lại rồi mới tạo file mới.
+    """
+    duong_dan: str
+    thoi_luong_gio: float = 4.0
+    fps_du_kien: float = 30.0
+    chu_ky_dong_bo: float = 0.0  # Giây giữa 2 lần msync; 0 = chỉ khi đóng (page cache đủ khi tiến trình chết)
+    suc_chua: int = field(init=False)
+
+    _mm: Optional[np.memmap] = field(default=None, repr=False)
+    _dau: Optional[np.ndarray] = field(default=None, repr=False)
+    _ghi: Optional[np.ndarray] = field(default=None, repr=False)
+    _so_da_ghi: int = field(default=0, repr=False)
+    _phien: int = field(default=0, repr=False)
+    _lan_dong_bo: float = field(default=0.0, repr=False)
+
+    def __post_init__(self) -> None:
+        self.suc_chua = max(1, int(math.ceil(self.thoi_luong_gio * 3600 * self.fps_du_kien)))
+
+    def mo(self) -> None:
+        ban_ghi = self._mo_file_cu()
+        if ban_ghi is None:
+            ban_ghi = self._tao_file_moi()
+        self._ghi = ban_ghi
+        self._lan_dong_bo = time.monotonic()
+
+    def _mo_file_cu(self) -> Optional[np.ndarray]:
+        """Ghi tiếp file cũ (phiên mới) nếu hợp lệ và cùng suc_chua; None nếu cần tạo mới."""
+        if not os.path.exists(self.duong_dan) or os.path.getsize(self.duong_dan) == 0:
+            return None
+        try:
+            mm, dau, ban_ghi = _anh_xa(self.duong_dan, 'r+')
+        except ValueError as e:
+            self._luu_tru_file_cu(str(e))
+            return None
+        if len(ban_ghi) != self.suc_chua:
+            del mm, dau, ban_ghi
+            self._luu_tru_file_cu(f"suc_chua {self.suc_chua} khác file cũ")
+            return None
+        self._mm, self._dau = mm, dau
+        self._so_da_ghi = int(dau['so_da_ghi'][0])
+        self._phien = int(dau['so_phien'][0]) + 1
+        dau['so_phien'] = self._phien
+        dau['phien_ban'] = PHIEN_BAN_HOP_DEN
+        logger.info(f"Hộp đen: ghi tiếp {self.duong_dan} sau {self._so_da_ghi} bản ghi (phiên {self._phien})")
+        return ban_ghi
+
+    def _luu_tru_file_cu(self, ly_do: str) -> None:
+        """Đổi tên file cũ thay vì ghi đè - dữ liệu chuyến trước có thể là bằng chứng sự cố."""
+        dich = _ten_luu_tru(self.duong_dan)
+        os.rename(self.duong_dan, dich)
+        logger.warning(f"Hộp đen: không ghi tiếp được {self.duong_dan} ({ly_do}), file cũ giữ ở {dich}")
+
+    def _tao_file_moi(self) -> np.ndarray:
+        kich_thuoc = KICH_THUOC_DAU + self.suc_chua * DTYPE_BAN_GHI.itemsize
+        with open(self.duong_dan, "wb") as tep:
+            tep.truncate(kich_thuoc)  # File thưa: phần chưa ghi chưa chiếm đĩa
+        self._mm = np.memmap(self.duong_dan, dtype=np.uint8, mode='r+')
+        self._dau = self._mm[:KICH_THUOC_DAU].view(DTYPE_DAU_HOP_DEN)
+        self._dau[0] = (MA_HOP_DEN, PHIEN_BAN_HOP_DEN, DTYPE_BAN_GHI.itemsize,
+                        self.suc_chua, 0, time.time(), 0, b'')
+        self._so_da_ghi = 0
+        self._phien = 0
+        logger.info(f"Hộp đen: {self.duong_dan} ({self.suc_chua} bản ghi, "
+                    f"{kich_thuoc / 2**20:.0f} MB, ~{self.thoi_luong_gio:g} giờ)")
+        return self._mm[KICH_THUOC_DAU:].view(DTYPE_BAN_GHI_HOP_DEN)
+
+    def ghi(self, timestamp: float, ket_qua_mat: KetQuaPhanTichMat, ket_qua_tay: KetQuaTheoDoiTay) -> None:
+        """Gọi từ luồng phân tích; vài µs, không syscall."""
+        n = self._so_da_ghi
+        self._ghi[n % self.suc_chua] = tao_ban_ghi(timestamp, n & 0xFFFFFFFF, ket_qua_mat, ket_qua_tay) + \
+            (self._phien & 0xFFFF,)
+        self._so_da_ghi = n + 1
+        self._dau['so_da_ghi'] = n + 1
+        if self.chu_ky_dong_bo > 0 and time.monotonic() - self._lan_dong_bo >= self.chu_ky_dong_bo:
+            self.dong_bo()
+
+    def dong_bo(self) -> None:
+        """msync - đẩy page cache xuống đĩa (chống mất điện, không chỉ tiến trình chết)."""
+        if self._mm is not None:
+            self._mm.flush()
+        self._lan_dong_bo = time.monotonic()
+
+    @property
+    def so_da_ghi(self) -> int:
+        return self._so_da_ghi
+
+    @property
+    def phien(self) -> int:
+        return self._phien
+
+    def dong(self) -> None:
+        if self._mm is None:
+            return
+        self.dong_bo()
+        # Bỏ tham chiếu; mmap tự đóng khi không còn view nào (kể cả view đã trả ra ngoài)
+        self._ghi = self._dau = self._mm = None
+
+    def __enter__(self):
+        self.mo()
+        return self
+
+    def __exit__(self, *args):
+        self.dong()
+
+
+@dataclass
+class BoDocHopDen:
+    """
+    Đọc file hộp đen (kể cả khi BoGhiHopDen đang ghi). cac_doan() là view vào
+    memmap chỉ đọc; truy vấn thời gian lọc bằng mặt nạ (bản sao) vì timestamp
+    không đơn điệu qua các phiên.
+    """
+    duong_dan: str
+
+    _mm: np.memmap = field(init=False, repr=False)
+    _dau: np.ndarray = field(init=False, repr=False)
+    _ban_ghi: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._mm, self._dau, self._ban_ghi = _anh_xa(self.duong_dan, 'r')
+
+    @property
+    def suc_chua(self) -> int:
+        return len(self._ban_ghi)
+
+    @property
+    def so_da_ghi(self) -> int:
+        return int(self._dau['so_da_ghi'][0])
+
+    @property
+    def phien_hien_tai(self) -> int:
+        """Phiên của lần mở ghi gần nhất (mod 2^16 như trường phien của bản ghi)."""
+        return int(self._dau['so_phien'][0]) & 0xFFFF
+
+    def cac_doan(self) -> Tuple[np.ndarray, ...]:
+        """Mọi bản ghi còn giữ, theo thứ tự ghi (so_thu_tu), tối đa 2 view."""
+        return _cac_doan(self._ban_ghi, self.so_da_ghi)
+
+    def khoang_thoi_gian(self, bat_dau: float = -math.inf, ket_thuc: float = math.inf,
+                         phien: Optional[int] = None) -> Tuple[np.ndarray, ...]:
+        """
+        Bản ghi có bat_dau ≤ timestamp < ket_thuc (và cùng phien nếu có), theo
+        thứ tự ghi, tối đa 2 mảng. Không dùng searchsorted: timestamp có thể lùi
+        giữa các phiên nên mỗi đoạn được lọc bằng mặt nạ.
+        """
+        ket_qua = []
+        for doan in self.cac_doan():
+            ts = doan['timestamp']
+            mat_na = (ts >= bat_dau) & (ts < ket_thuc)
+            if phien is not None:
+                mat_na &= doan['phien'] == (phien & 0xFFFF)
+            if mat_na.any():
+                ket_qua.append(doan[mat_na])
+        return tuple(ket_qua)
+
+    def gan_nhat(self, so_giay: float) -> Tuple[np.ndarray, ...]:
+        """so_giay cuối tính từ bản ghi được ghi sau cùng, chỉ trong phiên của bản ghi đó."""
+        cac_doan = self.cac_doan()
+        if not cac_doan:
+            return ()
+        cuoi = cac_doan[-1][-1]
+        moi_nhat = float(cuoi['timestamp'])
+        return self.khoang_thoi_gian(moi_nhat - so_giay, np.nextafter(moi_nhat, math.inf),
+                                     phien=int(cuoi['phien']))
+
+    def dong(self) -> None:
+        self._ban_ghi = self._dau = self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.dong()
@@ -0,0 +1,112 @@
+"""
+Budget - Ngân sách độ trễ mỗi khung, giảm tính năng dần khi quá tải
+
+Đo thời gian xử lý mỗi khung (EMA). EMA vượt ngân sách → tắt thêm một tính
+năng theo thứ tự cố định, rẻ nhất về độ chính xác trước:
+    1. Chi tiết lớp phủ (lưới mặt, trục tư thế, điểm tay; giữ số liệu + cảnh báo)
+    2. Theo dõi tay
+    3. refine_landmarks của FaceMesh (10 điểm mống mắt)
+    4. CLAHE
+Mỗi bước chờ thoi_gian_giu giây rồi mới xét bước tiếp (EMA kịp phản ánh).
+Sau mỗi bước ghi tỉ lệ EMA sau / trước; chỉ bật lại khi EMA ước tính lúc bật
+(EMA / tỉ lệ đó) còn dưới nguong_tang × ngân sách → không bật/tắt dao động.
+Mọi lần giảm / khôi phục đều ghi log.
+"""
+
+from __future__ import annotations
+import logging
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MucGiam(IntEnum):
+    DAY_DU = 0
+    BOT_LOP_PHU = 1
+    TAT_TAY = 2
+    TAT_TINH_CHINH = 3
+    TAT_CLAHE = 4
+
+
+_MO_TA_MUC = {
+    MucGiam.BOT_LOP_PHU: "chi tiết lớp phủ",
+    MucGiam.TAT_TAY: "theo dõi tay",
+    MucGiam.TAT_TINH_CHINH: "refine_landmarks",
+    MucGiam.TAT_CLAHE: "CLAHE",
+}
+
+
+@dataclass
+class BoDieuKhienNganSach:
+    muc_tieu: float  # Giây mỗi khung
+    he_so_lam_muot: float = 0.1  # EMA; ~10 khung gần nhất
+    nguong_tang: float = 0.7  # Bật lại khi EMA ước tính < nguong_tang × muc_tieu
+    thoi_gian_giu: float = 2.0  # Giây tối thiểu giữa 2 lần đổi mức
+    ti_le_mac_dinh: float = 0.8  # Tỉ lệ EMA sau / trước khi chưa đo được
+    dong_ho: Callable[[], float] = field(default=time.monotonic, repr=False)
+    muc: MucGiam = field(default=MucGiam.DAY_DU, init=False)
+    so_lan_giam: int = field(default=0, init=False)
+    so_lan_tang: int = field(default=0, init=False)
+
+    _ema: Optional[float] = field(default=None, repr=False)
+    _lan_doi_cuoi: Optional[float] = field(default=None, repr=False)
+    _ema_truoc_buoc: Optional[float] = field(default=None, repr=False)  # Chờ đo tỉ lệ của bước vừa giảm
+    _ti_le: Dict[MucGiam, float] = field(default_factory=dict, repr=False)  # Mức → EMA sau / trước khi vào
+
+    @property
+    def do_tre_trung_binh(self) -> float:
+        return self._ema or 0.0
+
+    @property
+    def ve_chi_tiet(self) -> bool:
+        return self.muc < MucGiam.BOT_LOP_PHU
+
+    @property
+    def chay_tay(self) -> bool:
+        return self.muc < MucGiam.TAT_TAY
+
+    @property
+    def tinh_chinh(self) -> bool:
+        return self.muc < MucGiam.TAT_TINH_CHINH
+
+    @property
+    def chay_clahe(self) -> bool:
+        return self.muc < MucGiam.TAT_CLAHE
+
+    def quan_sat(self, do_tre: float) -> Optional[MucGiam]:
+        """Gọi mỗi khung với giây xử lý; trả về mức mới nếu vừa đổi, ngược lại None."""
+        bay_gio = self.dong_ho()
+        self._ema = do_tre if self._ema is None else \
+            self._ema + self.he_so_lam_muot * (do_tre - self._ema)
+        if self._lan_doi_cuoi is None:
+            self._lan_doi_cuoi = bay_gio
+        if bay_gio - self._lan_doi_cuoi < self.thoi_gian_giu:
+            return None
+        if self._ema_truoc_buoc is not None:
+            self._ti_le[self.muc] = min(1.0, self._ema / self._ema_truoc_buoc)
+            self._ema_truoc_buoc = None
+
+        if self._ema > self.muc_tieu and self.muc < MucGiam.TAT_CLAHE:
+            self._ema_truoc_buoc = self._ema
+            self._doi_muc(MucGiam(self.muc + 1), bay_gio)
+            self.so_lan_giam += 1
+            logger.warning(f"Giảm tải: tắt {_MO_TA_MUC[self.muc]} (EMA {self._ema*1000:.1f}ms > "
+                           f"ngân sách {self.muc_tieu*1000:.1f}ms, mức {self.muc.name})")
+            return self.muc
+        if self.muc > MucGiam.DAY_DU:
+            uoc_tinh = self._ema / self._ti_le.get(self.muc, self.ti_le_mac_dinh)
+            if uoc_tinh < self.nguong_tang * self.muc_tieu:
+                bat_lai = self.muc
+                self._doi_muc(MucGiam(self.muc - 1), bay_gio)
+                self.so_lan_tang += 1
+                logger.info(f"Khôi phục: bật {_MO_TA_MUC[bat_lai]} (EMA {self._ema*1000:.1f}ms, "
+                            f"ước tính {uoc_tinh*1000:.1f}ms, mức {self.muc.name})")
+                return self.muc
+        return None
+
+    def _doi_muc(self, muc: MucGiam, bay_gio: float) -> None:
+        self.muc = muc
+        self._lan_doi_cuoi = bay_gio
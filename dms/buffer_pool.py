@@ -0,0 +1,68 @@
+"""
+Buffer Pool - Tái sử dụng ảnh toàn khung giữa các khung hình
+
+Các giai đoạn (đọc camera, chuyển màu, lớp phủ) lấy bộ đệm `dst=` từ pool
+theo (shape, dtype) và trả lại khi khung đã được hiển thị/ghi xong. Ở trạng
+thái ổn định số lần cấp phát mới mỗi khung phải về 0.
+"""
+
+from __future__ import annotations
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+KhoaBoDem = Tuple[Tuple[int, ...], np.dtype]
+
+
+@dataclass
+class BeBoDem:
+    """Pool bộ đệm numpy, an toàn đa luồng (capture / phân tích / hiển thị)."""
+    so_toi_da_moi_loai: int = 16  # Bộ đệm rảnh giữ lại tối đa cho mỗi (shape, dtype)
+
+    so_cap_phat: int = field(default=0, init=False)  # Tổng số lần phải cấp phát mới
+    so_tai_su_dung: int = field(default=0, init=False)
+    cap_phat_khung_cuoi: int = field(default=0, init=False)
+
+    _tu_do: Dict[KhoaBoDem, List[np.ndarray]] = field(
+        default_factory=lambda: defaultdict(list), repr=False)
+    _khoa: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _moc_khung: int = field(default=0, repr=False)
+
+    def lay(self, hinh_dang: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Bộ đệm C-contiguous, nội dung không xác định."""
+        khoa = (tuple(hinh_dang), np.dtype(dtype))
+        with self._khoa:
+            danh_sach = self._tu_do.get(khoa)
+            if danh_sach:
+                self.so_tai_su_dung += 1
+                return danh_sach.pop()
+            self.so_cap_phat += 1
+        return np.empty(khoa[0], dtype=khoa[1])
+
+    def lay_nhu(self, mang: np.ndarray) -> np.ndarray:
+        return self.lay(mang.shape, mang.dtype)
+
+    def tra(self, mang: Optional[np.ndarray]) -> None:
+        """Trả bộ đệm về pool. Bỏ qua view (không sở hữu dữ liệu) và None."""
+        if mang is None or mang.base is not None or not mang.flags.c_contiguous:
+            return
+        mang.flags.writeable = True
+        khoa = (mang.shape, mang.dtype)
+        with self._khoa:
+            danh_sach = self._tu_do[khoa]
+            if len(danh_sach) < self.so_toi_da_moi_loai and \
+                    not any(m is mang for m in danh_sach):
+                danh_sach.append(mang)
+
+    def danh_dau_khung(self) -> int:
+        """Gọi một lần mỗi khung; trả về số lần cấp phát mới kể từ lần gọi trước."""
+        with self._khoa:
+            self.cap_phat_khung_cuoi = self.so_cap_phat - self._moc_khung
+            self._moc_khung = self.so_cap_phat
+        return self.cap_phat_khung_cuoi
+
+    def so_ranh(self) -> int:
+        with self._khoa:
+            return sum(len(d) for d in self._tu_do.values())
@@ -0,0 +1,306 @@
+"""
+Calibration - Quét lưới ngưỡng cảnh báo trên các chuyến đi đã ghi nhãn
+
+Đầu vào mỗi chuyến đi: chuỗi số liệu từng khung (file --output binary hoặc
+hộp đen --black-box, cùng bản ghi DTYPE_BAN_GHI; chuyến ghi bằng
+--record-landmarks thì --replay ra file binary trước) + file nhãn cạnh bên
+`<tên>.labels.json`:
+    {"DROWSINESS": [[bat_dau, ket_thuc], ...], "YAWN": [...], ...}
+timestamp cùng đồng hồ với bản ghi. Loại không có khóa = chuyến đó chưa gán
+nhãn loại này (bỏ qua); danh sách rỗng = đã gán, không có sự kiện.
+
+Mỗi loại cảnh báo được tính lại cho cả lưới ngưỡng một lượt bằng NumPy:
+(số tổ hợp, số khung) boolean; thời gian EAR thấp liên tục tính từ đầu chuỗi
+(maximum.accumulate), đếm trúng nhãn dùng cumsum. Chỉ số mỗi tổ hợp:
+- precision: tỉ lệ lần bật cảnh báo rơi vào nhãn (sớm tối đa dung_sai_som giây)
+- recall: tỉ lệ nhãn có cảnh báo bật trong khoảng nhãn
+- báo trước: ket_thuc nhãn - lần bật đầu tiên trong nhãn (giây, trung bình)
+- cảnh báo sai mỗi giờ
+Các chuyến đi chia cho ProcessPoolExecutor; mỗi tiến trình tự nạp file.
+
+Chạy: python -m dms.calibration chuyen_di/*.bin [--jobs 8] [--top 5]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .black_box import BoDocHopDen, MA_HOP_DEN
+from .constants import AlertType, CUA_HINH_BUON_NGU, CUA_HINH_MAT_TAP_TRUNG, CUA_HINH_TU_THE_DAU
+from .output import CoKetQua, DTYPE_BAN_GHI
+
+logger = logging.getLogger(__name__)
+
+DUOI_NHAN = ".labels.json"
+_SO_HANG_MOI_LO = 16  # Số tổ hợp đánh giá cùng lúc - giới hạn bộ nhớ (hàng × số khung × 8 byte)
+
+
+def _quanh(gia_tri: float, buoc: float, so_buoc: int) -> Tuple[float, ...]:
+    """Lưới đều quanh giá trị hiện tại (luôn chứa chính nó)."""
+    return tuple(round(gia_tri + buoc * i, 6) for i in range(-so_buoc, so_buoc + 1) if gia_tri + buoc * i > 0)
+
+
+@dataclass(frozen=True)
+class LuoiNguong:
+    """Các giá trị thử cho từng ngưỡng; mặc định quanh giá trị trong constants.py."""
+    nguong_ear: Tuple[float, ...] = _quanh(CUA_HINH_BUON_NGU.nguong_ear, 0.01, 8)
+    thoi_gian_ear: Tuple[float, ...] = _quanh(CUA_HINH_BUON_NGU.thoi_gian_ear, 0.1, 10)
+    nguong_mar: Tuple[float, ...] = _quanh(CUA_HINH_BUON_NGU.nguong_mar, 0.05, 10)
+    nguong_pitch: Tuple[float, ...] = _quanh(CUA_HINH_TU_THE_DAU.nguong_pitch, 2.5, 6)
+    nguong_yaw: Tuple[float, ...] = _quanh(CUA_HINH_TU_THE_DAU.nguong_yaw, 2.5, 6)
+    nguong_thoi_gian: Tuple[float, ...] = _quanh(CUA_HINH_MAT_TAP_TRUNG.nguong_thoi_gian, 0.25, 8)
+    dung_sai_som: float = 1.0  # Giây: cảnh báo bật sớm hơn nhãn ngần này vẫn tính là đúng
+
+    def tham_so(self, loai: AlertType) -> Dict[str, Tuple[float, ...]]:
+        """Tên ngưỡng → giá trị thử, theo thứ tự trục của lưới loại cảnh báo."""
+        return {ten: getattr(self, ten) for ten in _THAM_SO[loai]}
+
+    def to_hop(self, loai: AlertType) -> np.ndarray:
+        """(số tổ hợp, số ngưỡng), thứ tự C như hàm tín hiệu trả về."""
+        truc = np.meshgrid(*self.tham_so(loai).values(), indexing='ij')
+        return np.stack([t.ravel() for t in truc], axis=1).astype(np.float64)
+
+
+_THAM_SO = {
+    AlertType.DROWSINESS: ('nguong_ear', 'thoi_gian_ear'),
+    AlertType.YAWN: ('nguong_mar',),
+    AlertType.HEAD_POSE: ('nguong_pitch', 'nguong_yaw'),
+    AlertType.DISTRACTION: ('nguong_thoi_gian',),
+}
+
+HIEN_TAI = {
+    'nguong_ear': CUA_HINH_BUON_NGU.nguong_ear, 'thoi_gian_ear': CUA_HINH_BUON_NGU.thoi_gian_ear,
+    'nguong_mar': CUA_HINH_BUON_NGU.nguong_mar, 'nguong_pitch': CUA_HINH_TU_THE_DAU.nguong_pitch,
+    'nguong_yaw': CUA_HINH_TU_THE_DAU.nguong_yaw, 'nguong_thoi_gian': CUA_HINH_MAT_TAP_TRUNG.nguong_thoi_gian,
+}
+
+
+# ---------- Tín hiệu cảnh báo cho cả lưới: (số tổ hợp, số khung) bool ----------
+
+def dau_chuoi(b: np.ndarray) -> np.ndarray:
+    """Chỉ số khung đầu của chuỗi True liên tiếp chứa mỗi khung (khung False: chính nó + 1), theo trục cuối."""
+    chi_so = np.arange(b.shape[-1], dtype=np.int32)
+    return np.maximum.accumulate(np.where(b, np.int32(-1), chi_so), axis=-1) + 1
+
+
+def _tin_hieu_buon_ngu(ban_ghi: np.ndarray, luoi: LuoiNguong) -> np.ndarray:
+    # Như PhanTichMat: EAR < ngưỡng liên tục (mất mặt cắt chuỗi) ít nhất thoi_gian_ear giây
+    co_mat = (ban_ghi['co'] & int(CoKetQua.MAT_PHAT_HIEN)) != 0
+    ts = ban_ghi['timestamp']
+    nham = (ban_ghi['ear'][None, :] < np.asarray(luoi.nguong_ear, dtype=np.float64)[:, None]) & co_mat
+    thoi_gian = ts - ts[np.minimum(dau_chuoi(nham), len(ts) - 1)]  # (số ngưỡng EAR, số khung)
+    nguong = np.asarray(luoi.thoi_gian_ear, dtype=np.float64)
+    return (nham[:, None, :] & (thoi_gian[:, None, :] >= nguong[None, :, None])).reshape(-1, len(ban_ghi))
+
+
+def _tin_hieu_ngap(ban_ghi: np.ndarray, luoi: LuoiNguong) -> np.ndarray:
+    co_mat = (ban_ghi['co'] & int(CoKetQua.MAT_PHAT_HIEN)) != 0
+    return (ban_ghi['mar'][None, :] > np.asarray(luoi.nguong_mar, dtype=np.float64)[:, None]) & co_mat
+
+
+def _tin_hieu_tu_the(ban_ghi: np.ndarray, luoi: LuoiNguong) -> np.ndarray:
+    pitch = np.abs(ban_ghi['pitch'])[None, :] > np.asarray(luoi.nguong_pitch, dtype=np.float64)[:, None]
+    yaw = np.abs(ban_ghi['yaw'])[None, :] > np.asarray(luoi.nguong_yaw, dtype=np.float64)[:, None]
+    return (pitch[:, None, :] | yaw[None, :, :]).reshape(-1, len(ban_ghi))
+
+
+def _tin_hieu_mat_tap_trung(ban_ghi: np.ndarray, luoi: LuoiNguong) -> np.ndarray:
+    tay_gan = (ban_ghi['co'] & int(CoKetQua.TAY_GAN_MAT)) != 0
+    thoi_gian = ban_ghi['thoi_gian_mat_tap_trung'][None, :]
+    return (thoi_gian >= np.asarray(luoi.nguong_thoi_gian, dtype=np.float64)[:, None]) & tay_gan
+
+
+TIN_HIEU: Dict[AlertType, Callable[[np.ndarray, LuoiNguong], np.ndarray]] = {
+    AlertType.DROWSINESS: _tin_hieu_buon_ngu,
+    AlertType.YAWN: _tin_hieu_ngap,
+    AlertType.HEAD_POSE: _tin_hieu_tu_the,
+    AlertType.DISTRACTION: _tin_hieu_mat_tap_trung,
+}
+
+
+# ---------- Đánh giá với nhãn ----------
+
+@dataclass
+class _TongHop:
+    """Tổng cộng dồn qua các chuyến đi cho một loại cảnh báo, mỗi mảng (số tổ hợp,)."""
+    dung: np.ndarray
+    sai: np.ndarray
+    trung: np.ndarray
+    tong_bao_truoc: np.ndarray
+    so_nhan: int = 0
+    so_gio: float = 0.0
+
+    @classmethod
+    def rong(cls, so_to_hop: int) -> _TongHop:
+        return cls(*(np.zeros(so_to_hop, dtype=kieu) for kieu in (np.int64, np.int64, np.int64, np.float64)))
+
+    def cong(self, khac: _TongHop) -> None:
+        self.dung += khac.dung
+        self.sai += khac.sai
+        self.trung += khac.trung
+        self.tong_bao_truoc += khac.tong_bao_truoc
+        self.so_nhan += khac.so_nhan
+        self.so_gio += khac.so_gio
+
+
+def _danh_gia(canh_bao: np.ndarray, ts: np.ndarray, khoang: np.ndarray, dung_sai_som: float) -> _TongHop:
+    """canh_bao (G, T) bool, ts (T,), khoang (K, 2) [bat_dau, ket_thuc] theo giây."""
+    so_to_hop, so_khung = canh_bao.shape
+    tong = _TongHop.rong(so_to_hop)
+    tong.so_nhan = len(khoang)
+    tong.so_gio = float(ts[-1] - ts[0]) / 3600 if so_khung > 1 else 0.0
+    # Khung thuộc nhãn k: [dau[k], cuoi[k]) - kể cả dung_sai_som trước nhãn
+    dau = np.searchsorted(ts, khoang[:, 0] - dung_sai_som, side='left').astype(np.int32)
+    cuoi = np.searchsorted(ts, khoang[:, 1], side='right').astype(np.int32)
+    bien = np.zeros(so_khung + 1, dtype=np.int32)
+    np.add.at(bien, dau, 1)
+    np.add.at(bien, cuoi, -1)
+    trong_nhan = np.cumsum(bien[:-1]) > 0
+    co_nhan = cuoi > dau
+    ts_cuoi = ts[np.maximum(cuoi - 1, 0)]
+    chi_so = np.arange(so_khung, dtype=np.int32)
+
+    for i in range(0, so_to_hop, _SO_HANG_MOI_LO):
+        lo = canh_bao[i:i + _SO_HANG_MOI_LO]
+        bat = lo.copy()
+        bat[:, 1:] &= ~lo[:, :-1]  # Cạnh lên = một lần bật cảnh báo
+        tong.dung[i:i + len(lo)] = np.count_nonzero(bat & trong_nhan, axis=1)
+        tong.sai[i:i + len(lo)] = np.count_nonzero(bat & ~trong_nhan, axis=1)
+        if not len(khoang):
+            continue
+        # Khung cảnh báo đầu tiên tại/sau mỗi khung (so_khung = không còn) - cực tiểu tích lũy từ cuối
+        ke_tiep = np.full((len(lo), so_khung + 1), so_khung, dtype=np.int32)
+        ke_tiep[:, :-1] = np.minimum.accumulate(np.where(lo, chi_so, so_khung)[:, ::-1], axis=1)[:, ::-1]
+        dau_tien = ke_tiep[:, dau]  # (lô, K)
+        trung = (dau_tien < cuoi) & co_nhan
+        tong.trung[i:i + len(lo)] = np.count_nonzero(trung, axis=1)
+        bao_truoc = ts_cuoi - ts[np.minimum(dau_tien, so_khung - 1)]
+        tong.tong_bao_truoc[i:i + len(lo)] = np.where(trung, bao_truoc, 0.0).sum(axis=1)
+    return tong
+
+
+def nap_chuyen_di(duong_dan: str) -> Tuple[np.ndarray, Dict[AlertType, np.ndarray]]:
+    """(bản ghi DTYPE_BAN_GHI theo thời gian, nhãn loại → (K, 2))."""
+    with open(duong_dan, "rb") as tep:
+        la_hop_den = tep.read(len(MA_HOP_DEN)) == MA_HOP_DEN
+    if la_hop_den:
+        with BoDocHopDen(duong_dan) as hop_den:
+            ban_ghi = np.concatenate(hop_den.cac_doan()) if hop_den.so_da_ghi else np.zeros(0, DTYPE_BAN_GHI)
+    else:
+        ban_ghi = np.fromfile(duong_dan, dtype=DTYPE_BAN_GHI)
+    nhan: Dict[AlertType, np.ndarray] = {}
+    duong_dan_nhan = os.path.splitext(duong_dan)[0] + DUOI_NHAN
+    if os.path.exists(duong_dan_nhan):
+        with open(duong_dan_nhan, encoding="utf-8") as tep:
+            for ten, khoang in json.load(tep).items():
+                nhan[AlertType[ten]] = np.asarray(khoang, dtype=np.float64).reshape(-1, 2)
+    return ban_ghi, nhan
+
+
+def danh_gia_chuyen_di(duong_dan: str, luoi: LuoiNguong) -> Dict[AlertType, _TongHop]:
+    """Chạy trong tiến trình con: nạp một chuyến đi, đánh giá cả lưới cho mọi loại đã gán nhãn."""
+    ban_ghi, nhan = nap_chuyen_di(duong_dan)
+    if len(ban_ghi) < 2:
+        return {}
+    ts = ban_ghi['timestamp']
+    return {loai: _danh_gia(TIN_HIEU[loai](ban_ghi, luoi), ts, khoang, luoi.dung_sai_som)
+            for loai, khoang in nhan.items()}
+
+
+# ---------- Kết quả ----------
+
+@dataclass
+class KetQuaHieuChinh:
+    loai: AlertType
+    ten_tham_so: Tuple[str, ...]
+    to_hop: np.ndarray  # (G, số ngưỡng)
+    precision: np.ndarray  # (G,)
+    recall: np.ndarray
+    f1: np.ndarray
+    bao_truoc_tb: np.ndarray  # Giây, NaN nếu không trúng nhãn nào
+    sai_moi_gio: np.ndarray
+    so_nhan: int
+    so_gio: float
+
+    @classmethod
+    def tu_tong_hop(cls, loai: AlertType, luoi: LuoiNguong, tong: _TongHop) -> KetQuaHieuChinh:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            precision = np.where(tong.dung + tong.sai > 0, tong.dung / (tong.dung + tong.sai), 0.0)
+            recall = tong.trung / tong.so_nhan if tong.so_nhan else np.zeros_like(precision)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+            bao_truoc = np.where(tong.trung > 0, tong.tong_bao_truoc / tong.trung, np.nan)
+        sai_moi_gio = tong.sai / tong.so_gio if tong.so_gio > 0 else np.zeros_like(precision)
+        return cls(loai, _THAM_SO[loai], luoi.to_hop(loai), precision, recall, f1, bao_truoc,
+                   sai_moi_gio, tong.so_nhan, tong.so_gio)
+
+    def tot_nhat(self, so_luong: int = 5, theo: str = 'f1') -> np.ndarray:
+        """Chỉ số các tổ hợp tốt nhất theo chỉ số `theo` (giảm dần)."""
+        return np.argsort(-getattr(self, theo), kind='stable')[:so_luong]
+
+    def chi_so_hien_tai(self) -> Optional[int]:
+        """Tổ hợp trùng giá trị đang dùng trong constants.py (None nếu không có trong lưới)."""
+        hien_tai = np.array([HIEN_TAI[ten] for ten in self.ten_tham_so])
+        khop = np.flatnonzero(np.all(np.isclose(self.to_hop, hien_tai), axis=1))
+        return int(khop[0]) if len(khop) else None
+
+    def dong(self, i: int) -> str:
+        tham_so = ", ".join(f"{ten}={gia_tri:g}" for ten, gia_tri in zip(self.ten_tham_so, self.to_hop[i]))
+        return (f"{tham_so:<40} P {self.precision[i]:.3f}  R {self.recall[i]:.3f}  F1 {self.f1[i]:.3f}  "
+                f"báo trước {self.bao_truoc_tb[i]:5.2f}s  sai/giờ {self.sai_moi_gio[i]:.1f}")
+
+
+def hieu_chinh(cac_chuyen_di: Sequence[str], luoi: Optional[LuoiNguong] = None,
+               so_tien_trinh: Optional[int] = None) -> Dict[AlertType, KetQuaHieuChinh]:
+    """Quét lưới trên mọi chuyến đi; so_tien_trinh=1 chạy trong tiến trình hiện tại."""
+    luoi = luoi or LuoiNguong()
+    tong: Dict[AlertType, _TongHop] = {}
+
+    def gop(mot_chuyen: Dict[AlertType, _TongHop]) -> None:
+        for loai, phan in mot_chuyen.items():
+            if loai in tong:
+                tong[loai].cong(phan)
+            else:
+                tong[loai] = phan
+
+    so_tien_trinh = so_tien_trinh or os.cpu_count() or 1
+    if so_tien_trinh <= 1 or len(cac_chuyen_di) <= 1:
+        for duong_dan in cac_chuyen_di:
+            gop(danh_gia_chuyen_di(duong_dan, luoi))
+    else:
+        with ProcessPoolExecutor(max_workers=min(so_tien_trinh, len(cac_chuyen_di))) as may:
+            for mot_chuyen in may.map(danh_gia_chuyen_di, cac_chuyen_di, [luoi] * len(cac_chuyen_di)):
+                gop(mot_chuyen)
+    return {loai: KetQuaHieuChinh.tu_tong_hop(loai, luoi, tong[loai]) for loai in AlertType if loai in tong}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("chuyen_di", nargs="+", help="File --output binary hoặc --black-box (kèm .labels.json)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Số tiến trình (mặc định: số CPU)")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--theo", choices=['f1', 'precision', 'recall'], default='f1')
+    parser.add_argument("--dung-sai-som", type=float, default=LuoiNguong.dung_sai_som)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    ket_qua = hieu_chinh(args.chuyen_di, LuoiNguong(dung_sai_som=args.dung_sai_som), args.jobs)
+    if not ket_qua:
+        logger.warning("Không có chuyến đi nào có nhãn (<tên>.labels.json)")
+        return 1
+    for loai, kq in ket_qua.items():
+        print(f"\n{loai.name}: {kq.so_nhan} nhãn, {kq.so_gio:.2f} giờ, {len(kq.to_hop)} tổ hợp")
+        hien_tai = kq.chi_so_hien_tai()
+        if hien_tai is not None:
+            print(f"  hiện tại  {kq.dong(hien_tai)}")
+        for hang, i in enumerate(kq.tot_nhat(args.top, args.theo), 1):
+            print(f"  #{hang:<8} {kq.dong(i)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
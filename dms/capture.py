@@ -0,0 +1,404 @@
+"""
+Nguồn khung hình - Camera, file video, thư mục ảnh
+
+Mọi nguồn trả về (thành_công, khung_hình, thời_điểm). Với nguồn ghi sẵn,
+thời điểm lấy từ PTS của container nên BoLocOneEuro và ngưỡng thời gian
+cảnh báo hoạt động giống hệt lúc chạy trực tiếp.
+
+Camera: chọn backend, FOURCC (MJPG - YUYV không nén thường bị giới hạn FPS
+thấp ở độ phân giải cao), CAP_PROP_BUFFERSIZE, phơi sáng thủ công. Sau khi
+mở, log định dạng thực tế camera chấp nhận (không phải giá trị yêu cầu) và
+FPS đo được. doc_moi_nhat: luồng grab riêng đọc liên tục, doc() lấy khung
+mới nhất và bỏ khung cũ - hàng đợi driver không dồn độ trễ khi phân tích chậm.
+
+Thời điểm khung camera: timestamp bộ đệm của driver (V4L2 đóng dấu
+CLOCK_MONOTONIC lúc nhận khung, OpenCV trả qua CAP_PROP_POS_MSEC) đổi sang
+time.time(), nên độ trễ thu hình → phân tích gồm cả thời gian khung nằm trong
+bộ đệm driver. Backend không có timestamp đó (POS_MSEC = 0 hoặc theo mốc
+khác) thì dùng lúc read() trả về.
+"""
+
+from __future__ import annotations
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import ContextManager, Generator, List, NamedTuple, Optional, Tuple, Union
+import cv2
+import numpy as np
+from .buffer_pool import BeBoDem
+from .pipeline import HangDoiBoCu
+
+logger = logging.getLogger(__name__)
+
+DUOI_ANH = ('.jpg', '.jpeg', '.png', '.bmp')
+
+KetQuaDoc = Tuple[bool, Optional[np.ndarray], float]
+
+TRE_DRIVER_TOI_DA = 5.0  # Giây; timestamp driver cũ hơn thế coi như không cùng mốc CLOCK_MONOTONIC
+
+
+CAC_BACKEND = {
+    'auto': cv2.CAP_ANY,
+    'v4l2': cv2.CAP_V4L2,
+    'dshow': cv2.CAP_DSHOW,
+    'msmf': cv2.CAP_MSMF,
+    'gstreamer': cv2.CAP_GSTREAMER,
+    'avfoundation': cv2.CAP_AVFOUNDATION,
+}
+
+
+@dataclass
+class CauHinhCamera:
+    id_camera: int = 0
+    chieu_rong: int = 640
+    chieu_cao: int = 480
+    fps: int = 30
+    fourcc: Optional[str] = None  # VD 'MJPG'; None = để driver chọn (thường YUYV)
+    so_bo_dem: Optional[int] = None  # CAP_PROP_BUFFERSIZE; 1 = driver giữ ít khung cũ nhất
+    backend: str = 'auto'  # Khóa của CAC_BACKEND
+    phoi_sang: Optional[float] = None  # CAP_PROP_EXPOSURE thủ công (đơn vị tùy backend); None = tự động
+    doc_moi_nhat: bool = False  # Luồng grab riêng, doc() luôn trả khung mới nhất
+
+
+class DinhDangCamera(NamedTuple):
+    """Giá trị camera thực sự chấp nhận, đọc lại sau khi set."""
+    backend: str
+    chieu_rong: int
+    chieu_cao: int
+    fourcc: str
+    fps: float
+    so_bo_dem: int
+    phoi_sang: float
+
+
+def _giai_ma_fourcc(gia_tri: float) -> str:
+    ma = int(gia_tri)
+    if ma <= 0:
+        return "?"
+    return "".join(chr((ma >> (8 * i)) & 0xFF) for i in range(4)).strip("\0 ") or "?"
+
+
+def _mo_ta_fps(fps: float) -> str:
+    return f"{fps:.1f}fps" if fps > 0 else "?fps"  # 0 = driver không báo
+
+
+def doc_dinh_dang(may_quay: cv2.VideoCapture) -> DinhDangCamera:
+    return DinhDangCamera(
+        backend=may_quay.getBackendName(),
+        chieu_rong=int(may_quay.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        chieu_cao=int(may_quay.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        fourcc=_giai_ma_fourcc(may_quay.get(cv2.CAP_PROP_FOURCC)),
+        fps=may_quay.get(cv2.CAP_PROP_FPS),
+        so_bo_dem=int(may_quay.get(cv2.CAP_PROP_BUFFERSIZE)),
+        phoi_sang=may_quay.get(cv2.CAP_PROP_EXPOSURE),
+    )
+
+
+@contextmanager
+def mo_camera(cau_hinh: CauHinhCamera) -> Generator[cv2.VideoCapture, None, None]:
+    if cau_hinh.backend not in CAC_BACKEND:
+        raise ValueError(f"Backend camera không hỗ trợ: {cau_hinh.backend} ({', '.join(CAC_BACKEND)})")
+    may_quay = cv2.VideoCapture(cau_hinh.id_camera, CAC_BACKEND[cau_hinh.backend])
+    if not may_quay.isOpened():
+        raise RuntimeError(f"Không thể mở camera {cau_hinh.id_camera}")
+    if cau_hinh.fourcc:
+        # Trước kích thước: V4L2 chọn chế độ theo cả định dạng lẫn kích thước
+        may_quay.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*cau_hinh.fourcc.upper().ljust(4)[:4]))
+    may_quay.set(cv2.CAP_PROP_FRAME_WIDTH, cau_hinh.chieu_rong)
+    may_quay.set(cv2.CAP_PROP_FRAME_HEIGHT, cau_hinh.chieu_cao)
+    may_quay.set(cv2.CAP_PROP_FPS, cau_hinh.fps)
+    if cau_hinh.so_bo_dem is not None:
+        may_quay.set(cv2.CAP_PROP_BUFFERSIZE, cau_hinh.so_bo_dem)
+    if cau_hinh.phoi_sang is not None:
+        # Tắt tự động phơi sáng: V4L2 dùng 1 = thủ công, DirectShow/MSMF dùng 0.25
+        may_quay.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1 if may_quay.getBackendName() == "V4L2" else 0.25)
+        may_quay.set(cv2.CAP_PROP_EXPOSURE, cau_hinh.phoi_sang)
+    dinh_dang = doc_dinh_dang(may_quay)
+    logger.info(f"Camera sẵn sàng: {dinh_dang.chieu_rong}x{dinh_dang.chieu_cao} {dinh_dang.fourcc} "
+                f"@{_mo_ta_fps(dinh_dang.fps)}, backend {dinh_dang.backend}, bộ đệm {dinh_dang.so_bo_dem}, "
+                f"phơi sáng {dinh_dang.phoi_sang:g}")
+    yeu_cau = (cau_hinh.chieu_rong, cau_hinh.chieu_cao, (cau_hinh.fourcc or dinh_dang.fourcc).upper())
+    # CAP_PROP_FPS = 0: driver không báo (nhiều backend) → không so FPS
+    if (dinh_dang.chieu_rong, dinh_dang.chieu_cao, dinh_dang.fourcc.upper()) != yeu_cau or \
+            (dinh_dang.fps > 0 and abs(dinh_dang.fps - cau_hinh.fps) > 0.5):
+        logger.warning(f"Camera không nhận cấu hình yêu cầu {cau_hinh.chieu_rong}x{cau_hinh.chieu_cao} "
+                       f"{(cau_hinh.fourcc or '').upper()} @{cau_hinh.fps}fps")
+    try:
+        yield may_quay
+    finally:
+        may_quay.release()
+
+
+@dataclass
+class ThongKeDoTre:
+    """Trung bình / tối đa độ trễ (giây), O(1) mỗi mẫu."""
+    so_mau: int = 0
+    tong: float = 0.0
+    toi_da: float = 0.0
+
+    def quan_sat(self, giay: float) -> None:
+        self.so_mau += 1
+        self.tong += giay
+        self.toi_da = max(self.toi_da, giay)
+
+    @property
+    def trung_binh(self) -> float:
+        return self.tong / self.so_mau if self.so_mau else 0.0
+
+
+@dataclass
+class NguonKhungHinh(ABC):
+    """Giao diện chung cho nguồn khung hình."""
+    la_truc_tiep: bool = field(default=False, init=False)  # True = camera, không tua được
+    be_bo_dem: Optional[BeBoDem] = field(default=None, init=False, repr=False)  # Đọc vào bộ đệm tái sử dụng
+    _hinh_dang_cuoi: Optional[tuple] = field(default=None, init=False, repr=False)
+
+    def mo(self) -> None:
+        pass
+
+    @abstractmethod
+    def doc(self) -> KetQuaDoc:
+        ...
+
+    def dong(self) -> None:
+        pass
+
+    def __enter__(self):
+        self.mo()
+        return self
+
+    def _doc_vao(self, may_quay: cv2.VideoCapture) -> Tuple[bool, Optional[np.ndarray]]:
+        """VideoCapture.read vào bộ đệm lấy từ pool (cùng shape khung trước) nếu có pool."""
+        if self.be_bo_dem is None or self._hinh_dang_cuoi is None:
+            thanh_cong, khung_hinh = may_quay.read()
+        else:
+            dich = self.be_bo_dem.lay(self._hinh_dang_cuoi)
+            thanh_cong, khung_hinh = may_quay.read(dich)
+            if khung_hinh is not dich:
+                self.be_bo_dem.tra(dich)
+        if thanh_cong:
+            self._hinh_dang_cuoi = khung_hinh.shape
+        return thanh_cong, khung_hinh
+
+    def __exit__(self, *args):
+        self.dong()
+
+
+@dataclass
+class NguonCamera(NguonKhungHinh):
+    """Camera trực tiếp, thời điểm = lúc driver nhận khung (timestamp bộ đệm) hoặc lúc read() trả về."""
+    cau_hinh: CauHinhCamera = field(default_factory=CauHinhCamera)
+    thoi_gian_do_fps: float = 2.0  # Log FPS đo được sau chừng này giây
+    dinh_dang: Optional[DinhDangCamera] = field(default=None, init=False)
+    so_khung_nhan: int = field(default=0, init=False)
+    _ngu_canh: Optional[ContextManager] = field(default=None, init=False, repr=False)
+    _may_quay: Optional[cv2.VideoCapture] = field(default=None, init=False, repr=False)
+    _moc_dau: Optional[float] = field(default=None, init=False, repr=False)
+    _moc_cuoi: float = field(default=0.0, init=False, repr=False)
+    _da_log_fps: bool = field(default=False, init=False, repr=False)
+    _moi_nhat: Optional[HangDoiBoCu] = field(default=None, init=False, repr=False)  # (ảnh, thời điểm)
+    _luong_grab: Optional[threading.Thread] = field(default=None, init=False, repr=False)
+    _su_kien_dung: threading.Event = field(default_factory=threading.Event, init=False, repr=False)
+    _ts_driver: Optional[bool] = field(default=None, init=False, repr=False)  # None = chưa xét khung đầu
+    _khoa_grab: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _grab_da_thoat: bool = field(default=True, init=False, repr=False)
+    _giao_cho_grab: Optional[ContextManager] = field(default=None, init=False, repr=False)  # Luồng grab tự release
+
+    def __post_init__(self) -> None:
+        self.la_truc_tiep = True
+
+    @property
+    def fps_do_duoc(self) -> float:
+        if self._moc_dau is None or self.so_khung_nhan < 2:
+            return 0.0
+        return (self.so_khung_nhan - 1) / max(self._moc_cuoi - self._moc_dau, 1e-6)
+
+    @property
+    def dung_ts_driver(self) -> bool:
+        """True nếu thời điểm khung lấy từ timestamp bộ đệm driver."""
+        return bool(self._ts_driver)
+
+    @property
+    def so_khung_bo(self) -> int:
+        """Khung bị khung mới hơn thay trước khi được đọc (chỉ với doc_moi_nhat)."""
+        return self._moi_nhat.so_bo if self._moi_nhat is not None else 0
+
+    def mo(self) -> None:
+        self._ngu_canh = mo_camera(self.cau_hinh)
+        self._may_quay = self._ngu_canh.__enter__()
+        self.dinh_dang = doc_dinh_dang(self._may_quay)
+        self.so_khung_nhan, self._moc_dau, self._da_log_fps = 0, None, False
+        self._ts_driver = None
+        if self.cau_hinh.doc_moi_nhat:
+            ham_bo = (lambda muc: self.be_bo_dem.tra(muc[0])) if self.be_bo_dem is not None else None
+            self._moi_nhat = HangDoiBoCu(1, ham_bo)
+            self._su_kien_dung.clear()
+            self._grab_da_thoat = False
+            self._luong_grab = threading.Thread(target=self._vong_grab, name="dms-grab", daemon=True)
+            self._luong_grab.start()
+
+    def _doc_camera(self) -> KetQuaDoc:
+        may_quay = self._may_quay  # dong() có thể bỏ tham chiếu khi luồng grab còn trong read()
+        thanh_cong, khung_hinh = self._doc_vao(may_quay)
+        ts = time.time()
+        if thanh_cong:
+            ts = self._thoi_diem_driver(may_quay, ts)
+            self._dem_khung(ts)
+        return thanh_cong, khung_hinh, ts
+
+    def _thoi_diem_driver(self, may_quay: cv2.VideoCapture, bay_gio: float) -> float:
+        """Timestamp bộ đệm (CLOCK_MONOTONIC) → time.time(); không hợp lệ thì giữ bay_gio."""
+        if self._ts_driver is False:
+            return bay_gio
+        tre = time.monotonic() - may_quay.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        hop_le = 0.0 <= tre < TRE_DRIVER_TOI_DA
+        if self._ts_driver is None:
+            self._ts_driver = hop_le
+            logger.info("Camera: thời điểm khung = timestamp bộ đệm driver" if hop_le else
+                        "Camera: driver không có timestamp bộ đệm, thời điểm khung = lúc read() trả về "
+                        "(độ trễ thu hình không gồm thời gian trong bộ đệm driver)")
+        return bay_gio - tre if hop_le else bay_gio
+
+    def _dem_khung(self, ts: float) -> None:
+        if self._moc_dau is None:
+            self._moc_dau = ts
+        self._moc_cuoi = ts
+        self.so_khung_nhan += 1
+        if not self._da_log_fps and ts - self._moc_dau >= self.thoi_gian_do_fps:
+            self._da_log_fps = True
+            logger.info(f"Camera: đo được {self.fps_do_duoc:.1f}fps "
+                        f"(driver báo {_mo_ta_fps(self.dinh_dang.fps)})")
+
+    def _vong_grab(self) -> None:
+        """
+        Đọc liên tục; khung chưa được lấy bị khung mới thay (ảnh cũ trả về pool).
+        Nếu dong() hết giờ chờ khi luồng còn trong read(), luồng tự release camera lúc thoát.
+        """
+        moi_nhat = self._moi_nhat
+        try:
+            while not self._su_kien_dung.is_set():
+                thanh_cong, khung_hinh, ts = self._doc_camera()
+                if not thanh_cong:
+                    logger.warning("Camera ngừng trả khung")
+                    break
+                moi_nhat.dat((khung_hinh, ts))
+        finally:
+            moi_nhat.dong()
+            with self._khoa_grab:
+                self._grab_da_thoat = True
+                ngu_canh, self._giao_cho_grab = self._giao_cho_grab, None
+            if ngu_canh is not None:
+                ngu_canh.__exit__(None, None, None)
+                logger.info("Camera: luồng grab đã thoát, đã giải phóng camera")
+
+    def doc(self) -> KetQuaDoc:
+        if self._moi_nhat is None:
+            return self._doc_camera()
+        muc = self._moi_nhat.lay()
+        if muc is None:
+            return False, None, time.time()
+        khung_hinh, ts = muc
+        return True, khung_hinh, ts
+
+    def dong(self) -> None:
+        ngu_canh = self._ngu_canh
+        if self._luong_grab is not None:
+            self._su_kien_dung.set()
+            self._luong_grab.join(2.0)
+            with self._khoa_grab:
+                if not self._grab_da_thoat:
+                    # Không release khi luồng grab còn trong read(): giao cho luồng tự release
+                    self._giao_cho_grab, ngu_canh = ngu_canh, None
+                    logger.warning("Camera: luồng grab còn chờ read(), camera được giải phóng khi luồng thoát")
+            self._luong_grab = None
+        if self._ngu_canh is not None:
+            logger.info(f"Camera: nhận {self.so_khung_nhan} khung, {self.fps_do_duoc:.1f}fps đo được, "
+                        f"bỏ {self.so_khung_bo} khung cũ")
+            self._ngu_canh = self._may_quay = None
+        if ngu_canh is not None:
+            ngu_canh.__exit__(None, None, None)
+
+
+@dataclass
+class NguonVideo(NguonKhungHinh):
+    """
+    File video ghi sẵn.
+    - thoi_diem_bat_dau: mốc cộng vào PTS (mặc định time.time() lúc mở,
+      tránh timestamp 0 bị BoLocOneEuro coi là "không có")
+    """
+    duong_dan: str = ""
+    thoi_diem_bat_dau: Optional[float] = None
+    _may_quay: Optional[cv2.VideoCapture] = field(default=None, init=False, repr=False)
+    _fps: float = field(default=30.0, init=False, repr=False)
+    _so_khung: int = field(default=0, init=False, repr=False)
+
+    def mo(self) -> None:
+        self._may_quay = cv2.VideoCapture(self.duong_dan)
+        if not self._may_quay.isOpened():
+            raise RuntimeError(f"Không thể mở video {self.duong_dan}")
+        self._fps = self._may_quay.get(cv2.CAP_PROP_FPS) or 30.0
+        self._so_khung = 0
+        if self.thoi_diem_bat_dau is None:
+            self.thoi_diem_bat_dau = time.time()
+        logger.info(f"Video sẵn sàng: {self.duong_dan} "
+                    f"({int(self._may_quay.get(cv2.CAP_PROP_FRAME_COUNT))} khung @{self._fps:.1f}fps)")
+
+    def doc(self) -> KetQuaDoc:
+        thanh_cong, khung_hinh = self._doc_vao(self._may_quay)
+        if not thanh_cong:
+            return False, None, 0.0
+        pts = self._may_quay.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if pts <= 0.0 and self._so_khung > 0:
+            # Container không có PTS: suy từ số thứ tự khung
+            pts = self._so_khung / self._fps
+        self._so_khung += 1
+        return True, khung_hinh, self.thoi_diem_bat_dau + pts
+
+    def dong(self) -> None:
+        if self._may_quay is not None:
+            self._may_quay.release()
+            self._may_quay = None
+
+
+@dataclass
+class NguonThuMucAnh(NguonKhungHinh):
+    """Thư mục ảnh, sắp xếp theo tên; thời điểm = chỉ số / fps."""
+    duong_dan: str = ""
+    fps: float = 30.0
+    thoi_diem_bat_dau: Optional[float] = None
+    _danh_sach: List[Path] = field(default_factory=list, init=False, repr=False)
+    _chi_so: int = field(default=0, init=False, repr=False)
+
+    def mo(self) -> None:
+        self._danh_sach = sorted(p for p in Path(self.duong_dan).iterdir()
+                                 if p.suffix.lower() in DUOI_ANH)
+        if not self._danh_sach:
+            raise RuntimeError(f"Không có ảnh trong {self.duong_dan}")
+        self._chi_so = 0
+        if self.thoi_diem_bat_dau is None:
+            self.thoi_diem_bat_dau = time.time()
+        logger.info(f"Thư mục ảnh sẵn sàng: {self.duong_dan} ({len(self._danh_sach)} ảnh)")
+
+    def doc(self) -> KetQuaDoc:
+        while self._chi_so < len(self._danh_sach):
+            duong_dan = self._danh_sach[self._chi_so]
+            ts = self.thoi_diem_bat_dau + self._chi_so / self.fps
+            self._chi_so += 1
+            khung_hinh = cv2.imread(str(duong_dan))
+            if khung_hinh is not None:
+                return True, khung_hinh, ts
+            logger.warning(f"Bỏ qua ảnh không đọc được: {duong_dan}")
+        return False, None, 0.0
+
+
+def tao_nguon(nguon: Union[int, str], cau_hinh: Optional[CauHinhCamera] = None) -> NguonKhungHinh:
+    """int / chuỗi số → camera, thư mục → ảnh, còn lại → file video. Không sửa cau_hinh của người gọi."""
+    if isinstance(nguon, int) or str(nguon).isdigit():
+        return NguonCamera(cau_hinh=replace(cau_hinh or CauHinhCamera(), id_camera=int(nguon)))
+    if Path(nguon).is_dir():
+        return NguonThuMucAnh(duong_dan=str(nguon))
+    return NguonVideo(duong_dan=str(nguon))
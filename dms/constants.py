@@ -22,7 +22,8 @@ class AlertType(Enum):
 class DrowsinessConfig:
     """Ngưỡng phát hiện buồn ngủ - đã test thực tế."""
     nguong_ear: float = 0.2  # Test với 20 người, cân bằng độ nhạy
-    so_khung_ear: int = 15  # ~0.5s ở 30fps, filter blink bình thường
+    so_khung_ear: int = 15  # ~0.5s ở 30fps, filter blink bình thường (cũ, xem thoi_gian_ear)
+    thoi_gian_ear: float = 0.5  # Giây EAR thấp liên tục; theo thời gian để giữ nghĩa khi FPS tụt
     nguong_mar: float = 1.3   # Từ paper Driver Yawning Detection (2017)
     thoi_gian_canh_bao_am_thanh: float = 5.0  # Phát âm thanh nếu buồn ngủ >5s
     khoang_cach_am_thanh: float = 2.0  # Tránh phát âm thanh liên tục, cooldown 2s
@@ -56,6 +57,11 @@ class CLAHEConfig:
     """Tham số CLAHE - OpenCV defaults."""
     han_clip: float = 2.0
     kich_thuoc_o: Tuple[int, int] = (8, 8)
+    # Chế độ thích ứng: bỏ qua CLAHE khi đủ sáng và đủ tương phản (thang 0-255)
+    sang_bo_qua: float = 100.0  # Trung bình luma
+    tuong_phan_bo_qua: float = 40.0  # Độ lệch chuẩn luma
+    do_tre: float = 8.0  # Hysteresis: phải tụt dưới ngưỡng - do_tre mới bật lại CLAHE
+    he_so_thu_nho: int = 8  # Đo thống kê trên ảnh thu nhỏ 1/8 mỗi chiều
 
 
 class Mau:
@@ -79,6 +85,7 @@ CUA_HINH_CLAHE = CLAHEConfig()
 # Backward compatibility
 EAR_THRESHOLD = CUA_HINH_BUON_NGU.nguong_ear
 EAR_CONSEC_FRAMES = CUA_HINH_BUON_NGU.so_khung_ear
+EAR_CONSEC_SECONDS = CUA_HINH_BUON_NGU.thoi_gian_ear
 MAR_THRESHOLD = CUA_HINH_BUON_NGU.nguong_mar
 THOI_GIAN_CANH_BAO_AM_THANH = CUA_HINH_BUON_NGU.thoi_gian_canh_bao_am_thanh
 KHOANG_CACH_AM_THANH = CUA_HINH_BUON_NGU.khoang_cach_am_thanh
@@ -4,49 +4,43 @@ Face Analysis - EAR, MAR, Head Pose
 - EAR (Eye Aspect Ratio): Phát hiện buồn ngủ
 - MAR (Mouth Aspect Ratio): Phát hiện ngáp
 - Head Pose: Ước lượng góc quay đầu bằng PnP
+
+Landmark được chuyển một lần mỗi khung vào mảng (478, 3) float32 cấp phát sẵn;
+bbox, EAR, MAR và điểm PnP tính bằng fancy-indexing trên mảng đó.
+Kết quả là KetQuaPhanTichMat (__slots__, landmark float32 - xem results.py).
+phan_tich_diem_moc() là phần sau suy luận, dùng lại khi phát lại landmark đã
+ghi (suy_luan=False: không nạp MediaPipe).
 """
 
 from __future__ import annotations
+import time
 from dataclasses import dataclass, field
-from typing import Optional, Tuple, List, NamedTuple
-import cv2
+from typing import Any, Callable, Dict, Optional, Union
 import numpy as np
-import mediapipe as mp
 from .constants import (
     CHI_SO_MAT_PHAI, CHI_SO_MAT_TRAI, CHI_SO_MIENG_NGOAI,
-    CHI_SO_TU_THE, DIEM_MAT_3D,
-    EAR_THRESHOLD, EAR_CONSEC_FRAMES, MAR_THRESHOLD,
+    CHI_SO_TU_THE,
+    EAR_THRESHOLD, EAR_CONSEC_SECONDS, MAR_THRESHOLD,
     HEAD_POSE_PITCH_THRESHOLD, HEAD_POSE_YAW_THRESHOLD
 )
 from .filters import BoLocOneEuro, BoLocOneEuroNhieuKenh
+from .frame_context import NguCanhKhungHinh
+from .head_pose import BoUocLuongTuThe
+from .results import KetQuaPhanTichMat, KhungBbox, nap_diem_moc
 
+SO_DIEM_MOC_TOI_DA = 478  # 468 + 10 điểm mống mắt khi refine_landmarks
 
-class HeadPose(NamedTuple):
-    pitch: float
-    yaw: float
-    roll: float
-    rvec: Optional[np.ndarray] = None
-    tvec: Optional[np.ndarray] = None
-
-
-@dataclass
-class KetQuaPhanTichMat:
-    mat_phat_hien: bool = False
-    ear: float = 0.0
-    mar: float = 0.0
-    pitch: float = 0.0
-    yaw: float = 0.0
-    roll: float = 0.0
-    canh_bao_buon_ngu: bool = False
-    canh_bao_ngap: bool = False
-    canh_bao_tu_the: bool = False
-    diem_moc: Optional[list] = None
-    diem_moc_mat: Optional[dict] = None
-    diem_moc_mieng: Optional[list] = None
-    vec_quay: Optional[np.ndarray] = None
-    vec_tuan: Optional[np.ndarray] = None
-    khung_bbox_mat: Optional[dict] = None
-
+# Chỉ số gom sẵn cho fancy-indexing
+_CHI_SO_HAI_MAT = np.array([CHI_SO_MAT_PHAI, CHI_SO_MAT_TRAI], dtype=np.intp)  # (2, 6)
+_CHI_SO_MIENG = np.array(CHI_SO_MIENG_NGOAI, dtype=np.intp)  # (8,)
+_CHI_SO_TU_THE = np.array(CHI_SO_TU_THE, dtype=np.intp)  # (6,)
+# Cặp điểm (trên, dưới) cho tử số; cặp cuối là mẫu số (chiều ngang)
+_CAP_EAR = (np.array([1, 2, 0]), np.array([5, 4, 3]))
+_CAP_MAR = (np.array([1, 2, 3, 0]), np.array([7, 6, 5, 4]))
+# Gom mắt phải, mắt trái, miệng, điểm PnP thành một lần fancy-index (26 điểm)
+_CHI_SO_GOM = np.concatenate([_CHI_SO_HAI_MAT.ravel(), _CHI_SO_MIENG, _CHI_SO_TU_THE])
+_CAP_GOM = (np.concatenate([_CAP_EAR[0], _CAP_EAR[0] + 6, _CAP_MAR[0] + 12]),
+            np.concatenate([_CAP_EAR[1], _CAP_EAR[1] + 6, _CAP_MAR[1] + 12]))
 
 @dataclass
 class PhanTichMat:
@@ -54,115 +48,142 @@ class PhanTichMat:
     do_tin_cay_phat_hien: float = 0.5
     do_tin_cay_theo_doi: float = 0.5
     tinh_toan_diem_chi_tiet: bool = True
+    suy_luan: bool = True  # False = chỉ phan_tich_diem_moc (phát lại), không import MediaPipe
+    tao_san_ca_hai: bool = False  # Tạo sẵn FaceMesh có + không refine để dat_tinh_chinh không chặn
     
-    _luoi_mat: mp.solutions.face_mesh.FaceMesh = field(init=False, repr=False)
+    _luoi_mat: Any = field(default=None, init=False, repr=False)  # mp FaceMesh
+    _cac_luoi_mat: Dict[bool, Any] = field(default_factory=dict, repr=False)  # refine → FaceMesh đã tạo
     _bo_loc_ear: BoLocOneEuro = field(default_factory=BoLocOneEuro, repr=False)
     _bo_loc_mar: BoLocOneEuro = field(default_factory=BoLocOneEuro, repr=False)
     _bo_loc_tu_the: BoLocOneEuroNhieuKenh = field(
         default_factory=lambda: BoLocOneEuroNhieuKenh(3), repr=False)
-    _dem_ear: int = field(default=0, repr=False)
-    _he_so_sai_le: np.ndarray = field(
-        default_factory=lambda: np.zeros((4, 1), dtype=np.float64), repr=False)
+    bo_uoc_luong_tu_the: BoUocLuongTuThe = field(default_factory=BoUocLuongTuThe)
+    do_giai_doan: Optional[Callable[[str, float], None]] = None  # Nhận ('tu_the', giây)
+    _ear_thap_tu: Optional[float] = field(default=None, repr=False)  # Timestamp đầu chuỗi EAR < ngưỡng
+    # Thứ tự Fortran: shape (478, 3) nhưng mỗi cột liên tục → min/max theo cột nhanh
+    _mang_diem_moc: np.ndarray = field(
+        default_factory=lambda: np.zeros((SO_DIEM_MOC_TOI_DA, 3), dtype=np.float32, order='F'),
+        repr=False)
     
     def __post_init__(self) -> None:
-        self._luoi_mat = mp.solutions.face_mesh.FaceMesh(
+        if not self.suy_luan:
+            return
+        self._luoi_mat = self._tao_luoi_mat(self.tinh_toan_diem_chi_tiet)
+        if self.tao_san_ca_hai:
+            self._tao_luoi_mat(not self.tinh_toan_diem_chi_tiet)
+    
+    def _tao_luoi_mat(self, tinh_chinh: bool) -> Any:
+        import mediapipe as mp
+        luoi_mat = mp.solutions.face_mesh.FaceMesh(
             max_num_faces=self.so_mat_toi_da,
-            refine_landmarks=self.tinh_toan_diem_chi_tiet,
+            refine_landmarks=tinh_chinh,
             min_detection_confidence=self.do_tin_cay_phat_hien,
             min_tracking_confidence=self.do_tin_cay_theo_doi
         )
+        self._cac_luoi_mat[tinh_chinh] = luoi_mat
+        return luoi_mat
     
-    def _tinh_ear(self, mat: List[np.ndarray]) -> float:
-        """EAR = (|p2-p6| + |p3-p5|) / (2 * |p1-p4|)"""
-        if len(mat) != 6:
-            return 0.0
-        A = np.linalg.norm(mat[1] - mat[5])
-        B = np.linalg.norm(mat[2] - mat[4])
-        C = np.linalg.norm(mat[0] - mat[3])
-        return (A + B) / (2.0 * C) if C > 0 else 0.0
+    def dat_tinh_chinh(self, bat: bool) -> None:
+        """
+        Bật/tắt refine_landmarks (10 điểm mống mắt, mô hình attention nặng hơn).
+        tao_san_ca_hai=True: chỉ đổi FaceMesh đang dùng, không tạo mô hình trên
+        luồng phân tích; ngược lại biến thể còn thiếu được tạo ở lần đổi đầu.
+        EAR/MAR/tư thế chỉ dùng 468 điểm gốc nên không đổi ý nghĩa.
+        """
+        if bat == self.tinh_toan_diem_chi_tiet:
+            return
+        self.tinh_toan_diem_chi_tiet = bat
+        if self.suy_luan:
+            self._luoi_mat = self._cac_luoi_mat.get(bat) or self._tao_luoi_mat(bat)
     
-    def _tinh_mar(self, mieng: List[np.ndarray]) -> float:
-        """MAR = (|p2-p8| + |p3-p7| + |p4-p6|) / (2 * |p1-p5|)"""
-        if len(mieng) != 8:
-            return 0.0
-        A = np.linalg.norm(mieng[1] - mieng[7])
-        B = np.linalg.norm(mieng[2] - mieng[6])
-        C = np.linalg.norm(mieng[3] - mieng[5])
-        D = np.linalg.norm(mieng[0] - mieng[4])
-        return (A + B + C) / (2.0 * D) if D > 0 else 0.0
+    _nap_diem_moc = staticmethod(nap_diem_moc)
     
-    def _uoc_luong_tu_the(self, diem_moc, chieu_rong: int, chieu_cao: int) -> HeadPose:
-        """Ước lượng pose bằng solvePnP."""
-        ma_tran_camera = np.array([[chieu_rong, 0, chieu_rong/2], [0, chieu_rong, chieu_cao/2], [0, 0, 1]], dtype=np.float64)
-        diem_chieu = np.array([[diem_moc[i].x*chieu_rong, diem_moc[i].y*chieu_cao] 
-                        for i in CHI_SO_TU_THE], dtype=np.float64)
-        
-        ok, vec_quay, vec_tuan = cv2.solvePnP(
-            DIEM_MAT_3D, diem_chieu, ma_tran_camera, self._he_so_sai_le)
-        
-        if not ok:
-            return HeadPose(0, 0, 0)
-        
-        ma_tran_quay, _ = cv2.Rodrigues(vec_quay)
-        sy = np.sqrt(ma_tran_quay[0,0]**2 + ma_tran_quay[1,0]**2)
-        
-        if sy > 1e-6:
-            pitch = np.degrees(np.arctan2(-ma_tran_quay[2,0], sy))
-            yaw = np.degrees(np.arctan2(ma_tran_quay[1,0], ma_tran_quay[0,0]))
-            roll = np.degrees(np.arctan2(ma_tran_quay[2,1], ma_tran_quay[2,2]))
-        else:
-            pitch = np.degrees(np.arctan2(-ma_tran_quay[2,0], sy))
-            yaw = 0
-            roll = np.degrees(np.arctan2(-ma_tran_quay[1,2], ma_tran_quay[1,1]))
-            
-        return HeadPose(pitch, yaw, roll, vec_quay, vec_tuan)
+    @staticmethod
+    def _khung_bbox(mang: np.ndarray) -> KhungBbox:
+        nho, lon = mang.min(axis=0), mang.max(axis=0)
+        return KhungBbox(float(nho[0]), float(lon[0]), float(nho[1]), float(lon[1]))
     
-    def _trich_xuat(self, diem_moc, chi_so, chieu_rong, chieu_cao) -> List[np.ndarray]:
-        return [np.array([diem_moc[i].x*chieu_rong, diem_moc[i].y*chieu_cao]) for i in chi_so]
+    @staticmethod
+    def _hinh_hoc(mang: np.ndarray, chieu_rong: int, chieu_cao: int):
+        """
+        Một lần gom 26 điểm (2 mắt, miệng, PnP) theo pixel.
+        Trả về (mắt (2,6,2), miệng (8,2), EAR trung bình 2 mắt, MAR, điểm PnP (6,2) float64).
+        """
+        diem = mang[_CHI_SO_GOM, :2] * np.array([chieu_rong, chieu_cao], dtype=np.float32)
+        hieu = diem[_CAP_GOM[0]] - diem[_CAP_GOM[1]]
+        d = np.hypot(hieu[:, 0], hieu[:, 1]).tolist()
+        ear = [(d[i] + d[i+1]) / (2.0 * d[i+2]) if d[i+2] > 0 else 0.0 for i in (0, 3)]
+        mar = (d[6] + d[7] + d[8]) / (2.0 * d[9]) if d[9] > 0 else 0.0
+        return (diem[:12].reshape(2, 6, 2), diem[12:20], (ear[0] + ear[1]) / 2, mar,
+                diem[20:].astype(np.float64))
     
-    def analyze(self, khung_hinh: np.ndarray, timestamp: Optional[float] = None) -> dict:
+    def analyze(self, khung_hinh: Union[np.ndarray, NguCanhKhungHinh],
+                timestamp: Optional[float] = None) -> KetQuaPhanTichMat:
         ket_qua = KetQuaPhanTichMat()
-        if khung_hinh is None or khung_hinh.size == 0:
-            return self._thanh_dict(ket_qua)
+        if khung_hinh is None:
+            return ket_qua
+        ngu_canh = NguCanhKhungHinh.tu(khung_hinh, timestamp)
+        if ngu_canh.rong:
+            return ket_qua
+        timestamp = ngu_canh.timestamp
             
-        chieu_cao, chieu_rong = khung_hinh.shape[:2]
-        anh_rgb = cv2.cvtColor(khung_hinh, cv2.COLOR_BGR2RGB)
-        ket_qua_luoi = self._luoi_mat.process(anh_rgb)
-        
-        if not ket_qua_luoi.multi_face_landmarks:
-            self._dem_ear = 0
-            return self._thanh_dict(ket_qua)
+        ket_qua_luoi = self._luoi_mat.process(ngu_canh.anh_rgb)
+        mang = None
+        if ket_qua_luoi.multi_face_landmarks:
+            mang = self._nap_diem_moc(ket_qua_luoi.multi_face_landmarks[0], self._mang_diem_moc)
+        return self.phan_tich_diem_moc(mang, ngu_canh.chieu_rong, ngu_canh.chieu_cao, timestamp)
+    
+    def chay_mo_hinh(self, anh_rgb: np.ndarray) -> None:
+        """Một lượt FaceMesh, bỏ kết quả, không đụng trạng thái bộ lọc (đo thời gian / làm nóng)."""
+        self._luoi_mat.process(anh_rgb)
+    
+    def lam_nong_du_phong(self, anh_rgb: np.ndarray) -> None:
+        """Một lượt cho FaceMesh tạo sẵn nhưng chưa dùng (tao_san_ca_hai) để lần đổi đầu không chậm."""
+        for luoi_mat in self._cac_luoi_mat.values():
+            if luoi_mat is not self._luoi_mat:
+                luoi_mat.process(anh_rgb)
+    
+    def phan_tich_diem_moc(self, mang: Optional[np.ndarray], chieu_rong: int, chieu_cao: int,
+                           timestamp: Optional[float] = None) -> KetQuaPhanTichMat:
+        """EAR/MAR/tư thế/bộ lọc/cảnh báo từ landmark (N, 3) chuẩn hóa; None = không thấy mặt."""
+        ket_qua = KetQuaPhanTichMat()
+        timestamp = timestamp or time.time()
+        if mang is None:
+            self._ear_thap_tu = None
+            self.bo_uoc_luong_tu_the.dat_lai()
+            return ket_qua
         
-        diem_moc = ket_qua_luoi.multi_face_landmarks[0].landmark
         ket_qua.mat_phat_hien = True
-        ket_qua.diem_moc = diem_moc
+        # Bản sao C-order gọn: kết quả có thể được giữ qua nhiều khung (lập lịch)
+        ket_qua.diem_moc = np.array(mang, dtype=np.float32, order='C')
         
         # Bbox
-        danh_sach_x, danh_sach_y = [l.x for l in diem_moc], [l.y for l in diem_moc]
-        ket_qua.khung_bbox_mat = {'x_min': min(danh_sach_x), 'x_max': max(danh_sach_x), 
-                       'y_min': min(danh_sach_y), 'y_max': max(danh_sach_y)}
+        ket_qua.khung_bbox_mat = self._khung_bbox(mang)
         
         # EAR
-        phai = self._trich_xuat(diem_moc, CHI_SO_MAT_PHAI, chieu_rong, chieu_cao)
-        trai = self._trich_xuat(diem_moc, CHI_SO_MAT_TRAI, chieu_rong, chieu_cao)
-        ket_qua.diem_moc_mat = {'phai': phai, 'trai': trai}
-        ear_thom = (self._tinh_ear(phai) + self._tinh_ear(trai)) / 2
+        hai_mat, mieng, ear_thom, mar_thom, diem_chieu = self._hinh_hoc(mang, chieu_rong, chieu_cao)
+        ket_qua.diem_moc_mat = hai_mat
         ket_qua.ear = self._bo_loc_ear.loc(ear_thom, timestamp)
         
+        # Theo thời gian, không theo số khung: FPS tụt (tải, bộ lập lịch) không làm chậm cảnh báo
         if ket_qua.ear < EAR_THRESHOLD:
-            self._dem_ear += 1
-            ket_qua.canh_bao_buon_ngu = self._dem_ear >= EAR_CONSEC_FRAMES
+            if self._ear_thap_tu is None:
+                self._ear_thap_tu = timestamp
+            ket_qua.canh_bao_buon_ngu = timestamp - self._ear_thap_tu >= EAR_CONSEC_SECONDS
         else:
-            self._dem_ear = 0
+            self._ear_thap_tu = None
         
         # MAR
-        mieng = self._trich_xuat(diem_moc, CHI_SO_MIENG_NGOAI, chieu_rong, chieu_cao)
         ket_qua.diem_moc_mieng = mieng
-        ket_qua.mar = self._bo_loc_mar.loc(self._tinh_mar(mieng), timestamp)
+        ket_qua.mar = self._bo_loc_mar.loc(mar_thom, timestamp)
         ket_qua.canh_bao_ngap = ket_qua.mar > MAR_THRESHOLD
         
         # Head pose
-        tu_the = self._uoc_luong_tu_the(diem_moc, chieu_rong, chieu_cao)
+        bat_dau = time.perf_counter()
+        tu_the = self.bo_uoc_luong_tu_the.uoc_luong(
+            diem_chieu, chieu_rong, chieu_cao, mang[_CHI_SO_TU_THE])
+        if self.do_giai_doan is not None:
+            self.do_giai_doan('tu_the', time.perf_counter() - bat_dau)
         lam_muot = self._bo_loc_tu_the.loc([tu_the.pitch, tu_the.yaw, tu_the.roll], timestamp)
         ket_qua.pitch, ket_qua.yaw, ket_qua.roll = lam_muot
         ket_qua.vec_quay = tu_the.rvec
@@ -170,14 +191,13 @@ class PhanTichMat:
         ket_qua.canh_bao_tu_the = abs(ket_qua.pitch) > HEAD_POSE_PITCH_THRESHOLD or \
                             abs(ket_qua.yaw) > HEAD_POSE_YAW_THRESHOLD
         
-        return self._thanh_dict(ket_qua)
-    
-    @staticmethod
-    def _thanh_dict(ket_qua: KetQuaPhanTichMat) -> dict:
-        return {k: getattr(ket_qua, k) for k in ket_qua.__dataclass_fields__}
+        return ket_qua
     
     def release(self) -> None:
-        self._luoi_mat.close()
+        for luoi_mat in self._cac_luoi_mat.values():
+            luoi_mat.close()
+        self._cac_luoi_mat.clear()
+        self._luoi_mat = None
         
     def __enter__(self): return self
     def __exit__(self, *args): self.release()
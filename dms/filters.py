@@ -10,6 +10,7 @@ import math
 import time
 from dataclasses import dataclass, field
 from typing import Optional, List
+import numpy as np
 from .constants import CUA_HINH_BO_LOC
 
 
@@ -100,3 +101,58 @@ class BoLocOneEuroNhieuKenh:
             
     def loc(self, gia_tri: List[float], timestamp: Optional[float] = None) -> List[float]:
         return [self._danh_sach_bo_loc[i].loc(gia_tri[i], timestamp) for i in range(len(gia_tri))]
+
+
+@dataclass
+class BoLocOneEuroVector:
+    """
+    One-Euro filter cho mảng N chiều (VD: 478×3 landmark), trạng thái lưu trong
+    mảng liên tục và lọc cả mảng trong một lần gọi. Kết quả trùng khớp với
+    BoLocOneEuro chạy riêng từng phần tử (cùng thứ tự phép tính).
+    Dùng thay BoLocOneEuroNhieuKenh: loc(gia_tri, timestamp) → np.ndarray.
+    """
+    so_kenh: int = 3  # Chỉ để tương thích BoLocOneEuroNhieuKenh; shape lấy từ lần lọc đầu
+    cutoff_toi_thieu: float = field(default_factory=lambda: CUA_HINH_BO_LOC.cutoff_toi_thieu)
+    beta: float = field(default_factory=lambda: CUA_HINH_BO_LOC.beta)
+    cutoff_dao_ham: float = field(default_factory=lambda: CUA_HINH_BO_LOC.cutoff_dao_ham)
+
+    _x: Optional[np.ndarray] = field(default=None, repr=False)
+    _dx: Optional[np.ndarray] = field(default=None, repr=False)
+    _thoi_gian_truoc: Optional[float] = field(default=None, repr=False)
+
+    def dat_lai(self) -> None:
+        self._thoi_gian_truoc = None
+
+    @staticmethod
+    def _tinh_alpha(cutoff, te: float):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / te)
+
+    def loc(self, gia_tri, timestamp: Optional[float] = None) -> np.ndarray:
+        x = np.asarray(gia_tri, dtype=np.float64)
+        timestamp = timestamp or time.time()
+
+        if self._thoi_gian_truoc is None or self._x is None or self._x.shape != x.shape:
+            self._thoi_gian_truoc = timestamp
+            self._x = x.copy()
+            self._dx = np.zeros_like(x)
+            return x.copy()
+
+        te = max(timestamp - self._thoi_gian_truoc, 1.0 / 30.0)
+        self._thoi_gian_truoc = timestamp
+
+        # dx = 0 khi giá trị trước bằng 0 (giữ đúng hành vi `_y or x` của BoLocOneEuro)
+        dx = np.subtract(x, self._x)
+        dx /= te
+        dx[self._x == 0.0] = 0.0
+        alpha_d = self._tinh_alpha(self.cutoff_dao_ham, te)
+        self._dx *= (1 - alpha_d)
+        self._dx += alpha_d * dx
+
+        cutoff = np.abs(self._dx)
+        cutoff *= self.beta
+        cutoff += self.cutoff_toi_thieu
+        alpha = self._tinh_alpha(cutoff, te)
+
+        self._x = alpha * x + (1 - alpha) * self._x
+        return self._x.copy()
@@ -0,0 +1,63 @@
+"""
+Ngữ cảnh khung hình - Dữ liệu dùng chung giữa các bộ phân tích
+
+_xu_ly tạo một NguCanhKhungHinh mỗi khung; ảnh dẫn xuất (RGB, ...) tính
+lười và cache lại nên FaceMesh và Hands không phải chuyển màu hai lần.
+Có be_bo_dem thì ảnh dẫn xuất lấy từ pool; giai_phong() trả lại sau khung.
+
+anh_suy_luan (tùy chọn) là ảnh đã thu nhỏ cho mô hình - anh_rgb lấy từ đó;
+chieu_rong/chieu_cao vẫn là kích thước khung thu, dùng cho mọi phép tính hình
+học trên landmark chuẩn hóa (xem resolution.py).
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Optional, Union
+import cv2
+import numpy as np
+from .buffer_pool import BeBoDem
+
+
+@dataclass(slots=True)
+class NguCanhKhungHinh:
+    anh_bgr: np.ndarray
+    timestamp: Optional[float] = None
+    be_bo_dem: Optional[BeBoDem] = field(default=None, repr=False)
+    anh_suy_luan: Optional[np.ndarray] = field(default=None, repr=False)  # None = suy luận trên anh_bgr
+    _anh_rgb: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @classmethod
+    def tu(cls, khung_hinh: Union[np.ndarray, NguCanhKhungHinh],
+           timestamp: Optional[float] = None) -> NguCanhKhungHinh:
+        """Nhận ảnh BGR hoặc ngữ cảnh có sẵn (giữ tương thích API cũ)."""
+        if isinstance(khung_hinh, NguCanhKhungHinh):
+            return khung_hinh
+        return cls(khung_hinh, timestamp)
+
+    @property
+    def chieu_rong(self) -> int:
+        return self.anh_bgr.shape[1]
+
+    @property
+    def chieu_cao(self) -> int:
+        return self.anh_bgr.shape[0]
+
+    @property
+    def rong(self) -> bool:
+        return self.anh_bgr is None or self.anh_bgr.size == 0
+
+    @property
+    def anh_rgb(self) -> np.ndarray:
+        """RGB (ở độ phân giải suy luận) chỉ đọc - MediaPipe nhận theo tham chiếu, không copy."""
+        if self._anh_rgb is None:
+            nguon = self.anh_bgr if self.anh_suy_luan is None else self.anh_suy_luan
+            dich = self.be_bo_dem.lay_nhu(nguon) if self.be_bo_dem is not None else None
+            self._anh_rgb = cv2.cvtColor(nguon, cv2.COLOR_BGR2RGB, dst=dich)
+            self._anh_rgb.flags.writeable = False
+        return self._anh_rgb
+
+    def giai_phong(self) -> None:
+        """Trả ảnh dẫn xuất về pool - gọi khi mọi bộ phân tích đã xong khung này."""
+        if self.be_bo_dem is not None and self._anh_rgb is not None:
+            self.be_bo_dem.tra(self._anh_rgb)
+        self._anh_rgb = None
@@ -2,57 +2,24 @@
 Hand Tracking - Phát hiện mất tập trung
 
 Phát hiện khi tay ở gần mặt >3s (dùng điện thoại, ăn uống).
+Tùy chọn tiết kiệm: chỉ chạy Hands trong vùng quanh mặt, và chạy thưa
+(mỗi N khung) khi chưa có tay gần mặt. Vùng cắt đổi vị trí / kích thước mỗi
+khung nên chạy trên một Hands riêng ở static_image_mode: ROI theo dõi của
+Hands toàn khung chỉ mang toạ độ toàn khung.
+Landmark tay giữ ở mảng (so_tay, 21, 3) float32, không giữ proto MediaPipe;
+phan_tich_diem_moc() là phần sau suy luận (dùng lại khi phát lại landmark).
 """
 
 from __future__ import annotations
 import time
 from dataclasses import dataclass, field
-from typing import Optional, List, NamedTuple
-import cv2
+from typing import Any, Optional, Tuple, Union
 import numpy as np
-import mediapipe as mp
 from .constants import CUA_HINH_MAT_TAP_TRUNG
+from .frame_context import NguCanhKhungHinh
+from .results import Diem2D, KetQuaTheoDoiTay, KhungBbox, nap_diem_moc
 
-
-class Diem2D(NamedTuple):
-    x: float
-    y: float
-
-
-class KhungBbox(NamedTuple):
-    x_min: float
-    x_max: float
-    y_min: float
-    y_max: float
-    
-    def thua_chua(self, diem: Diem2D, mo_rong: float = 0.0) -> bool:
-        w, h = self.x_max - self.x_min, self.y_max - self.y_min
-        return (
-            self.x_min - w*mo_rong <= diem.x <= self.x_max + w*mo_rong and
-            self.y_min - h*mo_rong <= diem.y <= self.y_max + h*mo_rong
-        )
-
-
-@dataclass
-class KetQuaTheoDoiTay:
-    so_tay_phat_hien: int = 0
-    diem_moc_tay: List = field(default_factory=list)
-    khung_bbox_tay: List = field(default_factory=list)
-    tay_gan_mat: bool = False
-    canh_bao_mat_tap_trung: bool = False
-    thoi_gian_mat_tap_trung: float = 0.0
-    
-    def thanh_dict(self) -> dict:
-        return {
-            'hands_detected': self.so_tay_phat_hien,
-            'hand_landmarks': self.diem_moc_tay,
-            'hand_bboxes': [{'x_min': int(b.x_min), 'x_max': int(b.x_max),
-                            'y_min': int(b.y_min), 'y_max': int(b.y_max)} 
-                           for b in self.khung_bbox_tay],
-            'hand_near_face': self.tay_gan_mat,
-            'distraction_alert': self.canh_bao_mat_tap_trung,
-            'distraction_duration': self.thoi_gian_mat_tap_trung
-        }
+SO_DIEM_MOC_TAY = 21
 
 
 @dataclass
@@ -62,70 +29,147 @@ class TheoDoiTay:
     do_tin_cay_theo_doi: float = 0.5
     nguong_thoi_gian: float = field(default_factory=lambda: CUA_HINH_MAT_TAP_TRUNG.nguong_thoi_gian)
     mo_rong_bbox: float = field(default_factory=lambda: CUA_HINH_MAT_TAP_TRUNG.mo_rong_bbox_mat)
-    _tay: mp.solutions.hands.Hands = field(init=False, repr=False)
+    cat_vung_mat: bool = False  # Chỉ chạy Hands trong vùng quanh bbox mặt
+    le_vung_cat: float = 0.5  # Lề thêm ngoài mo_rong_bbox để bàn tay nằm trọn trong vùng cắt
+    kich_thuoc_cat_toi_thieu: int = 64  # Vùng cắt nhỏ hơn (px) thì chạy toàn khung
+    chu_ky_khi_xa: int = 1  # Chạy Hands mỗi N khung khi chưa có tay gần mặt
+    suy_luan: bool = True  # False = chỉ phan_tich_diem_moc (phát lại), không import MediaPipe
+    _tay: Any = field(default=None, init=False, repr=False)  # mp Hands toàn khung (theo dõi)
+    _tay_vung_cat: Any = field(default=None, init=False, repr=False)  # mp Hands vùng cắt (static)
     _thoi_gian_bat_dau: Optional[float] = field(default=None, repr=False)
+    _dem_khung: int = field(default=0, repr=False)
+    _tay_cuoi: Optional[np.ndarray] = field(default=None, repr=False)  # (so_tay, 21, 3), dùng lại khi bỏ khung
+    _tay_gan_truoc: bool = field(default=False, repr=False)
     
     def __post_init__(self) -> None:
-        self._tay = mp.solutions.hands.Hands(
+        if not self.suy_luan:
+            return
+        self._tay = self._tao_hands(static_image_mode=False)
+        if self.cat_vung_mat:
+            self._tay_vung_cat = self._tao_hands(static_image_mode=True)
+    
+    def _tao_hands(self, static_image_mode: bool) -> Any:
+        import mediapipe as mp
+        return mp.solutions.hands.Hands(
+            static_image_mode=static_image_mode,
             max_num_hands=self.so_tay_toi_da,
             min_detection_confidence=self.do_tin_cay_phat_hien,
             min_tracking_confidence=self.do_tin_cay_theo_doi
         )
     
-    def analyze(self, khung_hinh: np.ndarray, khung_bbox_mat: Optional[dict] = None) -> dict:
-        ket_qua = KetQuaTheoDoiTay()
+    def analyze(self, khung_hinh: Union[np.ndarray, NguCanhKhungHinh],
+                khung_bbox_mat: Union[KhungBbox, dict, None] = None,
+                timestamp: Optional[float] = None) -> KetQuaTheoDoiTay:
         if khung_hinh is None:
-            return ket_qua.thanh_dict()
-            
-        chieu_cao, chieu_rong = khung_hinh.shape[:2]
-        anh_rgb = cv2.cvtColor(khung_hinh, cv2.COLOR_BGR2RGB)
-        ket_qua_mp = self._tay.process(anh_rgb)
+            return KetQuaTheoDoiTay()
+        ngu_canh = NguCanhKhungHinh.tu(khung_hinh, timestamp)
+        khung_bbox = KhungBbox.tu(khung_bbox_mat)
         
-        if not ket_qua_mp.multi_hand_landmarks:
+        self._dem_khung += 1
+        if self._nen_chay():
+            self._tay_cuoi = self._suy_luan(ngu_canh, khung_bbox)
+        return self.phan_tich_diem_moc(self._tay_cuoi, ngu_canh.chieu_rong, ngu_canh.chieu_cao,
+                                       khung_bbox, ngu_canh.timestamp)
+    
+    def chay_mo_hinh(self, anh_rgb: np.ndarray) -> None:
+        """Một lượt Hands, bỏ kết quả, không đụng state machine (đo thời gian / làm nóng)."""
+        self._tay.process(anh_rgb)
+    
+    def lam_nong_du_phong(self, anh_rgb: np.ndarray) -> None:
+        """Một lượt cho Hands vùng cắt (cat_vung_mat) để khung cắt đầu tiên không chậm."""
+        if self._tay_vung_cat is not None:
+            self._tay_vung_cat.process(anh_rgb)
+    
+    def phan_tich_diem_moc(self, diem: np.ndarray, chieu_rong: int, chieu_cao: int,
+                           khung_bbox_mat: Union[KhungBbox, dict, None] = None,
+                           timestamp: Optional[float] = None) -> KetQuaTheoDoiTay:
+        """Bbox / tay gần mặt / state machine từ landmark (so_tay, 21, 3) chuẩn hóa."""
+        ket_qua = KetQuaTheoDoiTay()
+        timestamp = timestamp or time.time()
+        khung_bbox = KhungBbox.tu(khung_bbox_mat)
+        
+        if not len(diem):
             self._thoi_gian_bat_dau = None
-            return ket_qua.thanh_dict()
+            self._tay_gan_truoc = False
+            return ket_qua
         
-        khung_bbox = None
-        if khung_bbox_mat:
-            khung_bbox = KhungBbox(khung_bbox_mat['x_min'], khung_bbox_mat['x_max'],
-                                   khung_bbox_mat['y_min'], khung_bbox_mat['y_max'])
+        ket_qua.so_tay_phat_hien = len(diem)
+        ket_qua.diem_moc_tay = diem
+        diem_px = diem[:, :, :2] * np.array([chieu_rong, chieu_cao], dtype=np.float32)
+        nho, lon = diem_px.min(axis=1), diem_px.max(axis=1)
+        ket_qua.khung_bbox_tay = np.stack([nho[:, 0], lon[:, 0], nho[:, 1], lon[:, 1]], axis=1)
         
-        ket_qua.so_tay_phat_hien = len(ket_qua_mp.multi_hand_landmarks)
         co_tay_gan = False
-        
-        for tay in ket_qua_mp.multi_hand_landmarks:
-            ket_qua.diem_moc_tay.append(tay)
-            xs = [lm.x * chieu_rong for lm in tay.landmark]
-            ys = [lm.y * chieu_cao for lm in tay.landmark]
-            ket_qua.khung_bbox_tay.append(KhungBbox(min(xs), max(xs), min(ys), max(ys)))
-            
-            if khung_bbox:
-                # Center = giữa wrist và middle MCP
-                tam = Diem2D(
-                    (tay.landmark[0].x + tay.landmark[9].x) / 2,
-                    (tay.landmark[0].y + tay.landmark[9].y) / 2
-                )
-                if khung_bbox.thua_chua(tam, self.mo_rong_bbox):
+        if khung_bbox:
+            # Center = giữa wrist và middle MCP
+            for x, y in ((diem[:, 0, :2].astype(np.float64) + diem[:, 9, :2]) / 2).tolist():
+                if khung_bbox.thua_chua(Diem2D(x, y), self.mo_rong_bbox):
                     co_tay_gan = True
+                    break
         
         ket_qua.tay_gan_mat = co_tay_gan
+        self._tay_gan_truoc = co_tay_gan
         
         # State machine: chỉ alert khi >threshold
         if co_tay_gan:
             if self._thoi_gian_bat_dau is None:
-                self._thoi_gian_bat_dau = time.time()
+                self._thoi_gian_bat_dau = timestamp
             else:
-                thoi_gian = time.time() - self._thoi_gian_bat_dau
+                thoi_gian = timestamp - self._thoi_gian_bat_dau
                 ket_qua.thoi_gian_mat_tap_trung = thoi_gian
                 if thoi_gian >= self.nguong_thoi_gian:
                     ket_qua.canh_bao_mat_tap_trung = True
         else:
             self._thoi_gian_bat_dau = None
             
-        return ket_qua.thanh_dict()
+        return ket_qua
+    
+    def _nen_chay(self) -> bool:
+        """Tay gần mặt → mỗi khung; còn lại mỗi chu_ky_khi_xa khung."""
+        if self._tay_gan_truoc or self._tay_cuoi is None or self.chu_ky_khi_xa <= 1:
+            return True
+        return self._dem_khung % self.chu_ky_khi_xa == 0
+    
+    def _vung_cat(self, khung_bbox: KhungBbox, chieu_rong: int,
+                  chieu_cao: int) -> Optional[Tuple[int, int, int, int]]:
+        vung = khung_bbox.mo_rong(self.mo_rong_bbox + self.le_vung_cat)
+        x0, x1 = max(0, int(vung.x_min*chieu_rong)), min(chieu_rong, int(vung.x_max*chieu_rong) + 1)
+        y0, y1 = max(0, int(vung.y_min*chieu_cao)), min(chieu_cao, int(vung.y_max*chieu_cao) + 1)
+        if min(x1 - x0, y1 - y0) < self.kich_thuoc_cat_toi_thieu:
+            return None
+        return x0, y0, x1, y1
+    
+    def _suy_luan(self, ngu_canh: NguCanhKhungHinh, khung_bbox: Optional[KhungBbox]) -> np.ndarray:
+        """Chạy Hands (toàn khung hoặc vùng quanh mặt) → (so_tay, 21, 3) theo toạ độ toàn khung."""
+        chieu_cao, chieu_rong = ngu_canh.anh_rgb.shape[:2]  # Pixel của ảnh suy luận, không phải khung thu
+        vung = None
+        if self.cat_vung_mat and khung_bbox is not None:
+            vung = self._vung_cat(khung_bbox, chieu_rong, chieu_cao)
+        if vung is None:
+            return self._thanh_mang(self._tay.process(ngu_canh.anh_rgb))
+        
+        x0, y0, x1, y1 = vung
+        anh_cat = np.ascontiguousarray(ngu_canh.anh_rgb[y0:y1, x0:x1])
+        diem = self._thanh_mang(self._tay_vung_cat.process(anh_cat))
+        rong_cat, cao_cat = x1 - x0, y1 - y0
+        diem[..., 0] = (x0 + diem[..., 0]*rong_cat) / chieu_rong
+        diem[..., 1] = (y0 + diem[..., 1]*cao_cat) / chieu_cao
+        diem[..., 2] *= rong_cat / chieu_rong
+        return diem
+    
+    @staticmethod
+    def _thanh_mang(ket_qua_mp) -> np.ndarray:
+        danh_sach_tay = ket_qua_mp.multi_hand_landmarks or []
+        diem = np.zeros((len(danh_sach_tay), SO_DIEM_MOC_TAY, 3), dtype=np.float32)
+        for i, tay in enumerate(danh_sach_tay):
+            nap_diem_moc(tay, diem[i])
+        return diem
     
     def release(self) -> None:
-        self._tay.close()
+        for tay in (self._tay, self._tay_vung_cat):
+            if tay is not None:
+                tay.close()
+        self._tay = self._tay_vung_cat = None
         
     def __enter__(self): return self
     def __exit__(self, *args): self.release()
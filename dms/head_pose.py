@@ -0,0 +1,171 @@
+"""
+Head Pose - Ước lượng tư thế đầu
+
+- Ma trận camera cache theo độ phân giải, có thể nạp intrinsics đã hiệu chuẩn
+- Khởi động ấm solvePnP từ rvec/tvec khung trước (useExtrinsicGuess)
+- Chọn solver: ITERATIVE, SQPNP, EPNP, hoặc KHOP_3D (closed-form Umeyama
+  trên landmark 3D của chính MediaPipe, không cần PnP)
+"""
+
+from __future__ import annotations
+import json
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+from .constants import DIEM_MAT_3D
+
+
+class HeadPose(NamedTuple):
+    pitch: float
+    yaw: float
+    roll: float
+    rvec: Optional[np.ndarray] = None
+    tvec: Optional[np.ndarray] = None
+
+
+class PhuongPhapPnP(Enum):
+    ITERATIVE = "iterative"  # Levenberg-Marquardt, hỗ trợ khởi động ấm
+    SQPNP = "sqpnp"
+    EPNP = "epnp"
+    KHOP_3D = "fit3d"  # Khớp cứng model 3D ↔ landmark (x, y, z) của MediaPipe
+
+    @property
+    def co_cv2(self) -> Optional[int]:
+        return {
+            PhuongPhapPnP.ITERATIVE: cv2.SOLVEPNP_ITERATIVE,
+            PhuongPhapPnP.SQPNP: cv2.SOLVEPNP_SQPNP,
+            PhuongPhapPnP.EPNP: cv2.SOLVEPNP_EPNP,
+        }.get(self)
+
+
+@dataclass
+class NoiTaiCamera:
+    """Intrinsics đã hiệu chuẩn ở độ phân giải (chieu_rong, chieu_cao)."""
+    ma_tran: np.ndarray
+    he_so_meo: np.ndarray
+    chieu_rong: int
+    chieu_cao: int
+
+    @classmethod
+    def tai(cls, duong_dan: str) -> NoiTaiCamera:
+        """
+        Nạp từ .npz (camera_matrix, dist_coeffs, image_size) hoặc .json cùng khóa.
+        image_size = [rộng, cao] lúc hiệu chuẩn.
+        """
+        if Path(duong_dan).suffix.lower() == ".json":
+            with open(duong_dan, encoding="utf-8") as f:
+                du_lieu = json.load(f)
+        else:
+            du_lieu = dict(np.load(duong_dan))
+        chieu_rong, chieu_cao = (int(v) for v in np.ravel(du_lieu["image_size"]))
+        return cls(np.asarray(du_lieu["camera_matrix"], dtype=np.float64).reshape(3, 3),
+                   np.asarray(du_lieu.get("dist_coeffs", np.zeros(4)), dtype=np.float64).reshape(-1, 1),
+                   chieu_rong, chieu_cao)
+
+    def theo_do_phan_giai(self, chieu_rong: int, chieu_cao: int) -> np.ndarray:
+        """Co giãn fx, fy, cx, cy sang độ phân giải khác (cùng cảm biến)."""
+        ma_tran = self.ma_tran.copy()
+        ma_tran[0] *= chieu_rong / self.chieu_rong
+        ma_tran[1] *= chieu_cao / self.chieu_cao
+        return ma_tran
+
+
+@dataclass
+class BoUocLuongTuThe:
+    phuong_phap: PhuongPhapPnP = PhuongPhapPnP.ITERATIVE
+    khoi_dong_am: bool = True  # Chỉ áp dụng cho ITERATIVE
+    noi_tai: Optional[NoiTaiCamera] = None
+
+    _bo_nho_dem: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = field(
+        default_factory=dict, repr=False)
+    _vec_quay: Optional[np.ndarray] = field(default=None, repr=False)
+    _vec_tuan: Optional[np.ndarray] = field(default=None, repr=False)
+
+    def noi_tai_theo(self, chieu_rong: int, chieu_cao: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(ma trận camera, hệ số méo) cho độ phân giải, tính một lần rồi cache."""
+        khoa = (chieu_rong, chieu_cao)
+        if khoa not in self._bo_nho_dem:
+            if self.noi_tai is not None:
+                gia_tri = (self.noi_tai.theo_do_phan_giai(chieu_rong, chieu_cao), self.noi_tai.he_so_meo)
+            else:
+                # Xấp xỉ: tiêu cự = chiều rộng, tâm ảnh ở giữa, không méo
+                gia_tri = (np.array([[chieu_rong, 0, chieu_rong/2], [0, chieu_rong, chieu_cao/2], [0, 0, 1]],
+                                    dtype=np.float64),
+                           np.zeros((4, 1), dtype=np.float64))
+            self._bo_nho_dem[khoa] = gia_tri
+        return self._bo_nho_dem[khoa]
+
+    def ma_tran_camera(self, chieu_rong: int, chieu_cao: int) -> np.ndarray:
+        return self.noi_tai_theo(chieu_rong, chieu_cao)[0]
+
+    def dat_lai(self) -> None:
+        """Gọi khi mất mặt để khung sau không khởi động ấm từ pose cũ."""
+        self._vec_quay = self._vec_tuan = None
+
+    def uoc_luong(self, diem_chieu: np.ndarray, chieu_rong: int, chieu_cao: int,
+                  diem_3d: Optional[np.ndarray] = None) -> HeadPose:
+        """
+        diem_chieu: (6, 2) pixel của CHI_SO_TU_THE
+        diem_3d: (6, 3) landmark chuẩn hóa (x, y, z) cùng chỉ số, bắt buộc với KHOP_3D
+        """
+        ma_tran, he_so_meo = self.noi_tai_theo(chieu_rong, chieu_cao)
+        if self.phuong_phap is PhuongPhapPnP.KHOP_3D:
+            if diem_3d is None:
+                raise ValueError("KHOP_3D cần landmark 3D (diem_3d)")
+            ok, vec_quay, vec_tuan = self._khop_3d(diem_3d, chieu_rong, chieu_cao, ma_tran)
+        elif self.phuong_phap is PhuongPhapPnP.ITERATIVE and self.khoi_dong_am \
+                and self._vec_quay is not None:
+            ok, vec_quay, vec_tuan = cv2.solvePnP(
+                DIEM_MAT_3D, diem_chieu, ma_tran, he_so_meo,
+                rvec=self._vec_quay.copy(), tvec=self._vec_tuan.copy(),
+                useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+        else:
+            ok, vec_quay, vec_tuan = cv2.solvePnP(
+                DIEM_MAT_3D, diem_chieu, ma_tran, he_so_meo, flags=self.phuong_phap.co_cv2)
+
+        if not ok:
+            self.dat_lai()
+            return HeadPose(0, 0, 0)
+        self._vec_quay, self._vec_tuan = vec_quay, vec_tuan
+        pitch, yaw, roll = self.goc_euler(cv2.Rodrigues(vec_quay)[0])
+        return HeadPose(pitch, yaw, roll, vec_quay, vec_tuan)
+
+    @staticmethod
+    def goc_euler(ma_tran_quay: np.ndarray) -> Tuple[float, float, float]:
+        sy = np.sqrt(ma_tran_quay[0,0]**2 + ma_tran_quay[1,0]**2)
+        if sy > 1e-6:
+            pitch = np.degrees(np.arctan2(-ma_tran_quay[2,0], sy))
+            yaw = np.degrees(np.arctan2(ma_tran_quay[1,0], ma_tran_quay[0,0]))
+            roll = np.degrees(np.arctan2(ma_tran_quay[2,1], ma_tran_quay[2,2]))
+        else:
+            pitch = np.degrees(np.arctan2(-ma_tran_quay[2,0], sy))
+            yaw = 0
+            roll = np.degrees(np.arctan2(-ma_tran_quay[1,2], ma_tran_quay[1,1]))
+        return pitch, yaw, roll
+
+    @staticmethod
+    def _khop_3d(diem_3d: np.ndarray, chieu_rong: int, chieu_cao: int, ma_tran: np.ndarray):
+        """
+        Umeyama: tìm s, R, t sao cho s·R·model + t ≈ landmark (pixel, z theo thang x).
+        Độ sâu suy từ tỉ lệ (chiếu phối cảnh yếu): Z = f / s.
+        """
+        quan_sat = np.asarray(diem_3d, dtype=np.float64) * (chieu_rong, chieu_cao, chieu_rong)
+        tam_mo_hinh, tam_quan_sat = DIEM_MAT_3D.mean(axis=0), quan_sat.mean(axis=0)
+        mo_hinh_c, quan_sat_c = DIEM_MAT_3D - tam_mo_hinh, quan_sat - tam_quan_sat
+        u, s, vt = np.linalg.svd(quan_sat_c.T @ mo_hinh_c)
+        dau = np.sign(np.linalg.det(u @ vt)) or 1.0
+        d = np.array([1.0, 1.0, dau])
+        ma_tran_quay = (u * d) @ vt
+        ti_le = float((s * d).sum() / (mo_hinh_c ** 2).sum())
+        if ti_le <= 0:
+            return False, None, None
+        # Vị trí ảnh của gốc model (đầu mũi) và độ sâu
+        goc = tam_quan_sat - ti_le * ma_tran_quay @ tam_mo_hinh
+        sau = ma_tran[0, 0] / ti_le
+        vec_tuan = np.array([[(goc[0] - ma_tran[0, 2]) * sau / ma_tran[0, 0]],
+                             [(goc[1] - ma_tran[1, 2]) * sau / ma_tran[1, 1]],
+                             [sau]], dtype=np.float64)
+        return True, cv2.Rodrigues(ma_tran_quay)[0], vec_tuan
@@ -0,0 +1,188 @@
+"""
+Metrics - Đo độ trễ từng giai đoạn và xuất dạng Prometheus
+
+- BieuDoTanSuat: histogram thùng cố định theo lũy thừa 2 (50µs → ~1.6s),
+  chọn thùng bằng math.frexp nên mỗi lần ghi là O(1), không cấp phát
+- BoDoLuong: tập histogram/counter/gauge, nhận hook do_giai_doan của
+  HeThongGiamSatTaiXe và xuất văn bản Prometheus
+- MayChuDoLuong: HTTP cục bộ (127.0.0.1) phục vụ /metrics trên luồng nền
+
+Chỉ một luồng ghi (luồng phân tích); luồng HTTP đọc ảnh chụp gần đúng.
+"""
+
+from __future__ import annotations
+import logging
+import math
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CAN_DUOI_GIAY = 50e-6  # Biên trên của thùng đầu tiên
+SO_THUNG = 16  # Thùng i chứa (CAN_DUOI·2^(i-1), CAN_DUOI·2^i]; thêm một thùng +Inf
+BIEN_THUNG = tuple(CAN_DUOI_GIAY * 2**i for i in range(SO_THUNG))
+
+Nhan = Tuple[Tuple[str, str], ...]
+
+_MO_TA = {
+    'stage_latency_seconds': 'Độ trễ từng giai đoạn xử lý khung',
+    'frames_total': 'Số khung đã xử lý',
+    'alerts_total': 'Số lần bắt đầu cảnh báo theo loại',
+    'fps': 'FPS trung bình trượt',
+    'degrade_level': 'Mức giảm tính năng theo ngân sách độ trễ (0 = đầy đủ)',
+}
+
+
+@dataclass(slots=True)
+class BieuDoTanSuat:
+    dem: List[int] = field(default_factory=lambda: [0] * (SO_THUNG + 1))
+    tong: float = 0.0
+    so_mau: int = 0
+
+    def quan_sat(self, giay: float) -> None:
+        if giay <= CAN_DUOI_GIAY:
+            chi_so = 0
+        else:
+            # giay/CAN_DUOI = m·2^e, m ∈ [0.5, 1) → ≤ 2^e, và = 2^(e-1) khi m == 0.5
+            m, e = math.frexp(giay / CAN_DUOI_GIAY)
+            chi_so = min(e - 1 if m == 0.5 else e, SO_THUNG)
+        self.dem[chi_so] += 1
+        self.tong += giay
+        self.so_mau += 1
+
+    def phan_vi(self, q: float) -> float:
+        """Ước lượng phân vị q ∈ [0, 1] (biên trên của thùng chứa nó)."""
+        if not self.so_mau:
+            return 0.0
+        muc_tieu, tich_luy = q * self.so_mau, 0
+        for i, so in enumerate(self.dem):
+            tich_luy += so
+            if tich_luy >= muc_tieu:
+                return BIEN_THUNG[i] if i < SO_THUNG else math.inf
+        return math.inf
+
+
+def _dinh_dang_nhan(nhan: Nhan) -> str:
+    if not nhan:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in nhan) + "}"
+
+
+@dataclass
+class BoDoLuong:
+    tien_to: str = "dms"
+
+    _bieu_do: Dict[str, BieuDoTanSuat] = field(default_factory=dict, repr=False)
+    _bo_dem: Dict[Tuple[str, Nhan], float] = field(default_factory=dict, repr=False)
+    _gia_tri: Dict[Tuple[str, Nhan], float] = field(default_factory=dict, repr=False)
+    # (tên, loại, mô tả, khóa nhãn, hàm trả về {giá trị nhãn: số}) - đọc lúc scrape
+    _thu_thap: List[Tuple[str, str, str, str, Callable[[], Dict[str, float]]]] = field(
+        default_factory=list, repr=False)
+
+    def quan_sat(self, giai_doan: str, giay: float) -> None:
+        """Khớp chữ ký hook do_giai_doan."""
+        bieu_do = self._bieu_do.get(giai_doan)
+        if bieu_do is None:
+            bieu_do = self._bieu_do[giai_doan] = BieuDoTanSuat()
+        bieu_do.quan_sat(giay)
+
+    def tang(self, ten: str, so: float = 1, **nhan: str) -> None:
+        khoa = (ten, tuple(sorted(nhan.items())))
+        self._bo_dem[khoa] = self._bo_dem.get(khoa, 0) + so
+
+    def dat(self, ten: str, gia_tri: float, **nhan: str) -> None:
+        self._gia_tri[(ten, tuple(sorted(nhan.items())))] = gia_tri
+
+    def thu_thap(self, ten: str, loai: str, mo_ta: str, khoa_nhan: str,
+                 ham: Callable[[], Dict[str, float]]) -> None:
+        """Chỉ số do nơi khác giữ (VD: số khung bỏ của pipeline), đọc khi scrape."""
+        self._thu_thap.append((ten, loai, mo_ta, khoa_nhan, ham))
+
+    def gan_bieu_do(self, giai_doan: str, bieu_do: BieuDoTanSuat) -> None:
+        """Xuất histogram do nơi khác ghi (VD: độ trễ âm thanh) cùng các giai đoạn."""
+        self._bieu_do[giai_doan] = bieu_do
+
+    def bieu_do(self, giai_doan: str) -> Optional[BieuDoTanSuat]:
+        return self._bieu_do.get(giai_doan)
+
+    def xuat_prometheus(self) -> str:
+        dong: List[str] = []
+        p = self.tien_to
+
+        if self._bieu_do:
+            ten = f"{p}_stage_latency_seconds"
+            dong += [f"# HELP {ten} {_MO_TA['stage_latency_seconds']}", f"# TYPE {ten} histogram"]
+            for giai_doan, bieu_do in sorted(self._bieu_do.items()):
+                dem = list(bieu_do.dem)  # Ảnh chụp - luồng phân tích vẫn đang ghi
+                tich_luy = 0
+                for bien, so in zip(BIEN_THUNG, dem):
+                    tich_luy += so
+                    dong.append(f'{ten}_bucket{{stage="{giai_doan}",le="{bien:.6g}"}} {tich_luy}')
+                tich_luy += dem[-1]
+                dong.append(f'{ten}_bucket{{stage="{giai_doan}",le="+Inf"}} {tich_luy}')
+                dong.append(f'{ten}_sum{{stage="{giai_doan}"}} {bieu_do.tong:.9g}')
+                dong.append(f'{ten}_count{{stage="{giai_doan}"}} {tich_luy}')
+
+        for loai, kho in (("counter", self._bo_dem), ("gauge", self._gia_tri)):
+            theo_ten: Dict[str, List[Tuple[Nhan, float]]] = {}
+            for (ten, nhan), gia_tri in list(kho.items()):
+                theo_ten.setdefault(ten, []).append((nhan, gia_tri))
+            for ten, cac_mau in sorted(theo_ten.items()):
+                day_du = f"{p}_{ten}"
+                dong += [f"# HELP {day_du} {_MO_TA.get(ten, ten)}", f"# TYPE {day_du} {loai}"]
+                dong += [f"{day_du}{_dinh_dang_nhan(nhan)} {gia_tri:.9g}" for nhan, gia_tri in cac_mau]
+
+        for ten, loai, mo_ta, khoa_nhan, ham in self._thu_thap:
+            day_du = f"{p}_{ten}"
+            dong += [f"# HELP {day_du} {mo_ta}", f"# TYPE {day_du} {loai}"]
+            dong += [f'{day_du}{{{khoa_nhan}="{k}"}} {v:.9g}' for k, v in ham().items()]
+        return "\n".join(dong) + "\n"
+
+
+@dataclass
+class MayChuDoLuong:
+    """GET /metrics → văn bản Prometheus. Mặc định chỉ lắng nghe localhost."""
+    bo_do_luong: BoDoLuong
+    cong: int = 9108
+    dia_chi: str = "127.0.0.1"
+
+    _may_chu: Optional[ThreadingHTTPServer] = field(default=None, repr=False)
+    _luong: Optional[threading.Thread] = field(default=None, repr=False)
+
+    def bat_dau(self) -> None:
+        bo_do_luong = self.bo_do_luong
+
+        class _XuLy(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                noi_dung = bo_do_luong.xuat_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(noi_dung)))
+                self.end_headers()
+                self.wfile.write(noi_dung)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._may_chu = ThreadingHTTPServer((self.dia_chi, self.cong), _XuLy)
+        self._may_chu.daemon_threads = True
+        self._luong = threading.Thread(target=self._may_chu.serve_forever,
+                                       name="dms-metrics", daemon=True)
+        self._luong.start()
+        logger.info(f"Metrics: http://{self.dia_chi}:{self._may_chu.server_port}/metrics")
+
+    @property
+    def cong_thuc(self) -> Optional[int]:
+        """Cổng đang lắng nghe (khác cong khi cong=0)."""
+        return self._may_chu.server_port if self._may_chu else None
+
+    def dung(self) -> None:
+        if self._may_chu is not None:
+            self._may_chu.shutdown()
+            self._may_chu.server_close()
+            self._may_chu = None
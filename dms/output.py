@@ -0,0 +1,177 @@
+"""
+Structured Output - Ghi kết quả từng khung cho chế độ headless
+
+Mỗi khung: timestamp, EAR, MAR, pitch/yaw/roll, cờ cảnh báo, thời gian mất
+tập trung. Hai định dạng:
+- JSONL: một object JSON mỗi dòng
+- Nhị phân: bản ghi cố định DTYPE_BAN_GHI (little-endian, 40 byte), đọc lại
+  bằng np.fromfile(duong_dan, dtype=DTYPE_BAN_GHI)
+
+Luồng phân tích chỉ đưa tuple vào hàng đợi; định dạng và ghi file chạy trên
+luồng riêng, gom nhiều bản ghi mỗi lần ghi. Hàng đợi đầy thì bỏ bản ghi
+(đếm lại) chứ không chặn suy luận.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import queue
+import sys
+import threading
+from dataclasses import dataclass, field
+from enum import Enum, IntFlag
+from typing import BinaryIO, List, Optional, Tuple
+import numpy as np
+from .results import KetQuaPhanTichMat, KetQuaTheoDoiTay
+
+logger = logging.getLogger(__name__)
+
+
+class DinhDangDauRa(Enum):
+    JSONL = "jsonl"
+    NHI_PHAN = "binary"
+
+
+class CoKetQua(IntFlag):
+    MAT_PHAT_HIEN = 1
+    BUON_NGU = 2
+    NGAP = 4
+    TU_THE = 8
+    TAY_GAN_MAT = 16
+    MAT_TAP_TRUNG = 32
+
+
+DTYPE_BAN_GHI = np.dtype([
+    ('timestamp', '<f8'),
+    ('so_thu_tu', '<u4'),
+    ('ear', '<f4'),
+    ('mar', '<f4'),
+    ('pitch', '<f4'),
+    ('yaw', '<f4'),
+    ('roll', '<f4'),
+    ('thoi_gian_mat_tap_trung', '<f4'),
+    ('so_tay', '<u1'),
+    ('co', '<u1'),
+    ('_dem', 'V2'),
+])
+
+# (timestamp, so_thu_tu, ear, mar, pitch, yaw, roll, thoi_gian_mat_tap_trung, so_tay, co)
+BanGhi = Tuple[float, int, float, float, float, float, float, float, int, int]
+
+
+def tao_ban_ghi(timestamp: float, so_thu_tu: int, ket_qua_mat: KetQuaPhanTichMat,
+                ket_qua_tay: KetQuaTheoDoiTay) -> BanGhi:
+    co = (CoKetQua.MAT_PHAT_HIEN * bool(ket_qua_mat.mat_phat_hien)
+          | CoKetQua.BUON_NGU * bool(ket_qua_mat.canh_bao_buon_ngu)
+          | CoKetQua.NGAP * bool(ket_qua_mat.canh_bao_ngap)
+          | CoKetQua.TU_THE * bool(ket_qua_mat.canh_bao_tu_the)
+          | CoKetQua.TAY_GAN_MAT * bool(ket_qua_tay.tay_gan_mat)
+          | CoKetQua.MAT_TAP_TRUNG * bool(ket_qua_tay.canh_bao_mat_tap_trung))
+    return (timestamp, so_thu_tu, float(ket_qua_mat.ear), float(ket_qua_mat.mar),
+            float(ket_qua_mat.pitch), float(ket_qua_mat.yaw), float(ket_qua_mat.roll),
+            float(ket_qua_tay.thoi_gian_mat_tap_trung), int(ket_qua_tay.so_tay_phat_hien), int(co))
+
+
+def _thanh_jsonl(ban_ghi: List[BanGhi]) -> bytes:
+    dong = []
+    for ts, stt, ear, mar, pitch, yaw, roll, thoi_gian, so_tay, co in ban_ghi:
+        dong.append(json.dumps({
+            'timestamp': ts, 'frame': stt, 'face_detected': bool(co & CoKetQua.MAT_PHAT_HIEN),
+            'ear': round(ear, 4), 'mar': round(mar, 4),
+            'pitch': round(pitch, 2), 'yaw': round(yaw, 2), 'roll': round(roll, 2),
+            'drowsiness_alert': bool(co & CoKetQua.BUON_NGU),
+            'yawn_alert': bool(co & CoKetQua.NGAP),
+            'head_pose_alert': bool(co & CoKetQua.TU_THE),
+            'hands_detected': so_tay,
+            'hand_near_face': bool(co & CoKetQua.TAY_GAN_MAT),
+            'distraction_alert': bool(co & CoKetQua.MAT_TAP_TRUNG),
+            'distraction_duration': round(thoi_gian, 3),
+        }, separators=(',', ':')))
+    dong.append('')
+    return '\n'.join(dong).encode('utf-8')
+
+
+def _thanh_nhi_phan(ban_ghi: List[BanGhi]) -> bytes:
+    mang = np.zeros(len(ban_ghi), dtype=DTYPE_BAN_GHI)
+    for i, ten in enumerate(DTYPE_BAN_GHI.names[:-1]):
+        mang[ten] = [b[i] for b in ban_ghi]
+    return mang.tobytes()
+
+
+@dataclass
+class BoGhiKetQua:
+    """Ghi kết quả ra file hoặc stdout ('-') trên luồng nền."""
+    duong_dan: str = "-"
+    dinh_dang: DinhDangDauRa = DinhDangDauRa.JSONL
+    suc_chua: int = 4096  # Số bản ghi chờ tối đa
+    so_bo: int = field(default=0, init=False)
+    so_da_ghi: int = field(default=0, init=False)
+
+    _hang_doi: queue.Queue = field(init=False, repr=False)
+    _luong: Optional[threading.Thread] = field(default=None, repr=False)
+    _tep: Optional[BinaryIO] = field(default=None, repr=False)
+    _so_thu_tu: int = field(default=0, repr=False)
+
+    def __post_init__(self) -> None:
+        self._hang_doi = queue.Queue(maxsize=self.suc_chua)
+
+    def mo(self) -> None:
+        self._tep = sys.stdout.buffer if self.duong_dan == "-" else open(self.duong_dan, "wb")
+        self._luong = threading.Thread(target=self._vong_ghi, name="dms-ghi-ket-qua", daemon=True)
+        self._luong.start()
+        logger.info(f"Ghi kết quả ({self.dinh_dang.value}) → {'stdout' if self.duong_dan == '-' else self.duong_dan}")
+
+    def ghi(self, timestamp: float, ket_qua_mat: KetQuaPhanTichMat, ket_qua_tay: KetQuaTheoDoiTay) -> None:
+        """Gọi từ luồng phân tích; không bao giờ chặn."""
+        ban_ghi = tao_ban_ghi(timestamp, self._so_thu_tu, ket_qua_mat, ket_qua_tay)
+        self._so_thu_tu += 1
+        try:
+            self._hang_doi.put_nowait(ban_ghi)
+        except queue.Full:
+            self.so_bo += 1
+
+    def dong(self) -> None:
+        if self._luong is None:
+            return
+        if self._luong.is_alive():
+            self._hang_doi.put(None)
+        self._luong.join()
+        self._luong = None
+        if self._tep is not sys.stdout.buffer:
+            self._tep.close()
+        else:
+            self._tep.flush()
+        self._tep = None
+        if self.so_bo:
+            logger.warning(f"Bỏ {self.so_bo} bản ghi kết quả do ghi không kịp")
+
+    def _vong_ghi(self) -> None:
+        ham_dinh_dang = _thanh_jsonl if self.dinh_dang is DinhDangDauRa.JSONL else _thanh_nhi_phan
+        ket_thuc = False
+        while not ket_thuc:
+            lo = [self._hang_doi.get()]
+            # Gom mọi bản ghi đang chờ vào một lần ghi
+            while True:
+                try:
+                    lo.append(self._hang_doi.get_nowait())
+                except queue.Empty:
+                    break
+            if lo[-1] is None:
+                lo.pop()
+                ket_thuc = True
+            if not lo:
+                continue
+            try:
+                self._tep.write(ham_dinh_dang(lo))
+                self._tep.flush()
+                self.so_da_ghi += len(lo)
+            except OSError as e:
+                logger.error(f"Lỗi ghi kết quả: {e}")
+                return
+
+    def __enter__(self):
+        self.mo()
+        return self
+
+    def __exit__(self, *args):
+        self.dong()
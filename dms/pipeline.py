@@ -0,0 +1,185 @@
+"""
+Pipeline đa luồng - Thu hình → Phân tích → Hiển thị
+
+Mỗi giai đoạn chạy trên luồng riêng, nối nhau bằng hàng đợi có giới hạn.
+Hàng đợi đầy thì bỏ khung cũ nhất: FaceMesh chậm không chặn thu hình,
+và cảnh báo luôn được tính trên khung mới nhất.
+"""
+
+from __future__ import annotations
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class KhungHinh:
+    """Khung hình kèm số thứ tự và thời điểm thu (time.time() hoặc PTS)."""
+    so_thu_tu: int
+    thoi_diem: float
+    anh: np.ndarray
+
+
+@dataclass
+class HangDoiBoCu:
+    """Hàng đợi giới hạn, đầy thì bỏ phần tử cũ nhất (drop-oldest)."""
+    suc_chua: int = 1
+    ham_bo: Optional[Callable[[Any], None]] = None  # Nhận phần tử bị bỏ (VD: trả bộ đệm về pool)
+    so_bo: int = field(default=0, init=False)
+    _muc: Deque[Any] = field(init=False, repr=False)
+    _dieu_kien: threading.Condition = field(default_factory=threading.Condition, repr=False)
+    _da_dong: bool = field(default=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._muc = deque(maxlen=max(1, self.suc_chua))
+
+    def dat(self, muc: Any, cho_cho_trong: bool = False) -> None:
+        """cho_cho_trong=True: chặn đến khi có chỗ thay vì bỏ phần tử cũ (nguồn ghi sẵn)."""
+        with self._dieu_kien:
+            if cho_cho_trong:
+                self._dieu_kien.wait_for(lambda: len(self._muc) < self._muc.maxlen or self._da_dong)
+            if len(self._muc) == self._muc.maxlen:
+                self.so_bo += 1
+                if self.ham_bo is not None:
+                    self.ham_bo(self._muc[0])
+            self._muc.append(muc)
+            self._dieu_kien.notify()
+
+    def lay(self, thoi_gian_cho: Optional[float] = None) -> Optional[Any]:
+        """Lấy phần tử cũ nhất còn lại; None nếu hết thời gian chờ hoặc đã đóng."""
+        with self._dieu_kien:
+            if not self._dieu_kien.wait_for(lambda: self._muc or self._da_dong, thoi_gian_cho):
+                return None
+            if not self._muc:
+                return None
+            muc = self._muc.popleft()
+            self._dieu_kien.notify_all()
+            return muc
+
+    def dong(self) -> None:
+        with self._dieu_kien:
+            self._da_dong = True
+            self._dieu_kien.notify_all()
+
+    @property
+    def da_dong(self) -> bool:
+        return self._da_dong
+
+    def __len__(self) -> int:
+        return len(self._muc)
+
+
+@dataclass
+class DuongOngDMS:
+    """
+    Pipeline 3 giai đoạn:
+    - Luồng thu hình: ham_doc() → (thành_công, ảnh, thời_điểm) → hàng đợi phân tích
+    - Luồng phân tích: ham_xu_ly(khung) → hàng đợi hiển thị
+    - Hiển thị: luồng gọi lay_khung_hien_thi() (HighGUI phải chạy ở main thread)
+    """
+    ham_doc: Callable[[], Tuple[bool, Optional[np.ndarray], float]]
+    ham_xu_ly: Callable[[KhungHinh], np.ndarray]
+    suc_chua_phan_tich: int = 1  # 1 = luôn phân tích khung mới nhất
+    suc_chua_hien_thi: int = 2
+    khong_bo_khung: bool = False  # Nguồn ghi sẵn: chặn thay vì bỏ khung
+    ham_tra_anh: Optional[Callable[[np.ndarray], None]] = None  # Trả ảnh của khung bị bỏ về pool
+    loi: Optional[BaseException] = field(default=None, init=False)
+
+    _hang_doi_phan_tich: HangDoiBoCu = field(init=False, repr=False)
+    _hang_doi_hien_thi: HangDoiBoCu = field(init=False, repr=False)
+    _su_kien_dung: threading.Event = field(default_factory=threading.Event, repr=False)
+    _luong: list = field(default_factory=list, repr=False)
+
+    def __post_init__(self) -> None:
+        ham_bo = None
+        if self.ham_tra_anh is not None:
+            ham_bo = lambda khung: self.ham_tra_anh(khung.anh)
+        self._hang_doi_phan_tich = HangDoiBoCu(self.suc_chua_phan_tich, ham_bo)
+        self._hang_doi_hien_thi = HangDoiBoCu(self.suc_chua_hien_thi, ham_bo)
+
+    @property
+    def dang_chay(self) -> bool:
+        return not self._su_kien_dung.is_set()
+
+    @property
+    def da_ket_thuc(self) -> bool:
+        """Nguồn đã hết và mọi khung đã được hiển thị."""
+        return self._hang_doi_hien_thi.da_dong and len(self._hang_doi_hien_thi) == 0
+
+    def bat_dau(self) -> None:
+        self._su_kien_dung.clear()
+        self._luong = [
+            threading.Thread(target=self._vong_thu_hinh, name="dms-thu-hinh", daemon=True),
+            threading.Thread(target=self._vong_phan_tich, name="dms-phan-tich", daemon=True),
+        ]
+        for luong in self._luong:
+            luong.start()
+
+    def dung(self, thoi_gian_cho: float = 2.0) -> None:
+        self._su_kien_dung.set()
+        self._hang_doi_phan_tich.dong()
+        self._hang_doi_hien_thi.dong()
+        for luong in self._luong:
+            if luong is not threading.current_thread():
+                luong.join(thoi_gian_cho)
+        self._luong = []
+
+    def lay_khung_hien_thi(self, thoi_gian_cho: Optional[float] = 0.1) -> Optional[KhungHinh]:
+        return self._hang_doi_hien_thi.lay(thoi_gian_cho)
+
+    def do_sau_hang_doi(self) -> Dict[str, int]:
+        """Số khung đang chờ ở mỗi giai đoạn - cho biết độ trễ dồn ở đâu."""
+        return {
+            'phan_tich': len(self._hang_doi_phan_tich),
+            'hien_thi': len(self._hang_doi_hien_thi),
+        }
+
+    def so_khung_bo(self) -> Dict[str, int]:
+        return {
+            'phan_tich': self._hang_doi_phan_tich.so_bo,
+            'hien_thi': self._hang_doi_hien_thi.so_bo,
+        }
+
+    def _bao_loi(self, loi: BaseException) -> None:
+        logger.error(f"Lỗi pipeline: {loi}", exc_info=loi)
+        self.loi = loi
+        self._su_kien_dung.set()
+        self._hang_doi_phan_tich.dong()
+        self._hang_doi_hien_thi.dong()
+
+    def _vong_thu_hinh(self) -> None:
+        so_thu_tu = 0
+        try:
+            while not self._su_kien_dung.is_set():
+                thanh_cong, anh, thoi_diem = self.ham_doc()
+                if not thanh_cong:
+                    break
+                self._hang_doi_phan_tich.dat(KhungHinh(so_thu_tu, thoi_diem, anh),
+                                             self.khong_bo_khung)
+                so_thu_tu += 1
+        except Exception as e:
+            self._bao_loi(e)
+            return
+        # Hết nguồn: phân tích nốt các khung còn trong hàng đợi rồi dừng
+        self._hang_doi_phan_tich.dong()
+
+    def _vong_phan_tich(self) -> None:
+        try:
+            while not self._su_kien_dung.is_set():
+                khung = self._hang_doi_phan_tich.lay(0.1)
+                if khung is None:
+                    if self._hang_doi_phan_tich.da_dong:
+                        break
+                    continue
+                dau_ra = self.ham_xu_ly(khung)
+                self._hang_doi_hien_thi.dat(KhungHinh(khung.so_thu_tu, khung.thoi_diem, dau_ra),
+                                            self.khong_bo_khung)
+        except Exception as e:
+            self._bao_loi(e)
+            return
+        self._hang_doi_hien_thi.dong()
@@ -4,47 +4,125 @@ CLAHE Preprocessing - Cải thiện ảnh ánh sáng yếu
 CLAHE tốt hơn histogram equalization toàn cục vì:
 - Xử lý local, không bị artifacts
 - Có giới hạn contrast để tránh khuếch đại noise
+
+Chế độ thích ứng đo luma trên ảnh thu nhỏ và bỏ qua CLAHE khi ánh sáng đã
+tốt (có hysteresis để không bật/tắt liên tục). Khi chạy, CLAHE làm việc
+trên các bộ đệm cấp phát sẵn thay vì split/merge tạo mảng mới mỗi khung.
 """
 
 from __future__ import annotations
+import logging
 from dataclasses import dataclass, field
 from enum import Enum
+from typing import Optional
 import cv2
 import numpy as np
 from .constants import CUA_HINH_CLAHE
 
+logger = logging.getLogger(__name__)
+
 
 class KhongGianMau(Enum):
     YCRCB = "ycrcb"  # Nhanh hơn
     LAB = "lab"      # Chính xác hơn về tri giác
 
 
+_CHUYEN_DOI = {
+    KhongGianMau.YCRCB: (cv2.COLOR_BGR2YCrCb, cv2.COLOR_YCrCb2BGR),
+    KhongGianMau.LAB: (cv2.COLOR_BGR2LAB, cv2.COLOR_LAB2BGR),
+}
+
+
 @dataclass
 class TienXuLyCLAHE:
-    """Tiền xử lý CLAHE cho low-light."""
+    """
+    Tiền xử lý CLAHE cho low-light.
+
+    Ảnh trả về là bộ đệm nội bộ, bị ghi đè ở lần gọi sau - copy nếu cần giữ lại.
+    """
     han_clip: float = field(default_factory=lambda: CUA_HINH_CLAHE.han_clip)
     kich_thuoc_o: tuple = field(default_factory=lambda: CUA_HINH_CLAHE.kich_thuoc_o)
     khong_gian_mau: KhongGianMau = field(default=KhongGianMau.YCRCB)
+    thich_ung: bool = False  # Bỏ qua CLAHE khi ánh sáng đủ tốt
+    sang_bo_qua: float = field(default_factory=lambda: CUA_HINH_CLAHE.sang_bo_qua)
+    tuong_phan_bo_qua: float = field(default_factory=lambda: CUA_HINH_CLAHE.tuong_phan_bo_qua)
+    do_tre: float = field(default_factory=lambda: CUA_HINH_CLAHE.do_tre)
+    he_so_thu_nho: int = field(default_factory=lambda: CUA_HINH_CLAHE.he_so_thu_nho)
+
+    # Thống kê: khung cuối có bỏ qua không, và tổng số khung / khung bỏ qua
+    bo_qua_khung_cuoi: bool = field(default=False, init=False)
+    sang_khung_cuoi: float = field(default=0.0, init=False)
+    tuong_phan_khung_cuoi: float = field(default=0.0, init=False)
+    so_khung: int = field(default=0, init=False)
+    so_khung_bo_qua: int = field(default=0, init=False)
+
     _clahe: cv2.CLAHE = field(init=False, repr=False)
-    
+    _dang_bo_qua: bool = field(default=False, repr=False)
+    _hinh_dang: Optional[tuple] = field(default=None, repr=False)
+    _bo_dem_mau: Optional[np.ndarray] = field(default=None, repr=False)  # Ảnh YCrCb/LAB
+    _kenh_sang: Optional[np.ndarray] = field(default=None, repr=False)
+    _kenh_sang_ra: Optional[np.ndarray] = field(default=None, repr=False)
+    _bo_dem_ra: Optional[np.ndarray] = field(default=None, repr=False)  # Ảnh BGR kết quả
+    _anh_nho: Optional[np.ndarray] = field(default=None, repr=False)
+    _xam_nho: Optional[np.ndarray] = field(default=None, repr=False)
+
     def __post_init__(self) -> None:
         self._clahe = cv2.createCLAHE(
             clipLimit=self.han_clip,
             tileGridSize=self.kich_thuoc_o
         )
-        
+
+    @property
+    def ti_le_bo_qua(self) -> float:
+        return self.so_khung_bo_qua / self.so_khung if self.so_khung else 0.0
+
     def tang_cuong(self, khung_hinh: np.ndarray) -> np.ndarray:
-        """Chỉ xử lý kênh luminance để giữ màu."""
+        """Chỉ xử lý kênh luminance để giữ màu. Bỏ qua → trả về chính khung_hinh."""
         if khung_hinh is None or khung_hinh.size == 0:
             return khung_hinh
-        
-        if self.khong_gian_mau == KhongGianMau.LAB:
-            chuan_hoa = cv2.cvtColor(khung_hinh, cv2.COLOR_BGR2LAB)
-            danh_sach_kenh = list(cv2.split(chuan_hoa))
-            danh_sach_kenh[0] = self._clahe.apply(danh_sach_kenh[0])
-            return cv2.cvtColor(cv2.merge(danh_sach_kenh), cv2.COLOR_LAB2BGR)
-        else:
-            chuan_hoa = cv2.cvtColor(khung_hinh, cv2.COLOR_BGR2YCrCb)
-            danh_sach_kenh = list(cv2.split(chuan_hoa))
-            danh_sach_kenh[0] = self._clahe.apply(danh_sach_kenh[0])
-            return cv2.cvtColor(cv2.merge(danh_sach_kenh), cv2.COLOR_YCrCb2BGR)
+
+        self._cap_phat(khung_hinh.shape)
+        self.so_khung += 1
+        self.bo_qua_khung_cuoi = self.thich_ung and self._nen_bo_qua(khung_hinh)
+        if self.bo_qua_khung_cuoi:
+            self.so_khung_bo_qua += 1
+            return khung_hinh
+
+        sang_mau, ve_bgr = _CHUYEN_DOI[self.khong_gian_mau]
+        cv2.cvtColor(khung_hinh, sang_mau, dst=self._bo_dem_mau)
+        cv2.extractChannel(self._bo_dem_mau, 0, dst=self._kenh_sang)
+        self._clahe.apply(self._kenh_sang, dst=self._kenh_sang_ra)
+        cv2.insertChannel(self._kenh_sang_ra, self._bo_dem_mau, 0)
+        cv2.cvtColor(self._bo_dem_mau, ve_bgr, dst=self._bo_dem_ra)
+        return self._bo_dem_ra
+
+    def _cap_phat(self, hinh_dang: tuple) -> None:
+        """Cấp phát bộ đệm một lần cho mỗi độ phân giải."""
+        if hinh_dang == self._hinh_dang:
+            return
+        chieu_cao, chieu_rong = hinh_dang[:2]
+        self._bo_dem_mau = np.empty(hinh_dang, dtype=np.uint8)
+        self._bo_dem_ra = np.empty(hinh_dang, dtype=np.uint8)
+        self._kenh_sang = np.empty((chieu_cao, chieu_rong), dtype=np.uint8)
+        self._kenh_sang_ra = np.empty((chieu_cao, chieu_rong), dtype=np.uint8)
+        nho = (max(1, chieu_rong // self.he_so_thu_nho), max(1, chieu_cao // self.he_so_thu_nho))
+        self._anh_nho = np.empty((nho[1], nho[0]) + tuple(hinh_dang[2:]), dtype=np.uint8)
+        self._xam_nho = np.empty((nho[1], nho[0]), dtype=np.uint8)
+        self._hinh_dang = hinh_dang
+
+    def _nen_bo_qua(self, khung_hinh: np.ndarray) -> bool:
+        """Đo trung bình / độ lệch chuẩn luma trên ảnh thu nhỏ, có hysteresis."""
+        nho = (self._anh_nho.shape[1], self._anh_nho.shape[0])
+        cv2.resize(khung_hinh, nho, dst=self._anh_nho, interpolation=cv2.INTER_NEAREST)
+        cv2.cvtColor(self._anh_nho, cv2.COLOR_BGR2GRAY, dst=self._xam_nho)
+        trung_binh, do_lech = cv2.meanStdDev(self._xam_nho)
+        sang, tuong_phan = float(trung_binh[0, 0]), float(do_lech[0, 0])
+        self.sang_khung_cuoi, self.tuong_phan_khung_cuoi = sang, tuong_phan
+
+        tre = self.do_tre if self._dang_bo_qua else 0.0
+        bo_qua = sang >= self.sang_bo_qua - tre and tuong_phan >= self.tuong_phan_bo_qua - tre
+        if bo_qua is not self._dang_bo_qua:
+            logger.debug(f"CLAHE {'bỏ qua' if bo_qua else 'bật'} "
+                         f"(luma {sang:.0f}, tương phản {tuong_phan:.0f})")
+            self._dang_bo_qua = bo_qua
+        return bo_qua
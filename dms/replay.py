@@ -0,0 +1,207 @@
+"""
+Replay - Ghi landmark thô từng khung và phát lại lớp phân tích không cần MediaPipe
+
+Ghi: mỗi khung một bản ghi DTYPE_KHUNG_DIEM_MOC (16 byte: timestamp, kích
+thước khung, số điểm mặt, số tay, cờ giai đoạn đã chạy) + landmark thô
+float32 của mặt và tay ở hai file cột riêng. Phát lại đưa thẳng các landmark
+đó vào PhanTichMat/TheoDoiTay.phan_tich_diem_moc → EAR/MAR/tư thế/bộ lọc/
+cảnh báo giống hệt lần chạy thật; chi phí mỗi khung chủ yếu là solvePnP.
+
+Bố cục thư mục:
+    meta.json    phiên bản, dtype, cấu hình phân tích lúc ghi (solver tư thế, intrinsics)
+    frames.bin   DTYPE_KHUNG_DIEM_MOC × số khung
+    face.f32     (tổng số điểm mặt, 3) float32, nối liên tiếp theo khung
+    hands.f32    (tổng số tay, 21, 3) float32
+
+Gom nhiều khung rồi ghi một lần; landmark ghi trước, bản ghi khung ghi sau
+→ chết giữa chừng chỉ mất khung chưa ghi, người đọc bỏ phần dở ở cuối.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from enum import IntFlag
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional
+import numpy as np
+from .hand_tracking import SO_DIEM_MOC_TAY
+from .results import KetQuaPhanTichMat, KetQuaTheoDoiTay
+
+logger = logging.getLogger(__name__)
+
+PHIEN_BAN_DIEM_MOC = 1
+TEP_META, TEP_KHUNG, TEP_MAT, TEP_TAY = "meta.json", "frames.bin", "face.f32", "hands.f32"
+# Khóa trong meta['phan_tich']: cấu hình ảnh hưởng kết quả phân tích khi phát lại
+KHOA_TU_THE, KHOA_NOI_TAI = "phuong_phap_tu_the", "noi_tai"
+
+
+class CoDiemMoc(IntFlag):
+    CHAY_MAT = 1  # Khung này có chạy phân tích mặt (bộ lập lịch có thể bỏ)
+    CHAY_TAY = 2
+    DAT_LAI_TAY = 4  # Không chạy tay và xóa kết quả tay (không có tài xế)
+
+
+DTYPE_KHUNG_DIEM_MOC = np.dtype([
+    ('timestamp', '<f8'),
+    ('chieu_rong', '<u2'),
+    ('chieu_cao', '<u2'),
+    ('so_diem_mat', '<u2'),  # 0 = không chạy hoặc không thấy mặt
+    ('so_tay', '<u1'),
+    ('co', '<u1'),
+])
+
+
+class KhungDiemMoc(NamedTuple):
+    timestamp: float
+    chieu_rong: int
+    chieu_cao: int
+    co: CoDiemMoc
+    mat: Optional[np.ndarray]  # (N, 3) float32 hoặc None nếu không thấy mặt
+    tay: np.ndarray  # (so_tay, 21, 3) float32, có thể rỗng
+
+
+@dataclass
+class BoGhiDiemMoc:
+    """Ghi landmark từ luồng phân tích; chỉ copy vào bộ đệm, ghi đĩa mỗi so_khung_moi_lan khung."""
+    thu_muc: str
+    so_khung_moi_lan: int = 256
+    phan_tich: Dict[str, Any] = field(default_factory=dict)  # {KHOA_TU_THE: ..., KHOA_NOI_TAI: ...}
+    so_da_ghi: int = field(default=0, init=False)
+
+    _tep: List[BinaryIO] = field(default_factory=list, repr=False)
+    _khung: np.ndarray = field(init=False, repr=False)
+    _so_cho: int = field(default=0, repr=False)
+    _mat: List[bytes] = field(default_factory=list, repr=False)
+    _tay: List[bytes] = field(default_factory=list, repr=False)
+
+    def __post_init__(self) -> None:
+        self._khung = np.zeros(self.so_khung_moi_lan, dtype=DTYPE_KHUNG_DIEM_MOC)
+
+    def mo(self) -> None:
+        os.makedirs(self.thu_muc, exist_ok=True)
+        with open(os.path.join(self.thu_muc, TEP_META), "w", encoding="utf-8") as tep:
+            json.dump({'phien_ban': PHIEN_BAN_DIEM_MOC, 'dtype_khung': DTYPE_KHUNG_DIEM_MOC.descr,
+                       'so_diem_tay': SO_DIEM_MOC_TAY, 'phan_tich': self.phan_tich}, tep)
+        # Thư mục cũ bị ghi đè: các cột phải cùng bắt đầu từ khung 0
+        self._tep = [open(os.path.join(self.thu_muc, ten), "wb") for ten in (TEP_MAT, TEP_TAY, TEP_KHUNG)]
+        logger.info(f"Ghi landmark vào {self.thu_muc}")
+
+    def ghi(self, timestamp: float, chieu_rong: int, chieu_cao: int, co: CoDiemMoc,
+            ket_qua_mat: Optional[KetQuaPhanTichMat], ket_qua_tay: Optional[KetQuaTheoDoiTay]) -> None:
+        """ket_qua_mat/ket_qua_tay chỉ truyền khi giai đoạn đó chạy ở khung này."""
+        so_diem_mat = so_tay = 0
+        if ket_qua_mat is not None and ket_qua_mat.diem_moc is not None:
+            so_diem_mat = len(ket_qua_mat.diem_moc)
+            self._mat.append(ket_qua_mat.diem_moc.tobytes())
+        if ket_qua_tay is not None and ket_qua_tay.diem_moc_tay is not None:
+            so_tay = len(ket_qua_tay.diem_moc_tay)
+            self._tay.append(np.ascontiguousarray(ket_qua_tay.diem_moc_tay, dtype=np.float32).tobytes())
+        self._khung[self._so_cho] = (timestamp, chieu_rong, chieu_cao, so_diem_mat, so_tay, int(co))
+        self._so_cho += 1
+        self.so_da_ghi += 1
+        if self._so_cho == len(self._khung):
+            self._xa()
+
+    def _xa(self) -> None:
+        """Landmark trước, bản ghi khung sau - frames.bin không bao giờ trỏ tới landmark chưa có."""
+        tep_mat, tep_tay, tep_khung = self._tep
+        tep_mat.write(b"".join(self._mat))
+        tep_tay.write(b"".join(self._tay))
+        tep_mat.flush()
+        tep_tay.flush()
+        tep_khung.write(self._khung[:self._so_cho].tobytes())
+        tep_khung.flush()
+        self._mat.clear()
+        self._tay.clear()
+        self._so_cho = 0
+
+    def dong(self) -> None:
+        if not self._tep:
+            return
+        self._xa()
+        for tep in self._tep:
+            tep.close()
+        self._tep = []
+        logger.info(f"Đã ghi landmark {self.so_da_ghi} khung vào {self.thu_muc}")
+
+    def __enter__(self):
+        self.mo()
+        return self
+
+    def __exit__(self, *args):
+        self.dong()
+
+
+def doc_meta(thu_muc: str) -> dict:
+    """meta.json của thư mục landmark (kiểm tra phiên bản và dtype)."""
+    with open(os.path.join(thu_muc, TEP_META), encoding="utf-8") as tep:
+        meta = json.load(tep)
+    if meta.get('phien_ban') != PHIEN_BAN_DIEM_MOC or \
+            np.dtype([tuple(cot) for cot in meta.get('dtype_khung', [])]) != DTYPE_KHUNG_DIEM_MOC:
+        raise ValueError(f"{thu_muc}: định dạng landmark không hỗ trợ ({meta.get('phien_ban')})")
+    return meta
+
+
+def _anh_xa(duong_dan: str, dtype, hinh_dang_diem: tuple) -> np.ndarray:
+    kich_thuoc = np.dtype(dtype).itemsize * int(np.prod(hinh_dang_diem))
+    so_hang = os.path.getsize(duong_dan) // kich_thuoc
+    if so_hang == 0:
+        return np.zeros((0,) + hinh_dang_diem, dtype=dtype)
+    # ndarray thường trên cùng vùng nhớ: cắt lát memmap mỗi khung tốn thêm __array_finalize__
+    return np.memmap(duong_dan, dtype=dtype, mode='r', shape=(so_hang,) + hinh_dang_diem).view(np.ndarray)
+
+
+@dataclass
+class BoDocDiemMoc:
+    """Đọc thư mục landmark (memmap, không copy); duyệt theo khung bằng iter()."""
+    thu_muc: str
+
+    phan_tich: Dict[str, Any] = field(init=False)  # Cấu hình lúc ghi; rỗng với bản ghi cũ
+    khung: np.ndarray = field(init=False, repr=False)  # DTYPE_KHUNG_DIEM_MOC, view memmap
+    _mat: np.ndarray = field(init=False, repr=False)
+    _tay: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.phan_tich = doc_meta(self.thu_muc).get('phan_tich', {})
+        khung = _anh_xa(os.path.join(self.thu_muc, TEP_KHUNG), DTYPE_KHUNG_DIEM_MOC, ())
+        self._mat = _anh_xa(os.path.join(self.thu_muc, TEP_MAT), '<f4', (3,))
+        self._tay = _anh_xa(os.path.join(self.thu_muc, TEP_TAY), '<f4', (SO_DIEM_MOC_TAY, 3))
+        # Bỏ khung cuối có landmark chưa ghi đủ (chỉ xảy ra khi bị dừng đột ngột)
+        du_mat = np.cumsum(khung['so_diem_mat'], dtype=np.int64) <= len(self._mat)
+        du_tay = np.cumsum(khung['so_tay'], dtype=np.int64) <= len(self._tay)
+        self.khung = khung[:int(np.count_nonzero(du_mat & du_tay))]
+        if len(self.khung) < len(khung):
+            logger.warning(f"{self.thu_muc}: bỏ {len(khung) - len(self.khung)} khung cuối ghi dở")
+
+    def __len__(self) -> int:
+        return len(self.khung)
+
+    @property
+    def thoi_luong(self) -> float:
+        """Giây từ khung đầu đến khung cuối."""
+        if len(self.khung) < 2:
+            return 0.0
+        return float(self.khung['timestamp'][-1] - self.khung['timestamp'][0])
+
+    def __iter__(self) -> Iterator[KhungDiemMoc]:
+        # tolist() một lần: đọc trường từ numpy scalar mỗi khung chậm hơn nhiều
+        cot = [self.khung[ten].tolist() for ten in DTYPE_KHUNG_DIEM_MOC.names]
+        vi_tri_mat = vi_tri_tay = 0
+        for ts, rong, cao, so_diem_mat, so_tay, co in zip(*cot):
+            mat = None
+            if so_diem_mat:
+                mat = self._mat[vi_tri_mat:vi_tri_mat + so_diem_mat]
+                vi_tri_mat += so_diem_mat
+            tay = self._tay[vi_tri_tay:vi_tri_tay + so_tay]
+            vi_tri_tay += so_tay
+            yield KhungDiemMoc(ts, rong, cao, CoDiemMoc(co), mat, tay)
+
+    def dong(self) -> None:
+        self.khung = self._mat = self._tay = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.dong()
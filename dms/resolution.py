@@ -0,0 +1,82 @@
+"""
+Resolution - Độ phân giải suy luận tách khỏi độ phân giải thu hình
+
+FaceMesh và Hands tự resize về kích thước mô hình, landmark trả về đã chuẩn
+hóa ⇒ thu nhỏ khung một lần (INTER_AREA, bộ đệm từ pool) rồi CLAHE, chuyển
+RGB và suy luận trên ảnh nhỏ. Hình học (EAR/MAR theo pixel, PnP, bbox tay,
+lớp phủ) vẫn nhân landmark chuẩn hóa với kích thước khung thu, nên góc đầu
+và lớp phủ không phụ thuộc độ phân giải suy luận.
+
+Tự chọn: đo thời gian suy luận thật trên khung đầu tiên ở các kích thước
+giảm dần (giữ tỉ lệ khung), lấy kích thước lớn nhất đạt thời gian mục tiêu.
+"""
+
+from __future__ import annotations
+import logging
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from .buffer_pool import BeBoDem
+
+logger = logging.getLogger(__name__)
+
+KichThuoc = Tuple[int, int]  # (rộng, cao)
+
+TU_DONG = "auto"
+CAC_TI_LE_THU = (1.0, 0.75, 2 / 3, 0.5, 0.375, 1 / 3, 0.25)
+RONG_TOI_THIEU = 160  # Nhỏ hơn thì detector mặt (128x128) bắt đầu trượt mặt xa
+
+
+def phan_tich_kich_thuoc(chuoi: str) -> KichThuoc:
+    """'640x360' → (640, 360)."""
+    rong, _, cao = chuoi.lower().partition("x")
+    try:
+        kich_thuoc = int(rong), int(cao)
+    except ValueError:
+        raise ValueError(f"Kích thước không hợp lệ: {chuoi!r} (cần dạng RỘNGxCAO hoặc {TU_DONG})") from None
+    if min(kich_thuoc) <= 0:
+        raise ValueError(f"Kích thước không hợp lệ: {chuoi!r}")
+    return kich_thuoc
+
+
+def cac_ung_vien(chieu_rong: int, chieu_cao: int) -> List[KichThuoc]:
+    """Các kích thước thử, giảm dần, giữ tỉ lệ khung, làm tròn số chẵn."""
+    ung_vien: List[KichThuoc] = []
+    for ti_le in CAC_TI_LE_THU:
+        if ti_le == 1.0:
+            kich_thuoc = (chieu_rong, chieu_cao)
+        else:
+            kich_thuoc = (max(2, int(round(chieu_rong * ti_le / 2)) * 2),
+                          max(2, int(round(chieu_cao * ti_le / 2)) * 2))
+            if kich_thuoc[0] < RONG_TOI_THIEU:
+                break
+        if kich_thuoc not in ung_vien:
+            ung_vien.append(kich_thuoc)
+    return ung_vien
+
+
+def thu_nho(anh: np.ndarray, kich_thuoc: Optional[KichThuoc],
+            be_bo_dem: Optional[BeBoDem] = None) -> np.ndarray:
+    """Ảnh ở kich_thuoc (bộ đệm từ pool nếu có); trả về chính anh nếu đã đúng kích thước hoặc None."""
+    if kich_thuoc is None or (anh.shape[1], anh.shape[0]) == tuple(kich_thuoc):
+        return anh
+    rong, cao = kich_thuoc
+    dich = be_bo_dem.lay((cao, rong) + anh.shape[2:], anh.dtype) if be_bo_dem is not None else None
+    return cv2.resize(anh, (rong, cao), dst=dich, interpolation=cv2.INTER_AREA)
+
+
+def chon_kich_thuoc(ham_do: Callable[[KichThuoc], float], ung_vien: List[KichThuoc],
+                    muc_tieu: float, so_lan: int = 5) -> Tuple[KichThuoc, Dict[KichThuoc, float]]:
+    """
+    ham_do(kich_thuoc) → giây cho một lần suy luận. Thử từ lớn đến nhỏ, dừng ở
+    kích thước đầu tiên có trung vị ≤ muc_tieu; không có thì lấy nhỏ nhất.
+    Trả về (kích thước, {kích thước: trung vị đã đo}).
+    """
+    da_do: Dict[KichThuoc, float] = {}
+    for kich_thuoc in ung_vien:
+        ham_do(kich_thuoc)  # Lần đầu ở kích thước mới: cấp phát bộ đệm, cache của OpenCV
+        da_do[kich_thuoc] = statistics.median(ham_do(kich_thuoc) for _ in range(so_lan))
+        if da_do[kich_thuoc] <= muc_tieu:
+            return kich_thuoc, da_do
+    return ung_vien[-1], da_do
@@ -0,0 +1,176 @@
+"""
+Results - Kiểu kết quả gọn cho phân tích mặt và tay
+
+Kết quả mỗi khung là object __slots__, landmark lưu bằng mảng float32 liền
+khối thay vì giữ proto MediaPipe: khung cũ nằm trong hàng đợi / cache lập
+lịch không giữ lại bộ nhớ protobuf, và không dựng dict mới mỗi khung.
+
+Truy cập kiểu dict cũ (ket_qua['ear'], ket_qua.get(...), thanh_dict()) vẫn
+dùng được với đúng các khóa cũ - chỉ để tương thích, code mới đọc thuộc tính.
+
+nap_diem_moc: chép NormalizedLandmarkList vào mảng float32 (dùng cho cả mặt và tay).
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Any, Callable, ClassVar, Dict, NamedTuple, Optional
+import numpy as np
+
+
+# Wire format protobuf của một NormalizedLandmark trong NormalizedLandmarkList:
+# 0x0A <len> 0x0D <x f32> 0x15 <y f32> 0x1D <z f32> [0x25 <visibility>] [0x2D <presence>]
+# len = 15 / 20 / 25 tùy số trường tùy chọn; x, y, z ở offset 3, 8, 13 khi
+# serializer ghi theo thứ tự trường. Đường nhanh chỉ dùng khi MỌI bản ghi có
+# đúng byte tag / độ dài ở các offset đó; khác đi thì duyệt .x/.y/.z.
+_COT_THE_PB = np.array([0, 2, 7, 12])  # Offset các byte tag trong một bản ghi
+_THE_PB = np.array([0x0A, 0x0D, 0x15, 0x1D], dtype=np.uint8)  # landmark, x, y, z
+
+
+def _dtype_landmark_pb(kich_thuoc: int) -> np.dtype:
+    return np.dtype({'names': ['x', 'y', 'z'], 'formats': ['<f4'] * 3,
+                     'offsets': [3, 8, 13], 'itemsize': kich_thuoc})
+
+
+_DTYPE_LANDMARK_PB = {do_dai + 2: _dtype_landmark_pb(do_dai + 2) for do_dai in (15, 20, 25)}
+
+
+def _dung_bo_cuc_pb(du_lieu: bytes, n: int, kich_thuoc: int) -> bool:
+    """Mỗi bản ghi đều mở đầu 0x0A <len> và có tag x, y, z ở offset 2, 7, 12."""
+    byte = np.frombuffer(du_lieu, dtype=np.uint8).reshape(n, kich_thuoc)
+    return bool((byte[:, _COT_THE_PB] == _THE_PB).all() and (byte[:, 1] == kich_thuoc - 2).all())
+
+
+def nap_diem_moc(danh_sach, dich: np.ndarray) -> np.ndarray:
+    """
+    Chép landmark vào mảng cấp phát sẵn, trả về view (N, 3).
+    danh_sach: NormalizedLandmarkList (đọc thẳng bytes đã serialize, không
+    duyệt proto bằng Python) hoặc dãy landmark bất kỳ có .x .y .z.
+    """
+    diem_moc = getattr(danh_sach, 'landmark', danh_sach)
+    n = len(diem_moc)
+    if hasattr(danh_sach, 'SerializeToString') and 0 < n <= dich.shape[0]:
+        du_lieu = danh_sach.SerializeToString()
+        dtype = _DTYPE_LANDMARK_PB.get(du_lieu[1] + 2) if len(du_lieu) > 2 else None
+        if dtype is not None and len(du_lieu) == n * dtype.itemsize \
+                and _dung_bo_cuc_pb(du_lieu, n, dtype.itemsize):
+            ban_ghi = np.frombuffer(du_lieu, dtype=dtype)
+            dich[:n, 0], dich[:n, 1], dich[:n, 2] = ban_ghi['x'], ban_ghi['y'], ban_ghi['z']
+            return dich[:n]
+    # Không phải proto, bản ghi khác kích thước hoặc thứ tự trường khác: duyệt theo cột
+    n = min(n, dich.shape[0])
+    dich[:n, 0] = [lm.x for lm in diem_moc[:n]]
+    dich[:n, 1] = [lm.y for lm in diem_moc[:n]]
+    dich[:n, 2] = [lm.z for lm in diem_moc[:n]]
+    return dich[:n]
+
+
+class Diem2D(NamedTuple):
+    x: float
+    y: float
+
+
+class KhungBbox(NamedTuple):
+    x_min: float
+    x_max: float
+    y_min: float
+    y_max: float
+
+    def thua_chua(self, diem: Diem2D, mo_rong: float = 0.0) -> bool:
+        w, h = self.x_max - self.x_min, self.y_max - self.y_min
+        return (
+            self.x_min - w*mo_rong <= diem.x <= self.x_max + w*mo_rong and
+            self.y_min - h*mo_rong <= diem.y <= self.y_max + h*mo_rong
+        )
+
+    def mo_rong(self, ti_le: float) -> KhungBbox:
+        w, h = self.x_max - self.x_min, self.y_max - self.y_min
+        return KhungBbox(self.x_min - w*ti_le, self.x_max + w*ti_le,
+                         self.y_min - h*ti_le, self.y_max + h*ti_le)
+
+    @classmethod
+    def tu(cls, khung_bbox) -> Optional[KhungBbox]:
+        """Nhận KhungBbox hoặc dict {'x_min', 'x_max', 'y_min', 'y_max'} kiểu cũ."""
+        if not khung_bbox:
+            return None
+        if isinstance(khung_bbox, KhungBbox):
+            return khung_bbox
+        return cls(khung_bbox['x_min'], khung_bbox['x_max'], khung_bbox['y_min'], khung_bbox['y_max'])
+
+
+class _XemDict:
+    """Giao diện dict chỉ đọc dựng từ _KHOA_CU: {khóa cũ: hàm lấy giá trị}."""
+    __slots__ = ()
+    _KHOA_CU: ClassVar[Dict[str, Callable[[Any], Any]]] = {}
+
+    def __getitem__(self, khoa: str) -> Any:
+        try:
+            ham = self._KHOA_CU[khoa]
+        except KeyError:
+            raise KeyError(khoa) from None
+        return ham(self)
+
+    def get(self, khoa: str, mac_dinh: Any = None) -> Any:
+        ham = self._KHOA_CU.get(khoa)
+        return mac_dinh if ham is None else ham(self)
+
+    def __contains__(self, khoa: object) -> bool:
+        return khoa in self._KHOA_CU
+
+    def keys(self):
+        return self._KHOA_CU.keys()
+
+    def thanh_dict(self) -> dict:
+        return {khoa: ham(self) for khoa, ham in self._KHOA_CU.items()}
+
+
+def _theo_truong(*ten: str) -> Dict[str, Callable[[Any], Any]]:
+    return {t: attrgetter(t) for t in ten}
+
+
+@dataclass(slots=True)
+class KetQuaPhanTichMat(_XemDict):
+    mat_phat_hien: bool = False
+    ear: float = 0.0
+    mar: float = 0.0
+    pitch: float = 0.0
+    yaw: float = 0.0
+    roll: float = 0.0
+    canh_bao_buon_ngu: bool = False
+    canh_bao_ngap: bool = False
+    canh_bao_tu_the: bool = False
+    diem_moc: Optional[np.ndarray] = None  # (N, 3) float32, toạ độ chuẩn hóa
+    diem_moc_mat: Optional[np.ndarray] = None  # (2, 6, 2) float32 pixel: phải, trái
+    diem_moc_mieng: Optional[np.ndarray] = None  # (8, 2) float32 pixel
+    vec_quay: Optional[np.ndarray] = None
+    vec_tuan: Optional[np.ndarray] = None
+    khung_bbox_mat: Optional[KhungBbox] = None  # Toạ độ chuẩn hóa
+
+    _KHOA_CU: ClassVar[Dict[str, Callable[[Any], Any]]] = {
+        **_theo_truong('mat_phat_hien', 'ear', 'mar', 'pitch', 'yaw', 'roll',
+                       'canh_bao_buon_ngu', 'canh_bao_ngap', 'canh_bao_tu_the', 'diem_moc'),
+        'diem_moc_mat': lambda kq: None if kq.diem_moc_mat is None else
+            {'phai': kq.diem_moc_mat[0], 'trai': kq.diem_moc_mat[1]},
+        **_theo_truong('diem_moc_mieng', 'vec_quay', 'vec_tuan'),
+        'khung_bbox_mat': lambda kq: None if kq.khung_bbox_mat is None else kq.khung_bbox_mat._asdict(),
+    }
+
+
+@dataclass(slots=True)
+class KetQuaTheoDoiTay(_XemDict):
+    so_tay_phat_hien: int = 0
+    diem_moc_tay: Optional[np.ndarray] = None  # (so_tay, 21, 3) float32, toạ độ chuẩn hóa
+    khung_bbox_tay: Optional[np.ndarray] = None  # (so_tay, 4) float32 pixel: x_min, x_max, y_min, y_max
+    tay_gan_mat: bool = False
+    canh_bao_mat_tap_trung: bool = False
+    thoi_gian_mat_tap_trung: float = 0.0
+
+    _KHOA_CU: ClassVar[Dict[str, Callable[[Any], Any]]] = {
+        'hands_detected': attrgetter('so_tay_phat_hien'),
+        'hand_landmarks': lambda kq: [] if kq.diem_moc_tay is None else kq.diem_moc_tay,
+        'hand_bboxes': lambda kq: [] if kq.khung_bbox_tay is None else [
+            dict(zip(KhungBbox._fields, map(int, b))) for b in kq.khung_bbox_tay.tolist()],
+        'hand_near_face': attrgetter('tay_gan_mat'),
+        'distraction_alert': attrgetter('canh_bao_mat_tap_trung'),
+        'distraction_duration': attrgetter('thoi_gian_mat_tap_trung'),
+    }
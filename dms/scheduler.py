@@ -0,0 +1,123 @@
+"""
+Lập lịch suy luận theo trạng thái
+
+Chọn chu kỳ chạy từng giai đoạn (FaceMesh, Hands, vẽ) theo trạng thái hiện tại:
+- KHONG_TAI_XE: không thấy mặt vài giây → chỉ dò mặt thưa, tắt Hands
+- ON_DINH: tài xế tỉnh táo, ổn định → giảm nhịp Hands
+- DAY_DU: cảnh báo đang tích lũy (EAR thấp, tay gần mặt, ...) → chạy mọi khung
+CLAHE chỉ chạy khi có giai đoạn phân tích chạy.
+"""
+
+from __future__ import annotations
+import logging
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Optional
+from .constants import EAR_THRESHOLD
+from .results import KetQuaPhanTichMat, KetQuaTheoDoiTay
+
+logger = logging.getLogger(__name__)
+
+
+class CheDoLapLich(Enum):
+    KHONG_TAI_XE = "idle"
+    ON_DINH = "stable"
+    DAY_DU = "full"
+
+
+@dataclass(frozen=True, slots=True)
+class NhipGiaiDoan:
+    """Chu kỳ (số khung) của mỗi giai đoạn. 1 = mọi khung, 0 = tắt."""
+    mat: int = 1
+    tay: int = 1
+    ve: int = 1
+
+
+NHIP_MAC_DINH: Dict[CheDoLapLich, NhipGiaiDoan] = {
+    CheDoLapLich.KHONG_TAI_XE: NhipGiaiDoan(mat=6, tay=0, ve=6),
+    CheDoLapLich.ON_DINH: NhipGiaiDoan(mat=1, tay=3, ve=1),
+    CheDoLapLich.DAY_DU: NhipGiaiDoan(mat=1, tay=1, ve=1),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class KeHoachKhung:
+    che_do: CheDoLapLich
+    chay_mat: bool
+    chay_tay: bool
+    chay_ve: bool
+
+    @property
+    def chay_clahe(self) -> bool:
+        return self.chay_mat or self.chay_tay
+
+
+@dataclass
+class BoLapLich:
+    thoi_gian_vang_mat: float = 3.0  # Không thấy mặt lâu hơn → KHONG_TAI_XE
+    thoi_gian_on_dinh: float = 2.0  # Không có tín hiệu cảnh báo lâu hơn → ON_DINH
+    nhip: Dict[CheDoLapLich, NhipGiaiDoan] = field(default_factory=lambda: dict(NHIP_MAC_DINH))
+    che_do: CheDoLapLich = field(default=CheDoLapLich.DAY_DU, init=False)
+
+    _dem_khung: int = field(default=0, repr=False)
+    _lan_thay_mat: Optional[float] = field(default=None, repr=False)
+    _lan_co_tin_hieu: Optional[float] = field(default=None, repr=False)
+
+    def lap_ke_hoach(self) -> KeHoachKhung:
+        nhip = self.nhip[self.che_do]
+        dem = self._dem_khung
+        self._dem_khung += 1
+        return KeHoachKhung(
+            self.che_do,
+            chay_mat=self._den_luot(nhip.mat, dem),
+            chay_tay=self._den_luot(nhip.tay, dem),
+            chay_ve=self._den_luot(nhip.ve, dem),
+        )
+
+    @staticmethod
+    def _den_luot(chu_ky: int, dem: int) -> bool:
+        return chu_ky > 0 and dem % chu_ky == 0
+
+    def cap_nhat(self, ts: float, ket_qua_mat: KetQuaPhanTichMat,
+                 ket_qua_tay: KetQuaTheoDoiTay) -> CheDoLapLich:
+        """Gọi sau mỗi khung FaceMesh thực sự chạy."""
+        if self._lan_thay_mat is None:
+            self._lan_thay_mat = self._lan_co_tin_hieu = ts
+        if ket_qua_mat.mat_phat_hien:
+            self._lan_thay_mat = ts
+            if self._co_tin_hieu(ket_qua_mat, ket_qua_tay):
+                self._lan_co_tin_hieu = ts
+            che_do = CheDoLapLich.ON_DINH if ts - self._lan_co_tin_hieu >= self.thoi_gian_on_dinh \
+                else CheDoLapLich.DAY_DU
+        elif ts - self._lan_thay_mat >= self.thoi_gian_vang_mat:
+            che_do = CheDoLapLich.KHONG_TAI_XE
+        else:
+            # Vừa mất mặt: chạy đầy đủ để bắt lại nhanh
+            che_do = CheDoLapLich.DAY_DU
+            self._lan_co_tin_hieu = ts
+
+        if che_do is not self.che_do:
+            logger.info(f"Lập lịch: {self.che_do.name} → {che_do.name} ({self.mo_ta_nhip(che_do)})")
+            self.che_do = che_do
+            self._dem_khung = 0
+        return che_do
+
+    @staticmethod
+    def _co_tin_hieu(ket_qua_mat: KetQuaPhanTichMat, ket_qua_tay: KetQuaTheoDoiTay) -> bool:
+        return (ket_qua_mat.ear < EAR_THRESHOLD or ket_qua_mat.canh_bao_buon_ngu
+                or ket_qua_mat.canh_bao_ngap or ket_qua_mat.canh_bao_tu_the
+                or ket_qua_tay.tay_gan_mat or ket_qua_tay.canh_bao_mat_tap_trung)
+
+    def mo_ta_nhip(self, che_do: Optional[CheDoLapLich] = None, fps: Optional[float] = None) -> str:
+        """VD: 'mat 1/1 tay 1/3 ve 1/1' hoặc tốc độ thực 'mat 30.0/s ...' nếu có fps."""
+        nhip = self.nhip[che_do or self.che_do]
+        phan = []
+        for ten in ('mat', 'tay', 've'):
+            chu_ky = getattr(nhip, ten)
+            if chu_ky <= 0:
+                phan.append(f"{ten} tat")
+            elif fps is not None:
+                phan.append(f"{ten} {fps/chu_ky:.1f}/s")
+            else:
+                phan.append(f"{ten} 1/{chu_ky}")
+        return " ".join(phan)
@@ -0,0 +1,99 @@
+"""
+Startup - Đo thời gian khởi động và làm nóng mô hình
+
+Thiết bị bật theo khóa điện nên thời gian tới khung đầu tiên có thể cảnh
+báo là chỉ số quan trọng. DongHoKhoiDong ghi từng giai đoạn (import, tạo
+FaceMesh/Hands trên luồng riêng, mở camera, làm nóng, khung đầu) theo cùng
+một mốc gốc, kể cả các giai đoạn chạy song song, rồi log bảng phân rã.
+
+lam_nong() chạy mô hình trước khi khung thật tới: lượt process() đầu tiên của
+MediaPipe mới khởi tạo graph / cấp phát tensor. Trên ảnh xám bộ dò không thấy
+mặt nên graph landmark (phần nặng nhất) không chạy - khung có mặt đầu tiên vẫn
+chậm. Vì vậy ưu tiên ảnh có mặt (anh_lam_nong): repo không kèm ảnh người thật,
+nên HeThongGiamSatTaiXe lưu khung có mặt đầu tiên của camera ra đường dẫn do
+người dùng chọn để lần khởi động sau làm nóng đủ cả hai graph.
+"""
+
+from __future__ import annotations
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DongHoKhoiDong:
+    """Các giai đoạn (tên, bắt đầu, kết thúc, luồng) tính từ moc_goc (perf_counter)."""
+    moc_goc: float = field(default_factory=time.perf_counter)
+
+    _giai_doan: List[Tuple[str, float, float, str]] = field(default_factory=list, repr=False)
+    _khoa: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def ghi(self, ten: str, bat_dau: float, ket_thuc: float) -> None:
+        """bat_dau/ket_thuc là perf_counter tuyệt đối; gọi được từ mọi luồng."""
+        with self._khoa:
+            self._giai_doan.append((ten, bat_dau - self.moc_goc, ket_thuc - self.moc_goc,
+                                    threading.current_thread().name))
+
+    @contextmanager
+    def do(self, ten: str) -> Iterator[None]:
+        bat_dau = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ghi(ten, bat_dau, time.perf_counter())
+
+    def bao_cao(self) -> float:
+        """Log bảng phân rã theo thứ tự bắt đầu; trả về giây từ mốc gốc đến giai đoạn kết thúc muộn nhất."""
+        with self._khoa:
+            cac_giai_doan = sorted(self._giai_doan, key=lambda gd: gd[1])
+        tong = max((ket_thuc for _, _, ket_thuc, _ in cac_giai_doan), default=0.0)
+        logger.info(f"Khởi động: {tong:.2f}s tới khung đầu tiên")
+        for ten, bat_dau, ket_thuc, luong in cac_giai_doan:
+            logger.info(f"  {ten:<18} {bat_dau:6.3f}s → {ket_thuc:6.3f}s  "
+                        f"{(ket_thuc - bat_dau)*1000:8.1f}ms  [{luong}]")
+        return tong
+
+
+def anh_lam_nong(kich_thuoc: Tuple[int, int], duong_dan: Optional[str] = None) -> np.ndarray:
+    """Ảnh RGB (cao, rộng, 3): ảnh ở duong_dan resize về kich_thuoc, không đọc được thì xám."""
+    rong, cao = kich_thuoc
+    anh = cv2.imread(duong_dan) if duong_dan else None
+    if anh is None:
+        return np.full((cao, rong, 3), 128, dtype=np.uint8)
+    anh = cv2.resize(anh, (rong, cao), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(anh, cv2.COLOR_BGR2RGB)
+
+
+def luu_anh_lam_nong(duong_dan: str, khung_bgr: np.ndarray) -> None:
+    """Ghi khung có mặt cho lần khởi động sau trên luồng nền (khung được copy trước)."""
+    khung = khung_bgr.copy()
+
+    def ghi() -> None:
+        if cv2.imwrite(duong_dan, khung):
+            logger.info(f"Đã lưu ảnh làm nóng {duong_dan}")
+        else:
+            logger.warning(f"Không ghi được ảnh làm nóng {duong_dan}")
+
+    threading.Thread(target=ghi, name="dms-luu-anh-lam-nong", daemon=True).start()
+
+
+def lam_nong(mo_hinh, kich_thuoc: Tuple[int, int], so_lan: int = 2,
+             duong_dan_anh: Optional[str] = None) -> None:
+    """
+    so_lan lượt mo_hinh.chay_mo_hinh() trên ảnh có mặt ở duong_dan_anh (không có
+    thì ảnh xám) cỡ (rộng, cao); không đụng trạng thái bộ lọc. Mô hình có biến
+    thể dự phòng (lam_nong_du_phong) được làm nóng cả biến thể đó.
+    """
+    anh = anh_lam_nong(kich_thuoc, duong_dan_anh)
+    du_phong = getattr(mo_hinh, "lam_nong_du_phong", None)
+    for _ in range(so_lan):
+        mo_hinh.chay_mo_hinh(anh)
+        if du_phong is not None:
+            du_phong(anh)
@@ -0,0 +1,208 @@
+"""
+Giám sát đa camera - Mỗi camera một tiến trình DMS
+
+Graph MediaPipe không an toàn khi dùng chung giữa các luồng, nên mỗi nguồn
+chạy trong tiến trình riêng (spawn), ghim vào một nhân CPU. Worker của nguồn
+trực tiếp (camera, URL luồng) thoát vì bất kỳ lý do gì - kể cả mã 0 khi camera
+ngừng trả khung - đều được khởi động lại; chỉ nguồn hữu hạn (file video, thư
+mục ảnh) thoát mã 0 mới là xong. Worker đã chạy ổn định thoi_gian_on_dinh giây
+thì lần thoát kế tiếp được đếm lại từ đầu (số lần và backoff), nên vài sự cố
+rải rác trong nhiều giờ không làm supervisor bỏ cuộc. FPS và cảnh báo của mọi
+camera gộp về một bảng.
+"""
+
+from __future__ import annotations
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ham_worker(nguon, bao_cao): chạy DMS cho một nguồn, gọi bao_cao(dict) định kỳ
+HamWorker = Callable[[str, Callable[[dict], None]], None]
+
+
+def ghim_nhan_cpu(nhan: Optional[int]) -> None:
+    """Ghim tiến trình hiện tại vào một nhân (chỉ Linux)."""
+    if nhan is None or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, {nhan})
+    except OSError as e:
+        logger.warning(f"Không ghim được nhân {nhan}: {e}")
+
+
+def la_nguon_huu_han(nguon: str) -> bool:
+    """File video / thư mục ảnh trên đĩa (hết khung là xong); id camera, /dev/video*, URL luồng thì không."""
+    if nguon.isdigit():
+        return False
+    return os.path.isfile(nguon) or os.path.isdir(nguon)
+
+
+def _chay_worker(ham_worker: HamWorker, chi_so: int, nguon: str,
+                 hang_doi: Any, nhan: Optional[int]) -> None:
+    ghim_nhan_cpu(nhan)
+
+    def bao_cao(trang_thai: dict) -> None:
+        try:
+            hang_doi.put_nowait((chi_so, trang_thai))
+        except queue.Full:
+            pass
+
+    ham_worker(nguon, bao_cao)
+
+
+@dataclass
+class TrangThaiCamera:
+    nguon: str
+    nhan: Optional[int] = None
+    huu_han: bool = False  # la_nguon_huu_han(nguon)
+    tien_trinh: Optional[mp.process.BaseProcess] = field(default=None, repr=False)
+    so_lan_khoi_dong_lai: int = 0  # Liên tiếp, đặt lại khi worker chạy ổn định
+    thoi_diem_chay: float = 0.0  # dong_ho() lúc khởi động worker hiện tại
+    thoi_diem_khoi_dong_lai: float = 0.0  # Thời điểm sớm nhất được khởi động lại
+    da_xong: bool = False
+    fps: float = 0.0
+    canh_bao: List[str] = field(default_factory=list)
+    lan_cap_nhat: float = 0.0
+
+
+@dataclass
+class GiamSatDaCamera:
+    """
+    Supervisor cho nhiều nguồn camera.
+    - ham_worker phải là hàm cấp module (pickle được với spawn)
+    - Worker thoát mã 0 chỉ là xong với nguồn hữu hạn (hết video / ảnh);
+      nguồn trực tiếp được khởi động lại với mọi mã thoát, trừ khi đang dừng
+    """
+    danh_sach_nguon: List[str]
+    ham_worker: HamWorker
+    ghim_nhan: bool = True
+    so_lan_khoi_dong_lai_toi_da: int = 5
+    cho_toi_da: float = 30.0  # Backoff tối đa giữa 2 lần khởi động lại (giây)
+    thoi_gian_on_dinh: float = 60.0  # Chạy lâu hơn thế rồi mới thoát → đặt lại đếm + backoff
+    chu_ky_bao_cao: float = 2.0
+    dong_ho: Callable[[], float] = field(default=time.monotonic, repr=False)
+
+    _ngu_canh: Any = field(init=False, repr=False)
+    _hang_doi: Any = field(init=False, repr=False)
+    _camera: List[TrangThaiCamera] = field(default_factory=list, repr=False)
+    _dang_dung: bool = field(default=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._ngu_canh = mp.get_context("spawn")
+        self._hang_doi = self._ngu_canh.Queue(maxsize=1000)
+        so_nhan = os.cpu_count() or 1
+        self._camera = [
+            TrangThaiCamera(nguon, i % so_nhan if self.ghim_nhan else None, la_nguon_huu_han(nguon))
+            for i, nguon in enumerate(self.danh_sach_nguon)
+        ]
+
+    def chay(self) -> None:
+        for chi_so in range(len(self._camera)):
+            self._khoi_dong(chi_so)
+        lan_bao_cao = time.time()
+        try:
+            while not all(cam.da_xong for cam in self._camera):
+                self._nhan_trang_thai(timeout=0.5)
+                self._kiem_tra_worker()
+                if time.time() - lan_bao_cao >= self.chu_ky_bao_cao:
+                    lan_bao_cao = time.time()
+                    logger.info("\n" + self.bang_trang_thai())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.dung()
+
+    def dung(self, thoi_gian_cho: float = 5.0) -> None:
+        self._dang_dung = True
+        for cam in self._camera:
+            if cam.tien_trinh is not None and cam.tien_trinh.is_alive():
+                cam.tien_trinh.terminate()
+        for cam in self._camera:
+            if cam.tien_trinh is not None:
+                cam.tien_trinh.join(thoi_gian_cho)
+            cam.da_xong = True
+
+    def trang_thai(self) -> List[Dict[str, Any]]:
+        return [{
+            'nguon': cam.nguon,
+            'pid': cam.tien_trinh.pid if cam.tien_trinh else None,
+            'nhan': cam.nhan,
+            'fps': cam.fps,
+            'canh_bao': list(cam.canh_bao),
+            'khoi_dong_lai': cam.so_lan_khoi_dong_lai,
+            'da_xong': cam.da_xong,
+        } for cam in self._camera]
+
+    def bang_trang_thai(self) -> str:
+        dong = [f"{'#':>2} {'Nguồn':<24} {'PID':>7} {'Nhân':>4} {'FPS':>6} {'KĐL':>3}  Cảnh báo"]
+        for i, tt in enumerate(self.trang_thai()):
+            dong.append(
+                f"{i:>2} {tt['nguon'][-24:]:<24} {tt['pid'] or '-':>7} "
+                f"{'-' if tt['nhan'] is None else tt['nhan']:>4} {tt['fps']:>6.1f} "
+                f"{tt['khoi_dong_lai']:>3}  {', '.join(tt['canh_bao']) or ('XONG' if tt['da_xong'] else '-')}")
+        return "\n".join(dong)
+
+    def _khoi_dong(self, chi_so: int) -> None:
+        cam = self._camera[chi_so]
+        cam.tien_trinh = self._ngu_canh.Process(
+            target=_chay_worker,
+            args=(self.ham_worker, chi_so, cam.nguon, self._hang_doi, cam.nhan),
+            name=f"dms-cam-{chi_so}", daemon=True)
+        cam.tien_trinh.start()
+        cam.thoi_diem_chay = self.dong_ho()
+        logger.info(f"Khởi động worker {chi_so} ({cam.nguon}) pid={cam.tien_trinh.pid} nhân={cam.nhan}")
+
+    def _nhan_trang_thai(self, timeout: float) -> None:
+        try:
+            chi_so, trang_thai = self._hang_doi.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            cam = self._camera[chi_so]
+            cam.fps = trang_thai.get('fps', cam.fps)
+            cam.canh_bao = trang_thai.get('canh_bao', cam.canh_bao)
+            cam.lan_cap_nhat = time.time()
+            try:
+                chi_so, trang_thai = self._hang_doi.get_nowait()
+            except queue.Empty:
+                return
+
+    def _kiem_tra_worker(self) -> None:
+        if self._dang_dung:
+            return
+        bay_gio = self.dong_ho()
+        for chi_so, cam in enumerate(self._camera):
+            if cam.da_xong or cam.tien_trinh is None or cam.tien_trinh.is_alive():
+                continue
+            ma_thoat = cam.tien_trinh.exitcode
+            if ma_thoat == 0 and cam.huu_han:
+                logger.info(f"Worker {chi_so} ({cam.nguon}) đã xong")
+                cam.da_xong, cam.fps, cam.canh_bao = True, 0.0, []
+                continue
+            thoi_gian_chay = bay_gio - cam.thoi_diem_chay
+            if cam.thoi_diem_khoi_dong_lai == 0.0 and cam.so_lan_khoi_dong_lai and \
+                    thoi_gian_chay >= self.thoi_gian_on_dinh:
+                logger.info(f"Worker {chi_so} ({cam.nguon}) đã chạy ổn định {thoi_gian_chay:.0f}s, "
+                            f"đặt lại đếm khởi động lại ({cam.so_lan_khoi_dong_lai})")
+                cam.so_lan_khoi_dong_lai = 0
+            if cam.so_lan_khoi_dong_lai >= self.so_lan_khoi_dong_lai_toi_da:
+                logger.error(f"Worker {chi_so} ({cam.nguon}) thoát quá "
+                             f"{self.so_lan_khoi_dong_lai_toi_da} lần liên tiếp, bỏ cuộc")
+                cam.da_xong, cam.fps, cam.canh_bao = True, 0.0, []
+                continue
+            if cam.thoi_diem_khoi_dong_lai == 0.0:
+                cho = min(2.0 ** cam.so_lan_khoi_dong_lai, self.cho_toi_da)
+                cam.thoi_diem_khoi_dong_lai = bay_gio + cho
+                logger.warning(f"Worker {chi_so} ({cam.nguon}) thoát mã {ma_thoat}, "
+                               f"khởi động lại sau {cho:.0f}s")
+            elif bay_gio >= cam.thoi_diem_khoi_dong_lai:
+                cam.so_lan_khoi_dong_lai += 1
+                cam.thoi_diem_khoi_dong_lai = 0.0
+                cam.fps, cam.canh_bao = 0.0, []
+                self._khoi_dong(chi_so)
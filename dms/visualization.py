@@ -1,13 +1,32 @@
 """
 Visualization - Hiển thị kết quả DMS
+
+Lớp tĩnh (nền bảng số liệu, băng cảnh báo kèm chữ) dựng sẵn một lần cho mỗi
+độ phân giải rồi chỉ blit vào khung. Điểm landmark vẽ một lần bằng numpy
+từ mảng toạ độ, khung xương bàn tay bằng một lệnh cv2.polylines.
 """
 
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import List, Optional, Tuple
+from typing import Dict, Optional, Tuple
 import cv2
 import numpy as np
-from .constants import Mau, AlertType, EAR_THRESHOLD, MAR_THRESHOLD
+from .constants import (Mau, AlertType, EAR_THRESHOLD, MAR_THRESHOLD,
+                        CHI_SO_MAT_PHAI, CHI_SO_MAT_TRAI, CHI_SO_MIENG_NGOAI)
+
+# Điểm mắt + môi vẽ trên mặt (khi chỉ có danh sách landmark proto)
+_CHI_SO_LUOI = CHI_SO_MAT_PHAI + CHI_SO_MAT_TRAI + CHI_SO_MIENG_NGOAI
+
+# Topology bàn tay MediaPipe (giống mp.solutions.hands.HAND_CONNECTIONS)
+KET_NOI_TAY = np.array([
+    (0, 1), (1, 2), (2, 3), (3, 4),          # Ngón cái
+    (0, 5), (5, 6), (6, 7), (7, 8),          # Ngón trỏ
+    (5, 9), (9, 10), (10, 11), (11, 12),     # Ngón giữa
+    (9, 13), (13, 14), (14, 15), (15, 16),   # Ngón áp út
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),  # Ngón út + lòng bàn tay
+], dtype=np.intp)
+
+_PHONG_CHU = cv2.FONT_HERSHEY_SIMPLEX
 
 
 @dataclass(frozen=True)
@@ -18,52 +37,145 @@ class CauHinhBangTin:
     chieu_cao: int = 130
 
 
+@dataclass
+class _LopTinh:
+    """Lớp dựng sẵn cho một độ phân giải: (ảnh, x, y); _dan cắt theo biên khung khi blit."""
+    bang: Tuple[np.ndarray, int, int]
+    canh_bao: Dict[AlertType, Tuple[np.ndarray, int, int]]  # y của hàng 0
+
+
+def _but_cham(ban_kinh: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Offset (dy, dx) của hình tròn đặc bán kính ban_kinh."""
+    dy, dx = np.mgrid[-ban_kinh:ban_kinh+1, -ban_kinh:ban_kinh+1]
+    trong = dy**2 + dx**2 <= ban_kinh**2
+    return dy[trong], dx[trong]
+
+
 @dataclass
 class TraoDuaTinhNang:
     bang_tin: CauHinhBangTin = field(default_factory=CauHinhBangTin)
     do_dai_truc: int = 100
-    _mp_drawing: object = field(default=None, init=False, repr=False)
-    _mp_hands: object = field(default=None, init=False, repr=False)
-    
+    do_dam_nen: float = 1.0  # 1 = nền đặc như cũ, <1 = nền bán trong suốt
+    ban_kinh_diem_mat: int = 1
+    ban_kinh_diem_tay: int = 2
+
+    _lop_tinh: Dict[Tuple[int, int], _LopTinh] = field(default_factory=dict, repr=False)
+    _truc: np.ndarray = field(init=False, repr=False)
+    _but_mat: Tuple[np.ndarray, np.ndarray] = field(init=False, repr=False)
+    _but_tay: Tuple[np.ndarray, np.ndarray] = field(init=False, repr=False)
+
     def __post_init__(self) -> None:
-        try:
-            import mediapipe as mp
-            self._mp_drawing = mp.solutions.drawing_utils
-            self._mp_hands = mp.solutions.hands
-        except ImportError:
-            pass
-    
+        self._truc = np.float64([[self.do_dai_truc, 0, 0], [0, self.do_dai_truc, 0],
+                                 [0, 0, self.do_dai_truc]])
+        self._but_mat = _but_cham(self.ban_kinh_diem_mat)
+        self._but_tay = _but_cham(self.ban_kinh_diem_tay)
+
+    # ---------- Lớp tĩnh ----------
+
+    def _lay_lop_tinh(self, chieu_rong: int, chieu_cao: int) -> _LopTinh:
+        khoa = (chieu_rong, chieu_cao)
+        if khoa not in self._lop_tinh:
+            self._lop_tinh[khoa] = self._dung_lop_tinh(chieu_rong, chieu_cao)
+        return self._lop_tinh[khoa]
+
+    def _dung_lop_tinh(self, chieu_rong: int, chieu_cao: int) -> _LopTinh:
+        p = self.bang_tin
+        bang = np.zeros((p.chieu_cao + 1, p.chieu_rong + 1, 3), dtype=np.uint8)
+        cv2.rectangle(bang, (0, 0), (p.chieu_rong, p.chieu_cao), Mau.TRANG, 1)
+
+        canh_bao = {}
+        for loai in AlertType:
+            sz = cv2.getTextSize(loai.value, _PHONG_CHU, 0.8, 2)[0]
+            bang_chu = np.zeros((31, sz[0] + 21, 3), dtype=np.uint8)
+            cv2.putText(bang_chu, loai.value, (10, 25), _PHONG_CHU, 0.8, Mau.DO, 2)
+            x = (chieu_rong - sz[0]) // 2 - 10
+            canh_bao[loai] = (bang_chu, x, chieu_cao - 55)
+        return _LopTinh((bang, p.x, p.y), canh_bao)
+
+    def _dan(self, khung_hinh: np.ndarray, lop: np.ndarray, x: int, y: int) -> None:
+        """Blit lop vào khung tại (x, y), cắt phần nằm ngoài biên."""
+        chieu_cao, chieu_rong = khung_hinh.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + lop.shape[1], chieu_rong), min(y + lop.shape[0], chieu_cao)
+        if x0 >= x1 or y0 >= y1:
+            return
+        vung = khung_hinh[y0:y1, x0:x1]
+        nguon = lop[y0 - y:y1 - y, x0 - x:x1 - x]
+        if self.do_dam_nen >= 1.0:
+            vung[:] = nguon
+        else:
+            cv2.addWeighted(nguon, self.do_dam_nen, vung, 1.0 - self.do_dam_nen, 0.0, dst=vung)
+
+    # ---------- Điểm landmark ----------
+
+    @staticmethod
+    def _cham(khung_hinh: np.ndarray, diem_px: np.ndarray, but: Tuple[np.ndarray, np.ndarray],
+              mau_sac: Tuple[int, int, int]) -> None:
+        """Vẽ mọi điểm (N, 2) bằng một phép gán fancy-index thay vì N lệnh cv2.circle."""
+        if diem_px.size == 0:
+            return
+        chieu_cao, chieu_rong = khung_hinh.shape[:2]
+        diem = diem_px.reshape(-1, 2).astype(np.intp)
+        ys = (diem[:, 1, None] + but[0]).ravel()
+        xs = (diem[:, 0, None] + but[1]).ravel()
+        trong = (ys >= 0) & (ys < chieu_cao) & (xs >= 0) & (xs < chieu_rong)
+        khung_hinh[ys[trong], xs[trong]] = mau_sac
+
     def ve_luoi_mat(self, khung_hinh: np.ndarray, diem_moc) -> np.ndarray:
+        """diem_moc: mảng pixel (..., 2) (VD: diem_moc_mat + diem_moc_mieng) hoặc danh sách landmark."""
         if diem_moc is None:
             return khung_hinh
+        if not isinstance(diem_moc, np.ndarray):
+            chieu_cao, chieu_rong = khung_hinh.shape[:2]
+            diem_moc = np.array([(diem_moc[i].x*chieu_rong, diem_moc[i].y*chieu_cao)
+                                 for i in _CHI_SO_LUOI])
+        self._cham(khung_hinh, diem_moc, self._but_mat, Mau.XANH_LA)
+        return khung_hinh
+
+    def ve_diem_moc_tay(self, khung_hinh: np.ndarray, danh_sach_tay) -> np.ndarray:
+        """
+        Khung xương mọi bàn tay: một cv2.polylines cho cạnh, một lần gán cho điểm.
+        danh_sach_tay: mảng chuẩn hóa (so_tay, 21, 2|3) hoặc danh sách landmark proto.
+        """
+        if danh_sach_tay is None or len(danh_sach_tay) == 0:
+            return khung_hinh
         chieu_cao, chieu_rong = khung_hinh.shape[:2]
-        # Eye + lip landmarks
-        for chi_so in (33, 160, 158, 133, 153, 144, 362, 385, 387, 263, 373, 380,
-                    61, 39, 0, 269, 291, 405, 17, 181):
-            cv2.circle(khung_hinh, (int(diem_moc[chi_so].x*chieu_rong), int(diem_moc[chi_so].y*chieu_cao)), 
-                      1, Mau.XANH_LA, -1)
+        if isinstance(danh_sach_tay, np.ndarray):
+            diem = danh_sach_tay[..., :2]
+        else:
+            diem = np.array([[(lm.x, lm.y) for lm in tay.landmark] for tay in danh_sach_tay],
+                            dtype=np.float32)
+        diem = (diem * np.array([chieu_rong, chieu_cao], dtype=np.float32)).astype(np.int32)
+        canh = diem[:, KET_NOI_TAY].reshape(-1, 2, 2)  # (so_tay*21, 2, 2)
+        cv2.polylines(khung_hinh, list(canh), False, Mau.TRANG, 1)
+        self._cham(khung_hinh, diem, self._but_tay, Mau.XANH_LA)
         return khung_hinh
-    
-    def ve_truc_tu_the_dau(self, khung_hinh: np.ndarray, vec_quay, vec_tuan, 
-                            dau_mui: Tuple[float, float]) -> np.ndarray:
+
+    # ---------- Lớp động ----------
+
+    def ve_truc_tu_the_dau(self, khung_hinh: np.ndarray, vec_quay, vec_tuan,
+                            dau_mui: Tuple[float, float],
+                            ma_tran_camera: Optional[np.ndarray] = None,
+                            he_so_meo: Optional[np.ndarray] = None) -> np.ndarray:
+        """ma_tran_camera/he_so_meo: lấy từ BoUocLuongTuThe để khỏi dựng lại mỗi khung."""
         if vec_quay is None:
             return khung_hinh
-        chieu_cao, chieu_rong = khung_hinh.shape[:2]
-        ma_tran_camera = np.array([[chieu_rong, 0, chieu_rong/2], [0, chieu_rong, chieu_cao/2], [0, 0, 1]], dtype=np.float64)
-        truc = np.float64([[self.do_dai_truc, 0, 0], [0, self.do_dai_truc, 0], 
-                           [0, 0, self.do_dai_truc]])
-        diem_chieu, _ = cv2.projectPoints(truc, vec_quay, vec_tuan, ma_tran_camera, np.zeros((4, 1)))
+        if ma_tran_camera is None:
+            chieu_cao, chieu_rong = khung_hinh.shape[:2]
+            ma_tran_camera = np.array([[chieu_rong, 0, chieu_rong/2], [0, chieu_rong, chieu_cao/2], [0, 0, 1]], dtype=np.float64)
+        diem_chieu, _ = cv2.projectPoints(self._truc, vec_quay, vec_tuan, ma_tran_camera,
+                                          he_so_meo if he_so_meo is not None else np.zeros((4, 1)))
         mui = (int(dau_mui[0]), int(dau_mui[1]))
         for i, mau_sac in enumerate([Mau.TRUC_X, Mau.TRUC_Y, Mau.TRUC_Z]):
             cv2.line(khung_hinh, mui, tuple(diem_chieu[i].ravel().astype(int)), mau_sac, 2)
         return khung_hinh
-    
+
     def ve_so_lieu(self, khung_hinh: np.ndarray, ear: float, mar: float,
                      pitch: float, yaw: float, roll: float, fps: float) -> np.ndarray:
+        lop = self._lay_lop_tinh(khung_hinh.shape[1], khung_hinh.shape[0])
+        self._dan(khung_hinh, *lop.bang)
+
         p = self.bang_tin
-        cv2.rectangle(khung_hinh, (p.x, p.y), (p.x+p.chieu_rong, p.y+p.chieu_cao), (0,0,0), -1)
-        cv2.rectangle(khung_hinh, (p.x, p.y), (p.x+p.chieu_rong, p.y+p.chieu_cao), Mau.TRANG, 1)
-        
         danh_sach_so_lieu = [
             (f"EAR: {ear:.2f}", Mau.DO if ear < EAR_THRESHOLD else Mau.XANH_LA),
             (f"MAR: {mar:.2f}", Mau.DO if mar > MAR_THRESHOLD else Mau.XANH_LA),
@@ -73,33 +185,26 @@ class TraoDuaTinhNang:
             (f"FPS: {fps:.1f}", Mau.VANG),
         ]
         for i, (txt, mau_sac) in enumerate(danh_sach_so_lieu):
-            cv2.putText(khung_hinh, txt, (p.x+10, p.y+25+i*18), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.45, mau_sac, 1)
+            cv2.putText(khung_hinh, txt, (p.x+10, p.y+25+i*18),
+                       _PHONG_CHU, 0.45, mau_sac, 1)
         return khung_hinh
-    
+
+    def ve_trang_thai(self, khung_hinh: np.ndarray, dong_chu: str) -> np.ndarray:
+        """Dòng trạng thái nhỏ ở góc trên bên phải (VD: chế độ lập lịch)."""
+        chieu_rong = khung_hinh.shape[1]
+        sz = cv2.getTextSize(dong_chu, _PHONG_CHU, 0.4, 1)[0]
+        cv2.putText(khung_hinh, dong_chu, (chieu_rong - sz[0] - 10, 20),
+                    _PHONG_CHU, 0.4, Mau.VANG, 1)
+        return khung_hinh
+
     def ve_canh_bao(self, khung_hinh: np.ndarray, buon_ngu=False, ngap=False,
                     tu_the=False, mat_tap_trung=False) -> np.ndarray:
-        chieu_cao, chieu_rong = khung_hinh.shape[:2]
-        danh_sach_canh_bao = []
-        if buon_ngu: danh_sach_canh_bao.append(AlertType.DROWSINESS.value)
-        if ngap: danh_sach_canh_bao.append(AlertType.YAWN.value)
-        if tu_the: danh_sach_canh_bao.append(AlertType.HEAD_POSE.value)
-        if mat_tap_trung: danh_sach_canh_bao.append(AlertType.DISTRACTION.value)
-        
-        for i, txt in enumerate(danh_sach_canh_bao):
-            y = chieu_cao - 30 - i*35
-            sz = cv2.getTextSize(txt, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
-            x = (chieu_rong - sz[0]) // 2
-            cv2.rectangle(khung_hinh, (x-10, y-25), (x+sz[0]+10, y+5), (0,0,0), -1)
-            cv2.putText(khung_hinh, txt, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, Mau.DO, 2)
-        return khung_hinh
-    
-    def ve_diem_moc_tay(self, khung_hinh: np.ndarray, danh_sach_tay: List) -> np.ndarray:
-        if not danh_sach_tay or not self._mp_drawing:
-            return khung_hinh
-        for tay in danh_sach_tay:
-            self._mp_drawing.draw_landmarks(
-                khung_hinh, tay, self._mp_hands.HAND_CONNECTIONS,
-                self._mp_drawing.DrawingSpec(color=Mau.XANH_LA, thickness=1),
-                self._mp_drawing.DrawingSpec(color=Mau.TRANG, thickness=1))
+        lop = self._lay_lop_tinh(khung_hinh.shape[1], khung_hinh.shape[0])
+        danh_sach_canh_bao = [loai for loai, bat in (
+            (AlertType.DROWSINESS, buon_ngu), (AlertType.YAWN, ngap),
+            (AlertType.HEAD_POSE, tu_the), (AlertType.DISTRACTION, mat_tap_trung)) if bat]
+
+        for i, loai in enumerate(danh_sach_canh_bao):
+            bang_chu, x, y = lop.canh_bao[loai]
+            self._dan(khung_hinh, bang_chu, x, y - i*35)
         return khung_hinh
@@ -1,129 +1,588 @@
 """
 Hệ Thống Giám Sát Tài Xế (DMS)
 
-Sử dụng: python main.py [--camera 0] [--width 640] [--height 480]
+Sử dụng: python main.py [--camera 0] [--width 640] [--height 480] [--pipeline]
+         python main.py --source chuyen_di.mp4 --no-display
+         python main.py --cameras 0 1 2
+         python main.py --source chuyen_di.mp4 --no-display --record-landmarks lm/ && python main.py --replay lm/
 Nhấn 'q' để thoát.
 """
 
 from __future__ import annotations
 import argparse
 import logging
+import os
 import sys
 import time
-import threading
-from contextlib import contextmanager
+_MOC_NAP = time.perf_counter()  # Gốc của bảng thời gian khởi động (trước import nặng)
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Generator, Optional
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple, Union
 import cv2
 import numpy as np
+from dms.capture import CAC_BACKEND, CauHinhCamera, NguonKhungHinh, KetQuaDoc, ThongKeDoTre, tao_nguon
 from dms.preprocessing import TienXuLyCLAHE
 from dms.face_analysis import PhanTichMat
 from dms.hand_tracking import TheoDoiTay
+from dms.results import KetQuaPhanTichMat, KetQuaTheoDoiTay
 from dms.visualization import TraoDuaTinhNang
-from dms.constants import THOI_GIAN_CANH_BAO_AM_THANH, KHOANG_CACH_AM_THANH
+from dms.pipeline import DuongOngDMS, KhungHinh
+from dms.frame_context import NguCanhKhungHinh
+from dms.buffer_pool import BeBoDem
+from dms.head_pose import BoUocLuongTuThe, NoiTaiCamera, PhuongPhapPnP
+from dms.scheduler import BoLapLich, CheDoLapLich
+from dms.budget import BoDieuKhienNganSach, MucGiam
+from dms.startup import DongHoKhoiDong, lam_nong, luu_anh_lam_nong
+from dms.constants import AlertType, THOI_GIAN_CANH_BAO_AM_THANH, KHOANG_CACH_AM_THANH
+
+if TYPE_CHECKING:  # Chỉ nạp khi dùng tới tính năng (đầu ra, âm thanh, cảnh báo, đo lường, phát lại, ...)
+    from dms.alerts import BoDieuPhoiCanhBao
+    from dms.audio import BoPhatAmThanh
+    from dms.black_box import BoGhiHopDen
+    from dms.metrics import BoDoLuong, MayChuDoLuong
+    from dms.output import BoGhiKetQua, DinhDangDauRa
+    from dms.replay import BoGhiDiemMoc
+_NAP_XONG = time.perf_counter()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-def phat_am_thanh_async(duong_dan: str) -> None:
-    """Phát âm thanh trong thread riêng để không block."""
-    try:
-        import playsound
-        playsound.playsound(duong_dan, block=False)
-        logger.info(f"Phát âm thanh: {duong_dan}")
-    except ImportError:
-        logger.warning("Chưa cài playsound. Cài: pip install playsound")
-    except Exception as e:
-        logger.warning(f"Lỗi phát âm thanh: {e}")
-
-
-@dataclass
-class CauHinhCamera:
-    id_camera: int = 0
-    chieu_rong: int = 640
-    chieu_cao: int = 480
-    fps: int = 30
-
-
-@contextmanager
-def mo_camera(cau_hinh: CauHinhCamera) -> Generator[cv2.VideoCapture, None, None]:
-    may_quay = cv2.VideoCapture(cau_hinh.id_camera)
-    may_quay.set(cv2.CAP_PROP_FRAME_WIDTH, cau_hinh.chieu_rong)
-    may_quay.set(cv2.CAP_PROP_FRAME_HEIGHT, cau_hinh.chieu_cao)
-    may_quay.set(cv2.CAP_PROP_FPS, cau_hinh.fps)
-    if not may_quay.isOpened():
-        raise RuntimeError(f"Không thể mở camera {cau_hinh.id_camera}")
-    logger.info(f"Camera sẵn sàng ({cau_hinh.chieu_rong}x{cau_hinh.chieu_cao}@{cau_hinh.fps}fps)")
-    try:
-        yield may_quay
-    finally:
-        may_quay.release()
-
-
 @dataclass
 class ThongKeFPS:
-    """Moving average FPS."""
+    """Moving average FPS - deque cố định + tổng trượt, O(1) mỗi khung."""
     cua_so: int = 30
-    _lich_su: list = field(default_factory=list, repr=False)
+    _lich_su: Deque[float] = field(init=False, repr=False)
+    _tong: float = field(default=0.0, repr=False)
     _truoc: float = field(default_factory=time.time, repr=False)
     
+    def __post_init__(self) -> None:
+        self._lich_su = deque(maxlen=self.cua_so)
+    
     def cap_nhat(self) -> float:
         bay_gio = time.time()
-        self._lich_su.append(1.0 / max(bay_gio - self._truoc, 1e-6))
+        gia_tri = 1.0 / max(bay_gio - self._truoc, 1e-6)
         self._truoc = bay_gio
-        if len(self._lich_su) > self.cua_so:
-            self._lich_su.pop(0)
-        return sum(self._lich_su) / len(self._lich_su)
+        if len(self._lich_su) == self.cua_so:
+            self._tong -= self._lich_su[0]
+        self._lich_su.append(gia_tri)
+        self._tong += gia_tri
+        return self._tong / len(self._lich_su)
 
 
 @dataclass
 class HeThongGiamSatTaiXe:
     cau_hinh_camera: CauHinhCamera = field(default_factory=CauHinhCamera)
+    nguon: Optional[NguonKhungHinh] = None  # None = camera theo cau_hinh_camera
+    hien_thi: bool = True  # False = headless, chạy nhanh nhất có thể
     ten_cua_so: str = "He Thong Giam Sat Tai Xe"
-    duong_dan_am_thanh: str = "chiken-on-tree.mp3"
+    duong_dan_am_thanh: str = "chiken-on-tree.mp3"  # Âm mặc định cho mọi loại cảnh báo
+    am_thanh_canh_bao: Dict[AlertType, str] = field(default_factory=dict)  # Âm riêng theo loại
+    hau_truong_am_thanh: str = "auto"  # auto (audio.HAU_TRUONG_TU_DONG) | sounddevice | playsound | null
+    duong_dan_su_kien: Optional[str] = None  # JSONL sự kiện bắt đầu/kết thúc cảnh báo
+    url_webhook: Optional[str] = None  # POST JSON mỗi sự kiện cảnh báo
+    che_do_duong_ong: bool = False  # Thu hình / phân tích / hiển thị trên luồng riêng
+    chu_ky_log_hang_doi: float = 5.0  # Giây giữa 2 lần log độ sâu hàng đợi
+    bao_cao_trang_thai: Optional[Callable[[dict], None]] = None  # Nhận {'fps', 'canh_bao', ...}
+    chu_ky_bao_cao: float = 1.0
+    do_giai_doan: Optional[Callable[[str, float], None]] = None  # (giai đoạn, giây) mỗi khung
+    cong_do_luong: Optional[int] = None  # Cổng HTTP /metrics (Prometheus); None = tắt hẳn
+    cat_vung_tay: bool = False  # Hands chỉ chạy quanh mặt
+    chu_ky_tay: int = 1  # Hands mỗi N khung khi chưa có tay gần mặt
+    lap_lich_thich_ung: bool = False  # Nhịp từng giai đoạn theo trạng thái tài xế
+    ve_lop_phu: bool = True  # False = hiển thị ảnh gốc, không vẽ
+    fps_ve_toi_da: float = 0.0  # Giới hạn tốc độ vẽ lớp phủ, độc lập với phân tích (0 = không giới hạn)
+    duong_dan_dau_ra: Optional[str] = None  # Ghi kết quả từng khung ('-' = stdout)
+    dinh_dang_dau_ra: Union[str, DinhDangDauRa] = "jsonl"  # Giá trị của DinhDangDauRa
+    duong_dan_hop_den: Optional[str] = None  # Ring buffer memmap số liệu từng khung
+    thoi_luong_hop_den_gio: float = 4.0
+    thu_muc_diem_moc: Optional[str] = None  # Ghi landmark thô từng khung để phát lại (replay.py)
+    suy_luan: bool = True  # False = chỉ phát lại landmark, không nạp MediaPipe
+    clahe_thich_ung: bool = False  # Bỏ qua CLAHE khi ánh sáng đủ tốt
+    kich_thuoc_suy_luan: Optional[Tuple[int, int]] = None  # (rộng, cao) cho CLAHE + mô hình; None = khung thu
+    tu_chon_kich_thuoc: bool = False  # Đo ở khung đầu, chọn kích thước lớn nhất đạt thoi_gian_muc_tieu
+    thoi_gian_muc_tieu: Optional[float] = None  # Giây cho CLAHE + suy luận; None = 1/fps camera
+    ngan_sach_khung: Optional[float] = None  # Giây xử lý mỗi khung; vượt thì giảm tính năng (budget.py)
+    phuong_phap_tu_the: PhuongPhapPnP = PhuongPhapPnP.ITERATIVE
+    duong_dan_noi_tai: Optional[str] = None  # File intrinsics đã hiệu chuẩn (.npz/.json)
+    so_lan_lam_nong: int = 2  # Lượt chạy mỗi mô hình trước khung đầu (0 = tắt)
+    anh_lam_nong: Optional[str] = None  # Ảnh có mặt để làm nóng; chưa có thì lưu khung có mặt đầu tiên vào đây
     
     _tien_xu_ly: TienXuLyCLAHE = field(init=False, repr=False)
     _phan_tich_mat: PhanTichMat = field(init=False, repr=False)
     _theo_doi_tay: TheoDoiTay = field(init=False, repr=False)
     _trao_dua_tinh_nang: TraoDuaTinhNang = field(init=False, repr=False)
     _fps: ThongKeFPS = field(init=False, repr=False)
+    _be_bo_dem: BeBoDem = field(default_factory=BeBoDem, repr=False)
+    _bo_ghi: Optional[BoGhiKetQua] = field(default=None, init=False, repr=False)
+    _hop_den: Optional[BoGhiHopDen] = field(default=None, init=False, repr=False)
+    _ghi_diem_moc: Optional[BoGhiDiemMoc] = field(default=None, init=False, repr=False)
+    _am_thanh: Optional[BoPhatAmThanh] = field(default=None, init=False, repr=False)
+    _dieu_phoi: Optional[BoDieuPhoiCanhBao] = field(default=None, init=False, repr=False)
+    _bo_lap_lich: Optional[BoLapLich] = field(default=None, init=False, repr=False)
+    _ngan_sach: Optional[BoDieuKhienNganSach] = field(default=None, init=False, repr=False)
+    _do_luong: Optional[BoDoLuong] = field(default=None, init=False, repr=False)
+    _may_chu_do_luong: Optional[MayChuDoLuong] = field(default=None, init=False, repr=False)
+    _canh_bao_truoc: frozenset = field(default=frozenset(), repr=False)
+    _ket_qua_mat: KetQuaPhanTichMat = field(default_factory=KetQuaPhanTichMat, repr=False)
+    _ket_qua_tay: KetQuaTheoDoiTay = field(default_factory=KetQuaTheoDoiTay, repr=False)
     
     # Tracking buồn ngủ
     _thoi_gian_buon_ngu_bat_dau: Optional[float] = field(default=None, repr=False)
     _thoi_gian_am_thanh_cuoi: float = field(default=0.0, repr=False)
+    _lan_bao_cao_cuoi: float = field(default=0.0, repr=False)
+    _lan_ve_cuoi: Optional[float] = field(default=None, repr=False)
+    _can_chon_kich_thuoc: bool = field(default=False, repr=False)
+    _khoi_dong: DongHoKhoiDong = field(default_factory=lambda: DongHoKhoiDong(_MOC_NAP), repr=False)
+    _da_bao_cao_khoi_dong: bool = field(default=False, repr=False)
+    _can_luu_anh_lam_nong: bool = field(default=False, repr=False)  # --warmup-image chưa có file
+    _mo_hinh_dang_tao: Optional[Tuple[Future, Future]] = field(default=None, repr=False)
+    _nguon_truc_tiep: bool = field(default=False, repr=False)
+    _tre_thu: ThongKeDoTre = field(default_factory=ThongKeDoTre, repr=False)  # Thu hình → bắt đầu phân tích
     
     def __post_init__(self) -> None:
         logger.info("Khởi tạo DMS...")
-        self._tien_xu_ly = TienXuLyCLAHE()
-        self._phan_tich_mat = PhanTichMat()
-        self._theo_doi_tay = TheoDoiTay()
+        self._khoi_dong.ghi('import', _MOC_NAP, _NAP_XONG)
+        if self.cong_do_luong is not None:
+            from dms.metrics import BoDoLuong
+            self._do_luong = BoDoLuong()
+            ham_ngoai = self.do_giai_doan
+            self.do_giai_doan = self._do_luong.quan_sat if ham_ngoai is None else \
+                lambda giai_doan, giay: (self._do_luong.quan_sat(giai_doan, giay), ham_ngoai(giai_doan, giay))
+        self._tien_xu_ly = TienXuLyCLAHE(thich_ung=self.clahe_thich_ung)
+        self._mo_hinh_dang_tao = self._bat_dau_tao_mo_hinh()
         self._trao_dua_tinh_nang = TraoDuaTinhNang()
         self._fps = ThongKeFPS()
-        logger.info("DMS sẵn sàng!")
+        if self.lap_lich_thich_ung:
+            self._bo_lap_lich = BoLapLich()
+        if self.ngan_sach_khung:
+            self._ngan_sach = BoDieuKhienNganSach(self.ngan_sach_khung)
+        self._can_chon_kich_thuoc = self.tu_chon_kich_thuoc and self.suy_luan
+        logger.info("DMS sẵn sàng! (FaceMesh/Hands đang tạo trên luồng nền)")
+    
+    def _bat_dau_tao_mo_hinh(self) -> Tuple[Future, Future]:
+        """
+        FaceMesh và Hands tạo + làm nóng song song trên luồng nền, chồng lên
+        mở đầu ra / camera / cửa sổ; _cho_mo_hinh() lấy kết quả.
+        """
+        noi_tai = NoiTaiCamera.tai(self.duong_dan_noi_tai) if self.duong_dan_noi_tai else None
+        kich_thuoc = self.kich_thuoc_suy_luan or (self.cau_hinh_camera.chieu_rong, self.cau_hinh_camera.chieu_cao)
+        so_lan = self.so_lan_lam_nong if self.suy_luan else 0
+        co_anh = bool(self.anh_lam_nong) and os.path.isfile(self.anh_lam_nong)
+        if so_lan > 0 and not co_anh:  # Bộ dò không thấy mặt → khung có mặt đầu tiên vẫn chậm
+            logger.info("Làm nóng trên ảnh xám, graph landmark chưa chạy" +
+                        (f"; sẽ lưu khung có mặt đầu tiên vào {self.anh_lam_nong}" if self.anh_lam_nong else ""))
+        self._can_luu_anh_lam_nong = bool(self.anh_lam_nong) and not co_anh and self.suy_luan
+        
+        def tao(ten: str, ham_tao: Callable[[], object]):
+            with self._khoi_dong.do(f"tao_{ten}"):
+                mo_hinh = ham_tao()
+            if so_lan > 0:
+                with self._khoi_dong.do(f"lam_nong_{ten}"):
+                    lam_nong(mo_hinh, kich_thuoc, so_lan, self.anh_lam_nong if co_anh else None)
+            return mo_hinh
+        
+        bo_thuc_thi = ThreadPoolExecutor(2, thread_name_prefix="dms-khoi-tao")
+        tao_mat = bo_thuc_thi.submit(tao, "facemesh", lambda: PhanTichMat(
+            bo_uoc_luong_tu_the=BoUocLuongTuThe(self.phuong_phap_tu_the, noi_tai=noi_tai),
+            do_giai_doan=self.do_giai_doan, suy_luan=self.suy_luan,
+            tao_san_ca_hai=bool(self.ngan_sach_khung)))
+        tao_tay = bo_thuc_thi.submit(tao, "hands", lambda: TheoDoiTay(
+            cat_vung_mat=self.cat_vung_tay, chu_ky_khi_xa=self.chu_ky_tay, suy_luan=self.suy_luan))
+        bo_thuc_thi.shutdown(wait=False)
+        return tao_mat, tao_tay
+    
+    def _cho_mo_hinh(self) -> None:
+        """Chờ luồng tạo mô hình (lỗi tạo mô hình được ném lại ở đây)."""
+        if self._mo_hinh_dang_tao is None:
+            return
+        tao_mat, tao_tay = self._mo_hinh_dang_tao
+        self._mo_hinh_dang_tao = None
+        with self._khoi_dong.do("cho_mo_hinh"):
+            try:
+                self._phan_tich_mat = tao_mat.result()
+            finally:  # Mô hình kia tạo được vẫn phải gán để _dung giải phóng
+                self._theo_doi_tay = tao_tay.result()
     
     def chay(self) -> None:
-        logger.info("Đang chạy... Nhấn 'q' để thoát.")
-        with mo_camera(self.cau_hinh_camera) as may_quay:
-            while True:
-                thanh_cong, khung_hinh = may_quay.read()
-                if not thanh_cong:
-                    break
-                dau_ra = self._xu_ly(khung_hinh)
-                cv2.imshow(self.ten_cua_so, dau_ra)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+        logger.info("Đang chạy... Nhấn 'q' để thoát." if self.hien_thi else "Đang chạy (headless)...")
+        nguon = self.nguon or tao_nguon(self.cau_hinh_camera.id_camera, self.cau_hinh_camera)
+        nguon.be_bo_dem = self._be_bo_dem
+        self._nguon_truc_tiep = nguon.la_truc_tiep
+        bat_dau, so_khung = time.time(), 0
+        try:  # Tài nguyên mở dần từ đây; lỗi ở bất kỳ bước nào (camera, cổng đo lường...) vẫn dọn hết
+            with self._khoi_dong.do("dau_ra"):
+                self._mo_dau_ra()
+                if self.thu_muc_diem_moc:
+                    from dms.replay import BoGhiDiemMoc
+                    self._ghi_diem_moc = BoGhiDiemMoc(self.thu_muc_diem_moc,
+                                                      phan_tich=self._cau_hinh_phan_tich())
+                    self._ghi_diem_moc.mo()
+            moc_mo = time.perf_counter()
+            with nguon:
+                self._khoi_dong.ghi("mo_nguon", moc_mo, time.perf_counter())
+                if self.hien_thi:
+                    with self._khoi_dong.do("cua_so"):
+                        cv2.namedWindow(self.ten_cua_so)
+                self._cho_mo_hinh()
+                ham_doc = self._doc_theo_nhip(nguon)
+                if self.che_do_duong_ong:
+                    so_khung = self._chay_duong_ong(nguon, ham_doc)
+                else:
+                    so_khung = self._chay_tuan_tu(ham_doc)
+            thoi_gian = max(time.time() - bat_dau, 1e-6)
+            logger.info(f"Đã xử lý {so_khung} khung trong {thoi_gian:.1f}s ({so_khung/thoi_gian:.1f} khung/s)")
+            logger.info(f"Bộ đệm: cấp phát {self._be_bo_dem.so_cap_phat}, tái sử dụng {self._be_bo_dem.so_tai_su_dung}, "
+                        f"cấp phát ở khung cuối {self._be_bo_dem.cap_phat_khung_cuoi}")
+            if self._tre_thu.so_mau:
+                logger.info(f"Độ trễ thu hình → phân tích: trung bình {self._tre_thu.trung_binh*1000:.1f}ms, "
+                            f"tối đa {self._tre_thu.toi_da*1000:.1f}ms")
+            if self._do_luong is not None:
+                for giai_doan in ('tre_thu', 'clahe', 'mat', 'tu_the', 'tay', 've', 'tong'):
+                    bieu_do = self._do_luong.bieu_do(giai_doan)
+                    if bieu_do is not None:
+                        logger.info(f"  {giai_doan}: p50 ≤{bieu_do.phan_vi(0.5)*1000:.2f}ms, "
+                                    f"p99 ≤{bieu_do.phan_vi(0.99)*1000:.2f}ms")
+            if self.clahe_thich_ung:
+                logger.info(f"CLAHE bỏ qua {self._tien_xu_ly.so_khung_bo_qua}/{self._tien_xu_ly.so_khung} khung "
+                            f"({self._tien_xu_ly.ti_le_bo_qua:.0%})")
+        finally:
+            self._dung()
+    
+    def phat_lai(self, thu_muc: str) -> None:
+        """Chạy lại EAR/MAR/tư thế/bộ lọc/cảnh báo và mọi đầu ra từ landmark đã ghi, không suy luận."""
+        from dms.replay import BoDocDiemMoc, CoDiemMoc
+        bat_dau, so_khung = time.perf_counter(), 0
+        try:
+            self._cho_mo_hinh()
+            with BoDocDiemMoc(thu_muc) as bo_doc:
+                logger.info(f"Phát lại {len(bo_doc)} khung ({bo_doc.thoi_luong:.0f}s) từ {thu_muc}")
+                hien_tai = self._cau_hinh_phan_tich()
+                for khoa, luc_ghi in bo_doc.phan_tich.items():
+                    if khoa in hien_tai and hien_tai[khoa] != luc_ghi:
+                        logger.warning(f"Phát lại với {khoa}={hien_tai[khoa]}, lúc ghi là {luc_ghi}: "
+                                       f"kết quả sẽ khác lần chạy thật")
+                self._mo_dau_ra()
+                for khung in bo_doc:
+                    ts = khung.timestamp
+                    chay_mat = CoDiemMoc.CHAY_MAT in khung.co
+                    if chay_mat:
+                        self._ket_qua_mat = self._phan_tich_mat.phan_tich_diem_moc(
+                            khung.mat, khung.chieu_rong, khung.chieu_cao, ts)
+                    if CoDiemMoc.CHAY_TAY in khung.co:
+                        self._ket_qua_tay = self._theo_doi_tay.phan_tich_diem_moc(
+                            khung.tay, khung.chieu_rong, khung.chieu_cao, self._ket_qua_mat.khung_bbox_mat, ts)
+                    elif CoDiemMoc.DAT_LAI_TAY in khung.co:
+                        self._ket_qua_tay = KetQuaTheoDoiTay()
+                    self._sau_phan_tich(ts, chay_mat, self._ket_qua_mat, self._ket_qua_tay)
+                    so_khung += 1
+                thoi_luong = bo_doc.thoi_luong
+            thoi_gian = max(time.perf_counter() - bat_dau, 1e-6)
+            logger.info(f"Đã phát lại {so_khung} khung trong {thoi_gian:.2f}s ({so_khung/thoi_gian:.0f} khung/s, "
+                        f"{thoi_luong/thoi_gian:.0f}× thời gian thực)")
+        finally:
+            self._dung()
+    
+    def _cau_hinh_phan_tich(self) -> dict:
+        """Cấu hình ảnh hưởng kết quả phân tích, ghi vào meta.json của landmark để phát lại đúng."""
+        from dms.replay import KHOA_NOI_TAI, KHOA_TU_THE
+        return {KHOA_TU_THE: self.phuong_phap_tu_the.value,
+                KHOA_NOI_TAI: os.path.abspath(self.duong_dan_noi_tai) if self.duong_dan_noi_tai else None}
+    
+    def _mo_dau_ra(self) -> None:
+        """Ghi kết quả, âm thanh, điều phối cảnh báo, hộp đen, đo lường - dùng chung cho chạy và phát lại."""
+        from dms.audio import BoPhatAmThanh
+        if self.duong_dan_dau_ra:
+            from dms.output import BoGhiKetQua, DinhDangDauRa
+            self._bo_ghi = BoGhiKetQua(self.duong_dan_dau_ra, DinhDangDauRa(self.dinh_dang_dau_ra))
+            self._bo_ghi.mo()
+        self._am_thanh = BoPhatAmThanh(self.am_thanh_canh_bao, self.duong_dan_am_thanh,
+                                       self.hau_truong_am_thanh)
+        self._am_thanh.bat_dau()
+        self._bat_dau_dieu_phoi()
+        if self.duong_dan_hop_den:
+            from dms.black_box import BoGhiHopDen
+            self._hop_den = BoGhiHopDen(self.duong_dan_hop_den, self.thoi_luong_hop_den_gio,
+                                        fps_du_kien=self.cau_hinh_camera.fps)
+            self._hop_den.mo()
+        if self._do_luong is not None:
+            self._bat_dau_do_luong()
+    
+    def _bat_dau_dieu_phoi(self) -> None:
+        """Điều phối sự kiện cảnh báo khi có ít nhất một đích ngoài log."""
+        from dms.alerts import BoDieuPhoiCanhBao, DichAmThanh, DichTepJSONL, DichWebhook
+        cac_dich = []
+        if self.duong_dan_su_kien:
+            cac_dich.append(DichTepJSONL(self.duong_dan_su_kien))
+        if self.url_webhook:
+            cac_dich.append(DichWebhook(self.url_webhook))
+        # Buồn ngủ phát theo ngưỡng thời gian + cooldown trong _sau_phan_tich, không theo cạnh lên
+        loai_co_am = frozenset(self.am_thanh_canh_bao) - {AlertType.DROWSINESS}
+        if loai_co_am:
+            cac_dich.append(DichAmThanh(self._am_thanh, loai_co_am))
+        if cac_dich:
+            self._dieu_phoi = BoDieuPhoiCanhBao(cac_dich)
+            self._dieu_phoi.bat_dau()
+    
+    def _bat_dau_do_luong(self) -> None:
+        from dms.metrics import MayChuDoLuong
+        tien_xu_ly, be_bo_dem = self._tien_xu_ly, self._be_bo_dem
+        for loai in AlertType:
+            self._do_luong.tang('alerts_total', 0, type=loai.name)
+        self._do_luong.thu_thap('clahe_frames_total', 'counter', 'Số khung qua CLAHE', 'result',
+                                lambda: {'bypassed': tien_xu_ly.so_khung_bo_qua,
+                                         'applied': tien_xu_ly.so_khung - tien_xu_ly.so_khung_bo_qua})
+        if self._ngan_sach is not None:
+            ngan_sach = self._ngan_sach
+            self._do_luong.dat('degrade_level', 0)
+            self._do_luong.thu_thap('degrade_steps_total', 'counter', 'Số lần giảm / khôi phục tính năng',
+                                    'direction', lambda: {'down': ngan_sach.so_lan_giam,
+                                                          'up': ngan_sach.so_lan_tang})
+        self._do_luong.thu_thap('buffer_allocations_total', 'counter', 'Số lần cấp phát bộ đệm mới', 'pool',
+                                lambda: {'frame': be_bo_dem.so_cap_phat})
+        if self._am_thanh is not None:
+            am_thanh = self._am_thanh
+            self._do_luong.gan_bieu_do('am_thanh', am_thanh.do_tre)
+            self._do_luong.thu_thap('alert_sound_requests_total', 'counter', 'Yêu cầu phát âm cảnh báo',
+                                    'result', lambda: {'played': am_thanh.so_da_phat,
+                                                       'merged': am_thanh.so_gop})
+        if self._dieu_phoi is not None:
+            dieu_phoi = self._dieu_phoi
+            self._do_luong.thu_thap('alert_events_delivered_total', 'counter', 'Sự kiện cảnh báo đã gửi theo đích',
+                                    'sink', lambda: {ten: tk['gui'] for ten, tk in dieu_phoi.thong_ke().items()})
+            self._do_luong.thu_thap('alert_events_dropped_total', 'counter', 'Sự kiện cảnh báo bị bỏ do đích chậm',
+                                    'sink', lambda: {ten: tk['bo'] for ten, tk in dieu_phoi.thong_ke().items()})
+        self._may_chu_do_luong = MayChuDoLuong(self._do_luong, self.cong_do_luong)
+        self._may_chu_do_luong.bat_dau()
+    
+    def _doc_theo_nhip(self, nguon: NguonKhungHinh) -> Callable[[], KetQuaDoc]:
+        """Nguồn ghi sẵn + có hiển thị: phát theo PTS; headless: đọc nhanh nhất có thể."""
+        if nguon.la_truc_tiep or not self.hien_thi:
+            return nguon.doc
+        moc: list = []
+        
+        def doc() -> KetQuaDoc:
+            thanh_cong, khung_hinh, ts = nguon.doc()
+            if thanh_cong:
+                if not moc:
+                    moc[:] = [ts, time.time()]
+                cho = (ts - moc[0]) - (time.time() - moc[1])
+                if cho > 0:
+                    time.sleep(cho)
+            return thanh_cong, khung_hinh, ts
+        return doc
+    
+    def _hien_thi_khung(self, dau_ra: Optional[np.ndarray]) -> bool:
+        """Trả về False khi người dùng nhấn 'q'."""
+        if not self.hien_thi:
+            return True
+        if dau_ra is not None:
+            cv2.imshow(self.ten_cua_so, dau_ra)
+        return cv2.waitKey(1) & 0xFF != ord('q')
+    
+    def _chay_tuan_tu(self, ham_doc: Callable[[], KetQuaDoc]) -> int:
+        so_khung = 0
+        while True:
+            thanh_cong, khung_hinh, ts = ham_doc()
+            if not thanh_cong:
+                break
+            dau_ra = self._xu_ly_va_tra(khung_hinh, ts)
+            so_khung += 1
+            tiep_tuc = self._hien_thi_khung(dau_ra)
+            self._tra_sau_hien_thi(dau_ra)
+            if not tiep_tuc:
+                break
+        return so_khung
+    
+    def _chay_duong_ong(self, nguon: NguonKhungHinh, ham_doc: Callable[[], KetQuaDoc]) -> int:
+        """Thu hình và phân tích chạy nền, main thread chỉ hiển thị."""
+        duong_ong = DuongOngDMS(
+            ham_doc=ham_doc,
+            ham_xu_ly=lambda khung: self._xu_ly_va_tra(khung.anh, khung.thoi_diem),
+            khong_bo_khung=not nguon.la_truc_tiep,
+            ham_tra_anh=self._be_bo_dem.tra)
+        if self._do_luong is not None:
+            self._do_luong.thu_thap('dropped_frames_total', 'counter', 'Số khung bị bỏ theo hàng đợi',
+                                    'queue', duong_ong.so_khung_bo)
+        duong_ong.bat_dau()
+        lan_log_cuoi, so_khung = time.time(), 0
+        try:
+            while not duong_ong.da_ket_thuc:
+                khung = duong_ong.lay_khung_hien_thi()
+                if khung is not None:
+                    so_khung += 1
+                tiep_tuc = self._hien_thi_khung(khung.anh if khung is not None else None)
+                if khung is not None:
+                    self._tra_sau_hien_thi(khung.anh)
+                if not tiep_tuc:
                     break
-        self._dung()
+                if time.time() - lan_log_cuoi >= self.chu_ky_log_hang_doi:
+                    lan_log_cuoi = time.time()
+                    self._log_hang_doi(duong_ong, khung if nguon.la_truc_tiep else None)
+        finally:
+            duong_ong.dung()
+        if duong_ong.loi is not None:
+            raise duong_ong.loi
+        return so_khung
+    
+    @staticmethod
+    def _log_hang_doi(duong_ong: DuongOngDMS, khung: Optional[KhungHinh]) -> None:
+        """khung chỉ truyền với nguồn trực tiếp, khi thời điểm thu là đồng hồ thật."""
+        do_tre = f", trễ {(time.time() - khung.thoi_diem)*1000:.0f}ms" if khung else ""
+        logger.info(f"Hàng đợi: {duong_ong.do_sau_hang_doi()}, "
+                    f"bỏ: {duong_ong.so_khung_bo()}{do_tre}")
     
-    def _xu_ly(self, khung_hinh: np.ndarray) -> np.ndarray:
-        ts = time.time()
-        anh_tang_cuong = self._tien_xu_ly.tang_cuong(khung_hinh)
-        ket_qua_mat = self._phan_tich_mat.analyze(anh_tang_cuong, ts)
-        ket_qua_tay = self._theo_doi_tay.analyze(anh_tang_cuong, ket_qua_mat.get('khung_bbox_mat'))
+    def _xu_ly_va_tra(self, khung_hinh: np.ndarray, timestamp: Optional[float]) -> Optional[np.ndarray]:
+        """_xu_ly rồi trả khung thu hình về pool (ảnh lớp phủ là bộ đệm riêng)."""
+        if self._nguon_truc_tiep:
+            # Camera: timestamp bộ đệm driver (nếu backend có) → gồm thời gian trong bộ đệm driver và
+            # hàng đợi; không có thì là lúc read() trả về → chỉ gồm hàng đợi (NguonCamera log nguồn thời điểm)
+            tre = time.time() - timestamp
+            self._tre_thu.quan_sat(tre)
+            if self.do_giai_doan is not None:
+                self.do_giai_doan('tre_thu', tre)
+        bat_dau = time.perf_counter()
+        dau_ra = self._xu_ly(khung_hinh, timestamp)
+        if self._can_luu_anh_lam_nong and self._ket_qua_mat.mat_phat_hien:
+            self._can_luu_anh_lam_nong = False
+            luu_anh_lam_nong(self.anh_lam_nong, khung_hinh)
+        self._be_bo_dem.tra(khung_hinh)
+        if not self._da_bao_cao_khoi_dong:
+            self._da_bao_cao_khoi_dong = True
+            self._khoi_dong.ghi("khung_dau", bat_dau, time.perf_counter())
+            self._khoi_dong.bao_cao()
+        if self._ngan_sach is not None:
+            muc = self._ngan_sach.quan_sat(time.perf_counter() - bat_dau)
+            if muc is not None:
+                self._ap_dung_muc_giam(muc)
+        return dau_ra
+    
+    def _ap_dung_muc_giam(self, muc: MucGiam) -> None:
+        """Tay, lớp phủ, CLAHE đọc thẳng từ bộ điều khiển mỗi khung; chỉ FaceMesh cần đổi mô hình."""
+        self._phan_tich_mat.dat_tinh_chinh(self._ngan_sach.tinh_chinh)
+        if self._do_luong is not None:
+            self._do_luong.dat('degrade_level', int(muc))
+    
+    def _tra_sau_hien_thi(self, dau_ra: Optional[np.ndarray]) -> None:
+        """imshow đã copy ảnh → trả bộ đệm lớp phủ và chốt số cấp phát của khung."""
+        self._be_bo_dem.tra(dau_ra)
+        self._be_bo_dem.danh_dau_khung()
+    
+    def _xu_ly(self, khung_hinh: np.ndarray, timestamp: Optional[float] = None) -> Optional[np.ndarray]:
+        """Trả về ảnh đã vẽ lớp phủ, hoặc None nếu bộ lập lịch bỏ lượt vẽ khung này."""
+        ts = timestamp if timestamp is not None else time.time()
+        bat_dau = moc = time.perf_counter()
+        ke_hoach = self._bo_lap_lich.lap_ke_hoach() if self._bo_lap_lich else None
+        chay_mat = ke_hoach is None or ke_hoach.chay_mat
+        chay_tay = ke_hoach is None or ke_hoach.chay_tay
+        tat_tay = self._ngan_sach is not None and not self._ngan_sach.chay_tay
+        chay_tay = chay_tay and not tat_tay
+        dat_lai_tay = tat_tay or (not chay_tay and ke_hoach.che_do is CheDoLapLich.KHONG_TAI_XE)
+        if self._mo_hinh_dang_tao is not None:
+            self._cho_mo_hinh()  # Gọi _xu_ly trực tiếp (benchmark) không qua chay()
+            bat_dau = moc = time.perf_counter()
+        if self._can_chon_kich_thuoc:
+            with self._khoi_dong.do("chon_kich_thuoc"):
+                self._chon_kich_thuoc_suy_luan(khung_hinh)
+            bat_dau = moc = time.perf_counter()
+        
+        # Thu nhỏ một lần; cùng kích thước thì hiển thị luôn ảnh đã CLAHE như trước
+        anh_hien_thi = anh_suy_luan = anh_nho = khung_hinh
+        if chay_mat or chay_tay:
+            if self.kich_thuoc_suy_luan is not None:
+                from dms.resolution import thu_nho
+                anh_nho = thu_nho(khung_hinh, self.kich_thuoc_suy_luan, self._be_bo_dem)
+            if self._ngan_sach is None or self._ngan_sach.chay_clahe:
+                anh_suy_luan = self._tien_xu_ly.tang_cuong(anh_nho)
+            else:
+                anh_suy_luan = anh_nho
+            if anh_nho is khung_hinh:
+                anh_hien_thi = anh_suy_luan
+            moc = self._bam_gio('clahe', moc)
+        ngu_canh = NguCanhKhungHinh(anh_hien_thi, ts, self._be_bo_dem, anh_suy_luan)
+        if chay_mat:
+            self._ket_qua_mat = self._phan_tich_mat.analyze(ngu_canh)
+            moc = self._bam_gio('mat', moc)
+        ket_qua_mat = self._ket_qua_mat
+        if chay_tay:
+            self._ket_qua_tay = self._theo_doi_tay.analyze(ngu_canh, ket_qua_mat.khung_bbox_mat)
+            moc = self._bam_gio('tay', moc)
+        elif dat_lai_tay:
+            self._ket_qua_tay = KetQuaTheoDoiTay()
+        ket_qua_tay = self._ket_qua_tay
+        if self._ghi_diem_moc is not None:
+            from dms.replay import CoDiemMoc
+            co = (CoDiemMoc.CHAY_MAT if chay_mat else 0) | (CoDiemMoc.CHAY_TAY if chay_tay else 0)
+            if dat_lai_tay:
+                co |= CoDiemMoc.DAT_LAI_TAY
+            self._ghi_diem_moc.ghi(ts, ngu_canh.chieu_rong, ngu_canh.chieu_cao, CoDiemMoc(co),
+                                   ket_qua_mat if chay_mat else None, ket_qua_tay if chay_tay else None)
+        ngu_canh.giai_phong()
+        if anh_nho is not khung_hinh:
+            self._be_bo_dem.tra(anh_nho)
+        fps = self._sau_phan_tich(ts, chay_mat, ket_qua_mat, ket_qua_tay)
+        
+        moc = self._bam_gio('canh_bao', moc)
+        if (ke_hoach is not None and not ke_hoach.chay_ve) or not self._den_luot_ve(ts):
+            self._bam_gio('tong', bat_dau)
+            return None
+        dau_ra = self._be_bo_dem.lay_nhu(anh_hien_thi)
+        np.copyto(dau_ra, anh_hien_thi)
+        if not self.ve_lop_phu:
+            self._bam_gio('tong', bat_dau)
+            return dau_ra
+        chi_tiet = self._ngan_sach is None or self._ngan_sach.ve_chi_tiet
+        dau_ra = self._ve_lop_phu(dau_ra, ket_qua_mat, ket_qua_tay, fps, chi_tiet)
+        trang_thai = []
+        if self._bo_lap_lich:
+            trang_thai.append(f"{self._bo_lap_lich.che_do.name}: {self._bo_lap_lich.mo_ta_nhip(fps=fps)}")
+        if self.clahe_thich_ung:
+            trang_thai.append(f"CLAHE {'tat' if self._tien_xu_ly.bo_qua_khung_cuoi else 'bat'} "
+                              f"(bo qua {self._tien_xu_ly.ti_le_bo_qua:.0%})")
+        if self._ngan_sach is not None and self._ngan_sach.muc is not MucGiam.DAY_DU:
+            trang_thai.append(f"Giam tai: {self._ngan_sach.muc.name} "
+                              f"({self._ngan_sach.do_tre_trung_binh*1000:.0f}ms)")
+        if trang_thai:
+            dau_ra = self._trao_dua_tinh_nang.ve_trang_thai(dau_ra, " | ".join(trang_thai))
+        self._bam_gio('ve', moc)
+        self._bam_gio('tong', bat_dau)
+        return dau_ra
+    
+    def _chon_kich_thuoc_suy_luan(self, khung_hinh: np.ndarray) -> None:
+        """Đo CLAHE + FaceMesh + Hands trên khung đầu ở các kích thước giảm dần (resolution.py)."""
+        from dms.resolution import cac_ung_vien, chon_kich_thuoc, thu_nho
+        self._can_chon_kich_thuoc = False
+        chieu_cao, chieu_rong = khung_hinh.shape[:2]
+        muc_tieu = self.thoi_gian_muc_tieu or 1.0 / max(self.cau_hinh_camera.fps, 1.0)
+        tien_xu_ly = TienXuLyCLAHE(thich_ung=self.clahe_thich_ung)  # Riêng: không làm lệch thống kê CLAHE
+        
+        def do(kich_thuoc: Tuple[int, int]) -> float:
+            bat_dau = time.perf_counter()
+            anh_nho = thu_nho(khung_hinh, kich_thuoc, self._be_bo_dem)
+            ngu_canh = NguCanhKhungHinh(khung_hinh, None, self._be_bo_dem, tien_xu_ly.tang_cuong(anh_nho))
+            self._phan_tich_mat.chay_mo_hinh(ngu_canh.anh_rgb)
+            self._theo_doi_tay.chay_mo_hinh(ngu_canh.anh_rgb)
+            ngu_canh.giai_phong()
+            if anh_nho is not khung_hinh:
+                self._be_bo_dem.tra(anh_nho)
+            return time.perf_counter() - bat_dau
+        
+        self.kich_thuoc_suy_luan, da_do = chon_kich_thuoc(do, cac_ung_vien(chieu_rong, chieu_cao), muc_tieu)
+        chi_tiet = ", ".join(f"{r}x{c}: {giay*1000:.1f}ms" for (r, c), giay in da_do.items())
+        logger.info(f"Độ phân giải suy luận: {self.kich_thuoc_suy_luan[0]}x{self.kich_thuoc_suy_luan[1]} "
+                    f"(mục tiêu {muc_tieu*1000:.1f}ms; {chi_tiet})")
+    
+    def _sau_phan_tich(self, ts: float, chay_mat: bool, ket_qua_mat: KetQuaPhanTichMat,
+                       ket_qua_tay: KetQuaTheoDoiTay) -> float:
+        """Mọi thứ sau suy luận (lập lịch, buồn ngủ, đầu ra, cảnh báo); trả về FPS."""
+        if chay_mat and self._bo_lap_lich:
+            self._bo_lap_lich.cap_nhat(ts, ket_qua_mat, ket_qua_tay)
         fps = self._fps.cap_nhat()
         
         # ========== TRACKING BUỒN NGỦ ==========
-        if ket_qua_mat['canh_bao_buon_ngu']:
+        if ket_qua_mat.canh_bao_buon_ngu:
             if self._thoi_gian_buon_ngu_bat_dau is None:
                 self._thoi_gian_buon_ngu_bat_dau = ts
             else:
@@ -131,53 +590,317 @@ class HeThongGiamSatTaiXe:
                 # Phát âm thanh nếu buồn ngủ >5s và cooldown đã hết
                 if thoi_gian_buon_ngu >= THOI_GIAN_CANH_BAO_AM_THANH and \
                    (ts - self._thoi_gian_am_thanh_cuoi) >= KHOANG_CACH_AM_THANH:
-                    luong = threading.Thread(
-                        target=phat_am_thanh_async, 
-                        args=(self.duong_dan_am_thanh,),
-                        daemon=True
-                    )
-                    luong.start()
+                    if self._am_thanh is not None:
+                        self._am_thanh.phat(AlertType.DROWSINESS)
                     self._thoi_gian_am_thanh_cuoi = ts
                     logger.warning(f"⚠️ CẢNH BÁO BUỒN NGỦ! Thời gian: {thoi_gian_buon_ngu:.1f}s")
         else:
             self._thoi_gian_buon_ngu_bat_dau = None
         
-        dau_ra = anh_tang_cuong.copy()
-        if ket_qua_mat['mat_phat_hien']:
-            dau_ra = self._trao_dua_tinh_nang.ve_luoi_mat(dau_ra, ket_qua_mat['diem_moc'])
-            if ket_qua_mat['vec_quay'] is not None:
-                diem_moc = ket_qua_mat['diem_moc']
+        if self.bao_cao_trang_thai is not None:
+            self._bao_cao(fps, ket_qua_mat, ket_qua_tay)
+        if self._bo_ghi is not None:
+            self._bo_ghi.ghi(ts, ket_qua_mat, ket_qua_tay)
+        if self._hop_den is not None:
+            self._hop_den.ghi(ts, ket_qua_mat, ket_qua_tay)
+        if self._dieu_phoi is not None:
+            self._dieu_phoi.cap_nhat(ts, self._canh_bao_dang_bat(ket_qua_mat, ket_qua_tay))
+        if self._do_luong is not None:
+            self._cap_nhat_do_luong(fps, ket_qua_mat, ket_qua_tay)
+        return fps
+    
+    def _bam_gio(self, giai_doan: str, moc: float) -> float:
+        """Báo thời gian từ moc đến giờ cho do_giai_doan (nếu có); trả về mốc mới."""
+        bay_gio = time.perf_counter()
+        if self.do_giai_doan is not None:
+            self.do_giai_doan(giai_doan, bay_gio - moc)
+        return bay_gio
+    
+    def _den_luot_ve(self, ts: float) -> bool:
+        """Headless thì không vẽ; có fps_ve_toi_da thì bỏ lượt vẽ quá dày."""
+        if not self.hien_thi:
+            return False
+        if self.fps_ve_toi_da > 0:
+            if self._lan_ve_cuoi is not None and ts - self._lan_ve_cuoi < 1.0 / self.fps_ve_toi_da:
+                return False
+            self._lan_ve_cuoi = ts
+        return True
+    
+    def _ve_lop_phu(self, dau_ra: np.ndarray, ket_qua_mat: KetQuaPhanTichMat,
+                    ket_qua_tay: KetQuaTheoDoiTay, fps: float, chi_tiet: bool = True) -> np.ndarray:
+        """chi_tiet=False: bỏ lưới mặt, trục tư thế, điểm tay; vẫn vẽ số liệu và cảnh báo."""
+        if chi_tiet and ket_qua_mat.mat_phat_hien:
+            dau_ra = self._trao_dua_tinh_nang.ve_luoi_mat(dau_ra, np.concatenate(
+                (ket_qua_mat.diem_moc_mat.reshape(-1, 2), ket_qua_mat.diem_moc_mieng)))
+            if ket_qua_mat.vec_quay is not None:
+                dau_mui = ket_qua_mat.diem_moc[1]
                 chieu_cao, chieu_rong = dau_ra.shape[:2]
+                ma_tran_camera, he_so_meo = \
+                    self._phan_tich_mat.bo_uoc_luong_tu_the.noi_tai_theo(chieu_rong, chieu_cao)
                 dau_ra = self._trao_dua_tinh_nang.ve_truc_tu_the_dau(
-                    dau_ra, ket_qua_mat['vec_quay'], ket_qua_mat['vec_tuan'],
-                    (diem_moc[1].x*chieu_rong, diem_moc[1].y*chieu_cao))
+                    dau_ra, ket_qua_mat.vec_quay, ket_qua_mat.vec_tuan,
+                    (dau_mui[0]*chieu_rong, dau_mui[1]*chieu_cao),
+                    ma_tran_camera, he_so_meo)
         
-        dau_ra = self._trao_dua_tinh_nang.ve_diem_moc_tay(dau_ra, ket_qua_tay['hand_landmarks'])
-        dau_ra = self._trao_dua_tinh_nang.ve_so_lieu(dau_ra, ket_qua_mat['ear'], ket_qua_mat['mar'],
-                                     ket_qua_mat['pitch'], ket_qua_mat['yaw'], 
-                                     ket_qua_mat['roll'], fps)
-        dau_ra = self._trao_dua_tinh_nang.ve_canh_bao(dau_ra, ket_qua_mat['canh_bao_buon_ngu'],
-                                    ket_qua_mat['canh_bao_ngap'], ket_qua_mat['canh_bao_tu_the'],
-                                    ket_qua_tay['distraction_alert'])
+        if chi_tiet:
+            dau_ra = self._trao_dua_tinh_nang.ve_diem_moc_tay(dau_ra, ket_qua_tay.diem_moc_tay)
+        dau_ra = self._trao_dua_tinh_nang.ve_so_lieu(dau_ra, ket_qua_mat.ear, ket_qua_mat.mar,
+                                     ket_qua_mat.pitch, ket_qua_mat.yaw,
+                                     ket_qua_mat.roll, fps)
+        dau_ra = self._trao_dua_tinh_nang.ve_canh_bao(dau_ra, ket_qua_mat.canh_bao_buon_ngu,
+                                    ket_qua_mat.canh_bao_ngap, ket_qua_mat.canh_bao_tu_the,
+                                    ket_qua_tay.canh_bao_mat_tap_trung)
         return dau_ra
     
+    @staticmethod
+    def _canh_bao_dang_bat(ket_qua_mat: KetQuaPhanTichMat,
+                           ket_qua_tay: KetQuaTheoDoiTay) -> List[AlertType]:
+        co_canh_bao = {
+            AlertType.DROWSINESS: ket_qua_mat.canh_bao_buon_ngu,
+            AlertType.YAWN: ket_qua_mat.canh_bao_ngap,
+            AlertType.HEAD_POSE: ket_qua_mat.canh_bao_tu_the,
+            AlertType.DISTRACTION: ket_qua_tay.canh_bao_mat_tap_trung,
+        }
+        return [loai for loai, bat in co_canh_bao.items() if bat]
+    
+    def _cap_nhat_do_luong(self, fps: float, ket_qua_mat: KetQuaPhanTichMat,
+                           ket_qua_tay: KetQuaTheoDoiTay) -> None:
+        """Đếm khung, FPS và số lần cảnh báo bắt đầu (cạnh lên) theo loại."""
+        self._do_luong.tang('frames_total')
+        self._do_luong.dat('fps', fps)
+        dang_bat = frozenset(self._canh_bao_dang_bat(ket_qua_mat, ket_qua_tay))
+        for loai in dang_bat - self._canh_bao_truoc:
+            self._do_luong.tang('alerts_total', type=loai.name)
+        self._canh_bao_truoc = dang_bat
+    
+    def _bao_cao(self, fps: float, ket_qua_mat: KetQuaPhanTichMat, ket_qua_tay: KetQuaTheoDoiTay) -> None:
+        bay_gio = time.time()
+        if bay_gio - self._lan_bao_cao_cuoi < self.chu_ky_bao_cao:
+            return
+        self._lan_bao_cao_cuoi = bay_gio
+        self.bao_cao_trang_thai({
+            'fps': fps,
+            'canh_bao': [loai.name for loai in self._canh_bao_dang_bat(ket_qua_mat, ket_qua_tay)],
+            'clahe_bo_qua': self._tien_xu_ly.bo_qua_khung_cuoi,
+            'cap_phat_khung': self._be_bo_dem.cap_phat_khung_cuoi,
+            'tre_thu_ms': self._tre_thu.trung_binh * 1000,
+        })
+    
     def _dung(self) -> None:
-        self._phan_tich_mat.release()
-        self._theo_doi_tay.release()
-        cv2.destroyAllWindows()
+        if self._may_chu_do_luong is not None:
+            self._may_chu_do_luong.dung()
+            self._may_chu_do_luong = None
+        if self._bo_ghi is not None:
+            self._bo_ghi.dong()
+            logger.info(f"Đã ghi {self._bo_ghi.so_da_ghi} bản ghi kết quả")
+            self._bo_ghi = None
+        if self._dieu_phoi is not None:
+            self._dieu_phoi.dong()
+            self._dieu_phoi = None
+        if self._am_thanh is not None:
+            self._am_thanh.dong()
+            self._am_thanh = None
+        if self._hop_den is not None:
+            self._hop_den.dong()
+            logger.info(f"Hộp đen: tổng {self._hop_den.so_da_ghi} bản ghi trong {self.duong_dan_hop_den}")
+            self._hop_den = None
+        if self._ghi_diem_moc is not None:
+            self._ghi_diem_moc.dong()
+            self._ghi_diem_moc = None
+        try:
+            self._cho_mo_hinh()  # Chưa chạy khung nào: vẫn phải chờ luồng tạo để giải phóng
+        except Exception as e:
+            logger.error(f"Tạo mô hình lỗi: {e}")
+        for mo_hinh in (getattr(self, '_phan_tich_mat', None), getattr(self, '_theo_doi_tay', None)):
+            if mo_hinh is not None:
+                mo_hinh.release()
+        if self.hien_thi:
+            cv2.destroyAllWindows()
         logger.info("Đã tắt DMS.")
 
 
+def chay_worker_camera(nguon: str, bao_cao: Callable[[dict], None],
+                       chieu_rong: int = 640, chieu_cao: int = 480,
+                       nguon_am_thanh: Optional[str] = None, hau_truong_am_thanh: str = "auto",
+                       am_thanh_canh_bao: Optional[Dict[AlertType, str]] = None) -> None:
+    """
+    Worker của GiamSatDaCamera: một DMS headless cho một nguồn.
+    Chỉ worker của nguon_am_thanh mở thiết bị âm thanh; các worker khác dùng hậu
+    trường null (vẫn đếm yêu cầu) để không tranh nhau một thiết bị ra.
+    """
+    cau_hinh = CauHinhCamera(chieu_rong=chieu_rong, chieu_cao=chieu_cao)
+    HeThongGiamSatTaiXe(cau_hinh, nguon=tao_nguon(nguon, cau_hinh), hien_thi=False,
+                        am_thanh_canh_bao=am_thanh_canh_bao or {},
+                        hau_truong_am_thanh=hau_truong_am_thanh if nguon == nguon_am_thanh else "null",
+                        bao_cao_trang_thai=bao_cao).chay()
+
+
+def _cau_hinh_tu_the(args: argparse.Namespace) -> Tuple[PhuongPhapPnP, Optional[str]]:
+    """
+    Solver tư thế và intrinsics. Khi phát lại, cờ không truyền lấy theo meta.json
+    lúc ghi (kết quả giống hệt lần chạy thật); cờ truyền khác thì phat_lai cảnh báo.
+    """
+    phuong_phap, noi_tai = args.pose_solver, args.intrinsics
+    if args.replay is not None:
+        from dms.replay import KHOA_NOI_TAI, KHOA_TU_THE, doc_meta
+        luc_ghi = doc_meta(args.replay).get('phan_tich', {})
+        if phuong_phap is None and luc_ghi.get(KHOA_TU_THE):
+            phuong_phap = luc_ghi[KHOA_TU_THE]
+            logger.info(f"Phát lại: --pose-solver {phuong_phap} như lúc ghi")
+        if noi_tai is None and luc_ghi.get(KHOA_NOI_TAI):
+            if os.path.isfile(luc_ghi[KHOA_NOI_TAI]):
+                noi_tai = luc_ghi[KHOA_NOI_TAI]
+                logger.info(f"Phát lại: --intrinsics {noi_tai} như lúc ghi")
+            else:
+                logger.warning(f"Phát lại: không thấy intrinsics lúc ghi {luc_ghi[KHOA_NOI_TAI]}, "
+                               f"dùng ma trận ước lượng - tư thế đầu sẽ khác lần chạy thật")
+    return PhuongPhapPnP(phuong_phap or PhuongPhapPnP.ITERATIVE.value), noi_tai
+
+
+def _kieu_am_thanh(chuoi: str) -> Tuple[AlertType, str]:
+    """type= của --alert-sound: sai cú pháp / sai loại thì argparse báo lỗi cách dùng."""
+    from dms.audio import phan_tich_am_thanh
+    try:
+        return phan_tich_am_thanh(chuoi)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
 def main() -> int:
+    from dms.audio import HAU_TRUONG_TU_DONG
+    from dms.output import DinhDangDauRa
+    from dms.resolution import TU_DONG, phan_tich_kich_thuoc
     parser = argparse.ArgumentParser(description="Driver Monitoring System")
     parser.add_argument("--camera", "-c", type=int, default=0)
+    parser.add_argument("--source", "-s", default=None,
+                        help="File video hoặc thư mục ảnh thay cho camera")
+    parser.add_argument("--no-display", action="store_true",
+                        help="Không mở cửa sổ, xử lý nhanh nhất có thể")
+    parser.add_argument("--cameras", nargs="+", default=None, metavar="NGUON",
+                        help="Nhiều nguồn, mỗi nguồn một tiến trình worker (headless)")
     parser.add_argument("--width", "-W", type=int, default=640)
     parser.add_argument("--height", "-H", type=int, default=480)
+    parser.add_argument("--camera-fourcc", default=None, metavar="FOURCC",
+                        help="Định dạng camera, VD MJPG (YUYV không nén thường giới hạn FPS)")
+    parser.add_argument("--camera-buffer", type=int, default=None, metavar="N",
+                        help="CAP_PROP_BUFFERSIZE; 1 = driver giữ ít khung cũ nhất")
+    parser.add_argument("--camera-backend", choices=list(CAC_BACKEND), default="auto")
+    parser.add_argument("--camera-exposure", type=float, default=None, metavar="GIA_TRI",
+                        help="Phơi sáng thủ công (đơn vị theo backend); mặc định tự động")
+    parser.add_argument("--latest-frame", action="store_true",
+                        help="Luồng grab riêng, phân tích luôn lấy khung mới nhất (bỏ khung cũ)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Thu hình, phân tích và hiển thị trên các luồng riêng")
+    parser.add_argument("--hand-roi", action="store_true",
+                        help="Chỉ chạy hand tracking trong vùng quanh mặt")
+    parser.add_argument("--hand-every", type=int, default=1, metavar="N",
+                        help="Hand tracking mỗi N khung khi chưa có tay gần mặt")
+    parser.add_argument("--output", "-o", default=None, metavar="FILE",
+                        help="Ghi kết quả từng khung ra file ('-' = stdout)")
+    parser.add_argument("--output-format", choices=[d.value for d in DinhDangDauRa],
+                        default=DinhDangDauRa.JSONL.value,
+                        help="jsonl hoặc binary (bản ghi 40 byte, xem dms/output.py)")
+    parser.add_argument("--black-box", default=None, metavar="FILE",
+                        help="Hộp đen: ring buffer memmap số liệu từng khung (đọc bằng dms.BoDocHopDen)")
+    parser.add_argument("--black-box-hours", type=float, default=4.0, metavar="H",
+                        help="Số giờ gần nhất giữ trong hộp đen")
+    parser.add_argument("--record-landmarks", default=None, metavar="DIR",
+                        help="Ghi landmark thô từng khung để phát lại bằng --replay")
+    parser.add_argument("--replay", default=None, metavar="DIR",
+                        help="Phát lại landmark đã ghi qua toàn bộ phân tích/cảnh báo/đầu ra, không suy luận")
+    parser.add_argument("--alert-sound", action="append", default=[], metavar="LOAI=FILE",
+                        type=_kieu_am_thanh,
+                        help="Âm riêng cho một loại cảnh báo (VD: YAWN=ngap.wav); lặp lại được")
+    parser.add_argument("--audio-backend", default=HAU_TRUONG_TU_DONG,
+                        choices=[HAU_TRUONG_TU_DONG, "sounddevice", "playsound", "null"],
+                        help="Hậu trường âm thanh; null = không phát (headless, kiểm thử). "
+                             "Với --cameras chỉ worker của nguồn đầu tiên phát")
+    parser.add_argument("--alert-log", default=None, metavar="FILE",
+                        help="Ghi sự kiện bắt đầu/kết thúc cảnh báo (JSONL)")
+    parser.add_argument("--alert-webhook", default=None, metavar="URL",
+                        help="POST JSON mỗi sự kiện cảnh báo (VD: http://127.0.0.1:8765/alerts)")
+    parser.add_argument("--metrics-port", type=int, default=None, metavar="PORT",
+                        help="Phục vụ /metrics (Prometheus) trên 127.0.0.1:PORT; bỏ trống = tắt")
+    parser.add_argument("--render-fps", type=float, default=0.0, metavar="N",
+                        help="Vẽ lớp phủ tối đa N lần/giây, phân tích vẫn chạy mọi khung (0 = không giới hạn)")
+    parser.add_argument("--no-overlay", action="store_true",
+                        help="Hiển thị ảnh gốc, không vẽ lớp phủ")
+    parser.add_argument("--adaptive-clahe", action="store_true",
+                        help="Bỏ qua CLAHE khi đủ sáng/đủ tương phản (có hysteresis)")
+    parser.add_argument("--pose-solver", choices=[p.value for p in PhuongPhapPnP],
+                        default=None,
+                        help="Solver tư thế đầu (fit3d = khớp landmark 3D, không PnP); "
+                             f"mặc định {PhuongPhapPnP.ITERATIVE.value}, hoặc như lúc ghi khi --replay")
+    parser.add_argument("--intrinsics", default=None, metavar="FILE",
+                        help="Intrinsics đã hiệu chuẩn (.npz/.json: camera_matrix, dist_coeffs, image_size); "
+                             "--replay mặc định dùng file lúc ghi")
+    parser.add_argument("--infer-size", default=None, metavar="WxH|auto",
+                        help="Độ phân giải cho CLAHE + FaceMesh/Hands; hiển thị giữ độ phân giải thu. "
+                             "auto = lớn nhất đạt --infer-budget-ms, đo lúc khởi động")
+    parser.add_argument("--infer-budget-ms", type=float, default=None, metavar="MS",
+                        help="Thời gian mục tiêu cho --infer-size auto (mặc định 1000/fps camera)")
+    parser.add_argument("--latency-budget-ms", type=float, default=None, metavar="MS",
+                        help="Ngân sách xử lý mỗi khung; vượt thì tắt dần chi tiết lớp phủ, tay, "
+                             "refine_landmarks, CLAHE và bật lại khi hết tải")
+    parser.add_argument("--warmup-frames", type=int, default=2, metavar="N",
+                        help="Lượt làm nóng mỗi mô hình trước khung đầu (0 = tắt)")
+    parser.add_argument("--warmup-image", default=None, metavar="FILE",
+                        help="Ảnh có mặt để làm nóng cả graph landmark; chưa có file thì lưu khung "
+                             "có mặt đầu tiên vào đây cho lần khởi động sau (ảnh tài xế nằm trên đĩa)")
+    parser.add_argument("--scheduler", action="store_true",
+                        help="Giảm nhịp suy luận khi không có tài xế / tài xế ổn định")
     args = parser.parse_args()
     
+    am_thanh_canh_bao = dict(args.alert_sound)
     try:
-        cau_hinh = CauHinhCamera(args.camera, args.width, args.height)
-        HeThongGiamSatTaiXe(cau_hinh).chay()
+        if args.cameras:
+            from dms.supervisor import GiamSatDaCamera
+            GiamSatDaCamera(args.cameras, partial(chay_worker_camera, chieu_rong=args.width,
+                                                  chieu_cao=args.height, nguon_am_thanh=args.cameras[0],
+                                                  hau_truong_am_thanh=args.audio_backend,
+                                                  am_thanh_canh_bao=am_thanh_canh_bao)).chay()
+            return 0
+        cau_hinh = CauHinhCamera(args.camera, args.width, args.height, fourcc=args.camera_fourcc,
+                                 so_bo_dem=args.camera_buffer, backend=args.camera_backend,
+                                 phoi_sang=args.camera_exposure, doc_moi_nhat=args.latest_frame)
+        phat_lai = args.replay is not None
+        tu_chon_kich_thuoc = args.infer_size == TU_DONG
+        kich_thuoc_suy_luan = phan_tich_kich_thuoc(args.infer_size) \
+            if args.infer_size and not tu_chon_kich_thuoc else None
+        nguon = tao_nguon(args.source, cau_hinh) if args.source is not None and not phat_lai else None
+        phuong_phap_tu_the, duong_dan_noi_tai = _cau_hinh_tu_the(args)
+        he_thong = HeThongGiamSatTaiXe(cau_hinh, nguon=nguon, hien_thi=not args.no_display and not phat_lai,
+                                       che_do_duong_ong=args.pipeline, cat_vung_tay=args.hand_roi,
+                                       chu_ky_tay=args.hand_every,
+                                       lap_lich_thich_ung=args.scheduler,
+                                       clahe_thich_ung=args.adaptive_clahe,
+                                       kich_thuoc_suy_luan=kich_thuoc_suy_luan,
+                                       tu_chon_kich_thuoc=tu_chon_kich_thuoc,
+                                       thoi_gian_muc_tieu=args.infer_budget_ms / 1000
+                                       if args.infer_budget_ms else None,
+                                       ngan_sach_khung=args.latency_budget_ms / 1000
+                                       if args.latency_budget_ms else None,
+                                       ve_lop_phu=not args.no_overlay,
+                                       duong_dan_dau_ra=args.output,
+                                       am_thanh_canh_bao=am_thanh_canh_bao,
+                                       hau_truong_am_thanh="null" if phat_lai else args.audio_backend,
+                                       duong_dan_su_kien=args.alert_log,
+                                       url_webhook=args.alert_webhook,
+                                       duong_dan_hop_den=args.black_box,
+                                       thoi_luong_hop_den_gio=args.black_box_hours,
+                                       thu_muc_diem_moc=args.record_landmarks,
+                                       suy_luan=not phat_lai,
+                                       cong_do_luong=args.metrics_port,
+                                       dinh_dang_dau_ra=DinhDangDauRa(args.output_format),
+                                       fps_ve_toi_da=args.render_fps,
+                                       phuong_phap_tu_the=phuong_phap_tu_the,
+                                       duong_dan_noi_tai=duong_dan_noi_tai,
+                                       so_lan_lam_nong=args.warmup_frames,
+                                       anh_lam_nong=args.warmup_image)
+        if phat_lai:
+            he_thong.phat_lai(args.replay)
+        else:
+            he_thong.chay()
         return 0
     except KeyboardInterrupt:
         return 0
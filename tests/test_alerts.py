@@ -0,0 +1,96 @@
+"""
+Kiểm thử BoDieuPhoiCanhBao với đích giả ghi lại sự kiện: gộp tắt/bật lại
+trong thoi_gian_gop, mỗi BAT_DAU có đúng một KET_THUC (kể cả khi đóng giữa
+đợt), đích lỗi không ảnh hưởng đích khác, DichCanhBao là lớp trừu tượng.
+
+Chạy: python -m pytest tests
+"""
+
+from dataclasses import dataclass, field
+from typing import List
+import numpy as np
+import pytest
+from dms.alerts import BoDieuPhoiCanhBao, DichCanhBao, LoaiSuKien, SuKienCanhBao
+from dms.constants import AlertType
+
+
+@dataclass
+class DichGhiLai(DichCanhBao):
+    ten: str = "ghi_lai"
+    su_kien: List[SuKienCanhBao] = field(default_factory=list)
+
+    async def gui(self, su_kien: SuKienCanhBao) -> None:
+        self.su_kien.append(su_kien)
+
+
+@dataclass
+class DichLoi(DichCanhBao):
+    ten: str = "loi"
+
+    async def gui(self, su_kien: SuKienCanhBao) -> None:
+        raise RuntimeError("đích hỏng")
+
+
+def chay(cac_khung, **kw) -> List[SuKienCanhBao]:
+    """cac_khung: [(ts, tập cảnh báo đang bật)]; đóng sau khung cuối."""
+    dich = DichGhiLai()
+    with BoDieuPhoiCanhBao([dich], **kw) as dieu_phoi:
+        for ts, dang_bat in cac_khung:
+            dieu_phoi.cap_nhat(ts, dang_bat)
+    return dich.su_kien
+
+
+def test_dich_canh_bao_la_lop_truu_tuong():
+    with pytest.raises(TypeError):
+        DichCanhBao()
+
+    class DichThieuGui(DichCanhBao):
+        pass
+
+    with pytest.raises(TypeError):
+        DichThieuGui()
+
+
+def test_gop_tat_bat_lai_trong_thoi_gian_gop():
+    ngap = {AlertType.YAWN}
+    su_kien = chay([(0.0, ngap), (0.1, set()), (0.3, ngap),  # Tắt 0.2s → gộp
+                    (1.0, set()), (1.2, set()), (1.6, set())], thoi_gian_gop=0.5)
+    assert [(s.loai, s.su_kien) for s in su_kien] == [
+        (AlertType.YAWN, LoaiSuKien.BAT_DAU), (AlertType.YAWN, LoaiSuKien.KET_THUC)]
+    ket_thuc = su_kien[1]
+    assert ket_thuc.so_lan_gop == 1
+    assert ket_thuc.thoi_diem == pytest.approx(1.6)  # Phát khi hết thời gian gộp
+    assert ket_thuc.thoi_luong == pytest.approx(1.0)  # Từ lúc bật đến lúc tắt thật
+
+
+def test_tat_lau_hon_thoi_gian_gop_la_hai_dot():
+    ngap = {AlertType.YAWN}
+    su_kien = chay([(0.0, ngap), (0.2, set()), (0.8, set()), (1.0, ngap), (1.5, set()), (2.5, set())],
+                   thoi_gian_gop=0.5)
+    assert [s.su_kien for s in su_kien] == [LoaiSuKien.BAT_DAU, LoaiSuKien.KET_THUC] * 2
+    assert [s.so_lan_gop for s in su_kien if s.su_kien is LoaiSuKien.KET_THUC] == [0, 0]
+
+
+def test_moi_bat_dau_co_dung_mot_ket_thuc():
+    rng = np.random.default_rng(3)
+    cac_loai = list(AlertType)
+    cac_khung = [(i / 30, {loai for loai in cac_loai if rng.random() < 0.3}) for i in range(600)]
+    cac_khung[-1] = (cac_khung[-1][0], set(cac_loai))  # Đóng khi mọi cảnh báo đang bật
+    su_kien = chay(cac_khung, thoi_gian_gop=0.1, suc_chua=len(cac_khung))  # Không bỏ sự kiện nào
+    for loai in cac_loai:
+        cua_loai = [s for s in su_kien if s.loai is loai]
+        assert cua_loai, loai
+        # Xen kẽ BAT_DAU / KET_THUC, mở đầu bằng BAT_DAU và kết thúc bằng KET_THUC
+        assert len(cua_loai) % 2 == 0
+        assert [s.su_kien for s in cua_loai] == [LoaiSuKien.BAT_DAU, LoaiSuKien.KET_THUC] * (len(cua_loai) // 2)
+        assert all(s.thoi_luong >= 0 for s in cua_loai)
+
+
+def test_dich_loi_khong_anh_huong_dich_khac():
+    dich_tot, dich_loi = DichGhiLai(), DichLoi()
+    with BoDieuPhoiCanhBao([dich_loi, dich_tot]) as dieu_phoi:
+        dieu_phoi.cap_nhat(0.0, {AlertType.HEAD_POSE})
+    thong_ke = dieu_phoi.thong_ke()
+    assert (thong_ke['loi']['gui'], thong_ke['loi']['loi']) == (0, 2)
+    assert thong_ke['ghi_lai']['gui'] == 2
+    assert [s.su_kien for s in dich_tot.su_kien] == [LoaiSuKien.BAT_DAU, LoaiSuKien.KET_THUC]
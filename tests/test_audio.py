@@ -0,0 +1,108 @@
+"""
+Kiểm thử BoPhatAmThanh không cần thiết bị: hậu trường null (headless), gộp
+yêu cầu trùng loại khi đang phát (hậu trường giả chặn đến khi được thả),
+dự phòng xuống null khi không nạp được file âm, và cú pháp --alert-sound.
+
+Chạy: python -m pytest tests
+"""
+
+import logging
+import threading
+import pytest
+from dms import audio
+from dms.audio import BoPhatAmThanh, phan_tich_am_thanh
+from dms.constants import AlertType
+
+
+class _HauTruongCho(audio._HauTruongRong):
+    """Mỗi lần phát chặn luồng phát đến khi thả (giả một âm đang kêu)."""
+    ten = "cho"
+    dang_phat = threading.Event()
+    tha = threading.Event()
+
+    def phat(self, du_lieu):
+        type(self).dang_phat.set()
+        type(self).tha.wait(2.0)
+        return 0.0
+
+
+class _HauTruongHong(audio._HauTruongRong):
+    """Tạo được nhưng không giải mã được file nào."""
+    ten = "hong"
+
+    def nap(self, duong_dan):
+        raise RuntimeError("không giải mã được")
+
+
+@pytest.fixture
+def hau_truong_cho(monkeypatch):
+    _HauTruongCho.dang_phat = threading.Event()
+    _HauTruongCho.tha = threading.Event()
+    monkeypatch.setitem(audio._HAU_TRUONG, _HauTruongCho.ten, _HauTruongCho)
+    yield _HauTruongCho
+    _HauTruongCho.tha.set()
+
+
+def test_null_phat_va_do_do_tre():
+    bo_phat = BoPhatAmThanh({AlertType.YAWN: "ngap.wav"}, hau_truong="null")
+    bo_phat.bat_dau()
+    assert bo_phat.ten_hau_truong == "null"
+    assert bo_phat.phat(AlertType.YAWN)
+    bo_phat.dong()
+    assert bo_phat.so_yeu_cau == 1 and bo_phat.so_da_phat == 1
+    assert bo_phat.do_tre.so_mau == 1
+
+
+def test_loai_khong_co_am_hoac_chua_bat_dau_thi_khong_phat():
+    bo_phat = BoPhatAmThanh({AlertType.YAWN: "ngap.wav"}, hau_truong="null")
+    assert not bo_phat.phat(AlertType.YAWN)  # Chưa bat_dau
+    with bo_phat:
+        assert not bo_phat.phat(AlertType.HEAD_POSE)
+    assert bo_phat.so_yeu_cau == 0
+
+
+def test_dong_khi_chua_bat_dau_khong_loi():
+    BoPhatAmThanh(hau_truong="null").dong()
+
+
+def test_gop_yeu_cau_trung_loai_khi_dang_phat(hau_truong_cho):
+    with BoPhatAmThanh(mac_dinh="canh_bao.wav", hau_truong=hau_truong_cho.ten) as bo_phat:
+        assert bo_phat.phat(AlertType.YAWN)
+        assert hau_truong_cho.dang_phat.wait(2.0)
+        assert not bo_phat.phat(AlertType.YAWN)  # Đang phát → gộp
+        assert bo_phat.phat(AlertType.HEAD_POSE)  # Loại khác vẫn xếp hàng
+        assert not bo_phat.phat(AlertType.HEAD_POSE)  # Đang chờ → gộp
+        hau_truong_cho.tha.set()
+    assert bo_phat.so_yeu_cau == 4 and bo_phat.so_gop == 2
+    assert bo_phat.so_da_phat == 2
+
+
+def test_khong_nap_duoc_am_thi_roi_xuong_null_va_log_loi(monkeypatch, caplog):
+    monkeypatch.setattr(audio, "_HAU_TRUONG", {_HauTruongHong.ten: _HauTruongHong,
+                                                audio._HauTruongRong.ten: audio._HauTruongRong})
+    with caplog.at_level(logging.WARNING, logger=audio.__name__):
+        with BoPhatAmThanh(mac_dinh="canh_bao.mp3") as bo_phat:
+            assert bo_phat.ten_hau_truong == "null"
+    assert any(ban_ghi.levelno == logging.ERROR for ban_ghi in caplog.records)
+
+
+def test_chon_null_cu_the_khong_log_loi(caplog):
+    with caplog.at_level(logging.WARNING, logger=audio.__name__):
+        with BoPhatAmThanh(mac_dinh="canh_bao.mp3", hau_truong="null"):
+            pass
+    assert not caplog.records
+
+
+@pytest.mark.parametrize("chuoi, mong_doi", [
+    ("YAWN=ngap.wav", (AlertType.YAWN, "ngap.wav")),
+    ("head_pose=am/tu the.wav", (AlertType.HEAD_POSE, "am/tu the.wav")),
+    ("DROWSINESS=a=b.wav", (AlertType.DROWSINESS, "a=b.wav")),
+])
+def test_phan_tich_am_thanh(chuoi, mong_doi):
+    assert phan_tich_am_thanh(chuoi) == mong_doi
+
+
+@pytest.mark.parametrize("chuoi", ["ngap.wav", "YAWN=", "=ngap.wav", "NGAP=ngap.wav"])
+def test_phan_tich_am_thanh_sai(chuoi):
+    with pytest.raises(ValueError):
+        phan_tich_am_thanh(chuoi)
@@ -0,0 +1,98 @@
+"""
+Kiểm thử hộp đen: quay vòng ring buffer, mở lại sau khi khởi động lại (phiên
+mới, timestamp lùi), truy vấn khoảng thời gian và giữ file cũ khi đổi suc_chua.
+
+Chạy: python -m pytest tests
+"""
+
+import os
+import numpy as np
+import pytest
+from dms.black_box import BoDocHopDen, BoGhiHopDen
+from dms.results import KetQuaPhanTichMat, KetQuaTheoDoiTay
+
+MAT, TAY = KetQuaPhanTichMat(), KetQuaTheoDoiTay()
+
+
+def tao_bo_ghi(duong_dan, suc_chua):
+    # thoi_luong_gio × 3600 × fps = suc_chua bản ghi
+    return BoGhiHopDen(str(duong_dan), thoi_luong_gio=suc_chua / 3600, fps_du_kien=1.0)
+
+
+def ghi(duong_dan, cac_ts, suc_chua=10):
+    with tao_bo_ghi(duong_dan, suc_chua) as bo_ghi:
+        for ts in cac_ts:
+            bo_ghi.ghi(float(ts), MAT, TAY)
+        return bo_ghi.phien
+
+
+def ts_cua(cac_doan):
+    return [float(t) for doan in cac_doan for t in doan['timestamp']]
+
+
+@pytest.fixture
+def tep(tmp_path):
+    return tmp_path / "chuyen_di.bbox"
+
+
+def test_quay_vong_giu_suc_chua_ban_ghi_moi_nhat(tep):
+    ghi(tep, range(100, 125))
+    with BoDocHopDen(str(tep)) as doc:
+        assert doc.so_da_ghi == 25
+        assert len(doc.cac_doan()) == 2
+        assert ts_cua(doc.cac_doan()) == list(range(115, 125))
+        stt = np.concatenate(doc.cac_doan())['so_thu_tu']
+        assert list(stt) == list(range(15, 25))
+
+
+def test_mo_lai_ghi_tiep_trong_phien_moi(tep):
+    assert ghi(tep, range(100, 104)) == 0
+    assert ghi(tep, range(50, 53)) == 1
+    with BoDocHopDen(str(tep)) as doc:
+        assert doc.so_da_ghi == 7
+        assert doc.phien_hien_tai == 1
+        ban_ghi = np.concatenate(doc.cac_doan())
+        assert list(ban_ghi['timestamp']) == [100, 101, 102, 103, 50, 51, 52]
+        assert list(ban_ghi['phien']) == [0, 0, 0, 0, 1, 1, 1]
+
+
+def test_truy_van_khi_timestamp_lui_qua_phien(tep):
+    ghi(tep, range(115, 125))
+    ghi(tep, [50, 51, 52])  # Quay vòng đè 3 bản ghi cũ nhất (115-117)
+    with BoDocHopDen(str(tep)) as doc:
+        assert ts_cua(doc.khoang_thoi_gian(118, 130)) == list(range(118, 125))
+        assert ts_cua(doc.khoang_thoi_gian(50, 52)) == [50, 51]
+        assert ts_cua(doc.khoang_thoi_gian(0, 200, phien=0)) == list(range(118, 125))
+        assert ts_cua(doc.gan_nhat(1.5)) == [51, 52]
+        assert ts_cua(doc.gan_nhat(100)) == [50, 51, 52]
+
+
+def test_khoang_thoi_gian_theo_thu_tu_ghi(tep):
+    ghi(tep, [10, 12, 11, 13, 20])  # Đồng hồ nhảy lùi trong phiên
+    with BoDocHopDen(str(tep)) as doc:
+        assert ts_cua(doc.khoang_thoi_gian(11, 20)) == [12, 11, 13]
+        assert ts_cua(doc.khoang_thoi_gian()) == [10, 12, 11, 13, 20]
+        assert doc.khoang_thoi_gian(30, 40) == ()
+
+
+def test_doi_suc_chua_giu_lai_file_cu(tep):
+    ghi(tep, range(5), suc_chua=10)
+    ghi(tep, range(3), suc_chua=20)
+    cac_file = sorted(os.listdir(tep.parent))
+    assert len(cac_file) == 2
+    cu = next(ten for ten in cac_file if ten != tep.name)
+    assert cu.startswith("chuyen_di.") and cu.endswith(".bbox")
+    with BoDocHopDen(str(tep.parent / cu)) as doc:
+        assert doc.suc_chua == 10
+        assert ts_cua(doc.cac_doan()) == [0, 1, 2, 3, 4]
+    with BoDocHopDen(str(tep)) as doc:
+        assert doc.suc_chua == 20
+        assert ts_cua(doc.cac_doan()) == [0, 1, 2]
+
+
+def test_file_hong_duoc_doi_ten_khong_xoa(tep):
+    tep.write_bytes(b"khong phai hop den" * 10)
+    ghi(tep, range(3))
+    cu = [ten for ten in os.listdir(tep.parent) if ten != tep.name]
+    assert len(cu) == 1
+    assert (tep.parent / cu[0]).read_bytes() == b"khong phai hop den" * 10
@@ -0,0 +1,80 @@
+"""
+Kiểm thử bộ lọc One-Euro: BoLocOneEuroVector phải trùng khớp BoLocOneEuro
+chạy riêng từng phần tử, kể cả qua dat_lai() và khi shape đầu vào đổi.
+
+Chạy: python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+from dms.filters import BoLocOneEuro, BoLocOneEuroNhieuKenh, BoLocOneEuroVector
+
+
+def tao_chuoi(hinh_dang, so_khung, hat_giong=0):
+    """Tín hiệu nhiễu + bước nhảy, timestamp giãn cách không đều (20-60ms)."""
+    rng = np.random.default_rng(hat_giong)
+    ts = 1000.0 + np.cumsum(rng.uniform(0.02, 0.06, so_khung))
+    tin_hieu = np.cumsum(rng.normal(0.0, 0.01, (so_khung,) + hinh_dang), axis=0)
+    tin_hieu[so_khung // 2:] += 0.5
+    return ts, tin_hieu
+
+
+def loc_vo_huong(bo_loc, x, t):
+    return np.asarray(bo_loc.loc(x.ravel().tolist(), t)).reshape(x.shape)
+
+
+@pytest.mark.parametrize("hinh_dang", [(3,), (2, 21, 3), (478, 3)])
+def test_vector_trung_khop_vo_huong(hinh_dang):
+    ts, tin_hieu = tao_chuoi(hinh_dang, 120)
+    so_kenh = int(np.prod(hinh_dang))
+    vo_huong, vector = BoLocOneEuroNhieuKenh(so_kenh), BoLocOneEuroVector(so_kenh)
+    for t, x in zip(ts, tin_hieu):
+        np.testing.assert_allclose(vector.loc(x, t), loc_vo_huong(vo_huong, x, t), rtol=0, atol=1e-12)
+
+
+def test_khung_dau_tra_nguyen_gia_tri():
+    x = np.array([0.3, -1.2, 5.0])
+    ket_qua = BoLocOneEuroVector().loc(x, 10.0)
+    np.testing.assert_array_equal(ket_qua, x)
+    assert ket_qua is not x
+    assert BoLocOneEuro().loc(0.7, 10.0) == 0.7
+
+
+def test_ket_qua_khong_dung_chung_trang_thai():
+    bo_loc = BoLocOneEuroVector()
+    dau = bo_loc.loc([1.0, 2.0, 3.0], 10.0)
+    dau[:] = 99.0
+    np.testing.assert_allclose(bo_loc.loc([1.0, 2.0, 3.0], 10.05), [1.0, 2.0, 3.0])
+
+
+def test_dat_lai_bat_dau_lai_tu_khung_moi():
+    ts, tin_hieu = tao_chuoi((3,), 40, hat_giong=1)
+    vo_huong, vector = BoLocOneEuroNhieuKenh(3), BoLocOneEuroVector(3)
+    for t, x in zip(ts[:20], tin_hieu[:20]):
+        vo_huong.loc(x.tolist(), t)
+        vector.loc(x, t)
+    vo_huong.dat_lai()
+    vector.dat_lai()
+
+    # Sau dat_lai khung kế tiếp đi thẳng qua, không kéo theo trạng thái cũ
+    np.testing.assert_array_equal(vector.loc(tin_hieu[20], ts[20]), tin_hieu[20])
+    np.testing.assert_array_equal(loc_vo_huong(vo_huong, tin_hieu[20], ts[20]), tin_hieu[20])
+    for t, x in zip(ts[21:], tin_hieu[21:]):
+        np.testing.assert_allclose(vector.loc(x, t), loc_vo_huong(vo_huong, x, t), rtol=0, atol=1e-12)
+
+
+def test_doi_shape_khoi_tao_lai():
+    bo_loc = BoLocOneEuroVector()
+    ts, mat = tao_chuoi((478, 3), 10)
+    for t, x in zip(ts, mat):
+        bo_loc.loc(x, t)
+
+    # Shape mới (VD: số tay phát hiện được đổi) → coi như khung đầu
+    tay = np.full((21, 3), 0.25)
+    np.testing.assert_array_equal(bo_loc.loc(tay, ts[-1] + 0.03), tay)
+
+    # Và tiếp tục lọc như một bộ lọc mới với shape đó
+    moi = BoLocOneEuroVector()
+    moi.loc(tay, ts[-1] + 0.03)
+    tiep = tay + 0.1
+    np.testing.assert_array_equal(bo_loc.loc(tiep, ts[-1] + 0.06), moi.loc(tiep, ts[-1] + 0.06))
@@ -0,0 +1,126 @@
+"""
+Kiểm thử ghi / phát lại landmark: chạy analyze() với FaceMesh / Hands giả trả
+landmark tổng hợp, ghi bằng BoGhiDiemMoc, đọc lại bằng BoDocDiemMoc rồi đưa qua
+phan_tich_diem_moc - bản ghi tao_ban_ghi phải giống hệt từng bit.
+
+Chạy: python -m pytest tests
+"""
+
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from dms.face_analysis import PhanTichMat, SO_DIEM_MOC_TOI_DA
+from dms.hand_tracking import SO_DIEM_MOC_TAY, TheoDoiTay
+from dms.head_pose import BoUocLuongTuThe, PhuongPhapPnP
+from dms.output import tao_ban_ghi
+from dms.replay import BoDocDiemMoc, BoGhiDiemMoc, CoDiemMoc, KHOA_NOI_TAI, KHOA_TU_THE
+from dms.results import KetQuaPhanTichMat, KetQuaTheoDoiTay
+
+SO_KHUNG = 120
+CHIEU_RONG, CHIEU_CAO = 64, 48
+
+
+def _danh_sach_landmark(mang: np.ndarray) -> SimpleNamespace:
+    return SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in mang.tolist()])
+
+
+class _MoHinhGia:
+    """FaceMesh / Hands giả: mỗi process() trả kết quả kế tiếp trong danh sách."""
+
+    def __init__(self, ten_truong: str, cac_ket_qua: list):
+        self._ten_truong, self._cac_ket_qua = ten_truong, iter(cac_ket_qua)
+
+    def process(self, anh_rgb):
+        return SimpleNamespace(**{self._ten_truong: next(self._cac_ket_qua)})
+
+    def close(self):
+        pass
+
+
+def _tao_chuyen_di(rng: np.random.Generator):
+    """Landmark mặt dao động quanh một khuôn mặt (có lúc mất mặt), 0-2 tay, có lúc gần mặt."""
+    mat_goc = np.column_stack([rng.uniform(0.35, 0.65, SO_DIEM_MOC_TOI_DA),
+                               rng.uniform(0.3, 0.7, SO_DIEM_MOC_TOI_DA),
+                               rng.uniform(-0.05, 0.05, SO_DIEM_MOC_TOI_DA)])
+    cac_mat, cac_tay = [], []
+    for i in range(SO_KHUNG):
+        if i % 13 == 6:
+            cac_mat.append(None)
+        else:
+            mat = mat_goc + rng.normal(0, 0.004, mat_goc.shape)
+            cac_mat.append([_danh_sach_landmark(mat)])
+        tay = []
+        for tam in ((0.5, 0.55), (0.1, 0.2))[:i % 3]:
+            diem = np.column_stack([rng.normal(tam[0], 0.03, SO_DIEM_MOC_TAY),
+                                    rng.normal(tam[1], 0.03, SO_DIEM_MOC_TAY),
+                                    rng.normal(0, 0.02, SO_DIEM_MOC_TAY)])
+            tay.append(_danh_sach_landmark(diem))
+        cac_tay.append(tay or None)
+    return cac_mat, cac_tay
+
+
+def _tao_mo_hinh(phuong_phap: PhuongPhapPnP):
+    return (PhanTichMat(bo_uoc_luong_tu_the=BoUocLuongTuThe(phuong_phap), suy_luan=False),
+            TheoDoiTay(suy_luan=False))
+
+
+@pytest.mark.parametrize("phuong_phap", list(PhuongPhapPnP))
+def test_phat_lai_giong_het_lan_chay_that(tmp_path, phuong_phap):
+    cac_mat, cac_tay = _tao_chuyen_di(np.random.default_rng(7))
+    phan_tich_mat, theo_doi_tay = _tao_mo_hinh(phuong_phap)
+    phan_tich_mat._luoi_mat = _MoHinhGia('multi_face_landmarks', cac_mat)
+    theo_doi_tay._tay = _MoHinhGia('multi_hand_landmarks', cac_tay)
+    anh = np.zeros((CHIEU_CAO, CHIEU_RONG, 3), dtype=np.uint8)
+
+    # Lần chạy thật: cùng cách HeThongGiamSatTaiXe._xu_ly gọi analyze và ghi landmark
+    ban_ghi_that = []
+    ket_qua_mat, ket_qua_tay = KetQuaPhanTichMat(), KetQuaTheoDoiTay()
+    with BoGhiDiemMoc(str(tmp_path), so_khung_moi_lan=16) as bo_ghi:
+        for i in range(SO_KHUNG):
+            ts = 1000.0 + i / 30
+            chay_mat, chay_tay = i % 7 != 3, i % 2 == 0
+            dat_lai_tay = not chay_tay and i % 11 == 5
+            if chay_mat:
+                ket_qua_mat = phan_tich_mat.analyze(anh, ts)
+            else:
+                next(phan_tich_mat._luoi_mat._cac_ket_qua)  # Giữ landmark giả theo khung
+            if chay_tay:
+                ket_qua_tay = theo_doi_tay.analyze(anh, ket_qua_mat.khung_bbox_mat, ts)
+            else:
+                next(theo_doi_tay._tay._cac_ket_qua)
+                if dat_lai_tay:
+                    ket_qua_tay = KetQuaTheoDoiTay()
+            co = (CoDiemMoc.CHAY_MAT * chay_mat) | (CoDiemMoc.CHAY_TAY * chay_tay) \
+                | (CoDiemMoc.DAT_LAI_TAY * dat_lai_tay)
+            bo_ghi.ghi(ts, CHIEU_RONG, CHIEU_CAO, CoDiemMoc(co),
+                       ket_qua_mat if chay_mat else None, ket_qua_tay if chay_tay else None)
+            ban_ghi_that.append(tao_ban_ghi(ts, i, ket_qua_mat, ket_qua_tay))
+
+    # Phát lại: cùng vòng lặp với HeThongGiamSatTaiXe.phat_lai, mô hình mới
+    phan_tich_mat, theo_doi_tay = _tao_mo_hinh(phuong_phap)
+    ban_ghi_phat_lai = []
+    ket_qua_mat, ket_qua_tay = KetQuaPhanTichMat(), KetQuaTheoDoiTay()
+    with BoDocDiemMoc(str(tmp_path)) as bo_doc:
+        assert len(bo_doc) == SO_KHUNG
+        for i, khung in enumerate(bo_doc):
+            if CoDiemMoc.CHAY_MAT in khung.co:
+                ket_qua_mat = phan_tich_mat.phan_tich_diem_moc(
+                    khung.mat, khung.chieu_rong, khung.chieu_cao, khung.timestamp)
+            if CoDiemMoc.CHAY_TAY in khung.co:
+                ket_qua_tay = theo_doi_tay.phan_tich_diem_moc(
+                    khung.tay, khung.chieu_rong, khung.chieu_cao, ket_qua_mat.khung_bbox_mat, khung.timestamp)
+            elif CoDiemMoc.DAT_LAI_TAY in khung.co:
+                ket_qua_tay = KetQuaTheoDoiTay()
+            ban_ghi_phat_lai.append(tao_ban_ghi(khung.timestamp, i, ket_qua_mat, ket_qua_tay))
+
+    assert ban_ghi_phat_lai == ban_ghi_that
+    assert any(b[-1] for b in ban_ghi_that)  # Có khung bật cờ (mặt / tay gần mặt), không chỉ toàn 0
+
+
+def test_meta_luu_cau_hinh_phan_tich(tmp_path):
+    phan_tich = {KHOA_TU_THE: PhuongPhapPnP.SQPNP.value, KHOA_NOI_TAI: "/xe/camera.npz"}
+    with BoGhiDiemMoc(str(tmp_path), phan_tich=phan_tich):
+        pass
+    with BoDocDiemMoc(str(tmp_path)) as bo_doc:
+        assert bo_doc.phan_tich == phan_tich
+        assert len(bo_doc) == 0
@@ -0,0 +1,62 @@
+"""
+Kiểm thử nap_diem_moc: đường nhanh đọc bytes protobuf chỉ dùng khi mọi bản
+ghi đúng bố cục; bản ghi khác kích thước hoặc khác thứ tự trường thì duyệt
+.x/.y/.z và vẫn ra đúng giá trị.
+
+Chạy: python -m pytest tests
+"""
+
+import struct
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from dms.results import nap_diem_moc
+
+DIEM = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6], [0.7, 0.8, 0.9]], dtype=np.float32)
+
+
+def ban_ghi_pb(x, y, z, tuy_chon=(), thu_tu=(0x0D, 0x15, 0x1D)):
+    """Một NormalizedLandmark đã serialize; tuy_chon: tag 0x25 (visibility) / 0x2D (presence)."""
+    gia_tri = dict(zip((0x0D, 0x15, 0x1D), (x, y, z)))
+    than = b"".join(struct.pack('<Bf', the, gia_tri[the]) for the in thu_tu)
+    than += b"".join(struct.pack('<Bf', the, 1.0) for the in tuy_chon)
+    return struct.pack('<BB', 0x0A, len(than)) + than
+
+
+class DanhSachGia:
+    """Giả lập NormalizedLandmarkList: .landmark và SerializeToString()."""
+
+    def __init__(self, diem, cac_ban_ghi):
+        self.landmark = [SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in diem]
+        self._bytes = b"".join(cac_ban_ghi)
+
+    def SerializeToString(self):
+        return self._bytes
+
+
+@pytest.mark.parametrize("tuy_chon", [(), (0x25,), (0x25, 0x2D)])
+def test_ban_ghi_dong_nhat(tuy_chon):
+    ds = DanhSachGia(DIEM, [ban_ghi_pb(*d, tuy_chon=tuy_chon) for d in DIEM])
+    np.testing.assert_array_equal(nap_diem_moc(ds, np.zeros((478, 3), np.float32)), DIEM)
+
+
+def test_kich_thuoc_khac_nhau_nhung_tong_do_dai_khop():
+    # 22 + 17 + 27 = 3 × 22: tổng độ dài khớp kích thước của bản ghi đầu
+    cac_ban_ghi = [ban_ghi_pb(*DIEM[0], tuy_chon=(0x25,)), ban_ghi_pb(*DIEM[1]),
+                   ban_ghi_pb(*DIEM[2], tuy_chon=(0x25, 0x2D))]
+    assert sum(map(len, cac_ban_ghi)) == 3 * len(cac_ban_ghi[0])
+    ds = DanhSachGia(DIEM, cac_ban_ghi)
+    np.testing.assert_array_equal(nap_diem_moc(ds, np.zeros((478, 3), np.float32)), DIEM)
+
+
+def test_thu_tu_truong_khac():
+    ds = DanhSachGia(DIEM, [ban_ghi_pb(*d, thu_tu=(0x15, 0x0D, 0x1D)) for d in DIEM])
+    np.testing.assert_array_equal(nap_diem_moc(ds, np.zeros((478, 3), np.float32)), DIEM)
+
+
+def test_day_landmark_thuong_va_cat_theo_dich():
+    ds = [SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in DIEM]
+    dich = np.zeros((2, 3), np.float32)
+    ket_qua = nap_diem_moc(ds, dich)
+    np.testing.assert_array_equal(ket_qua, DIEM[:2])
+    assert ket_qua.base is dich or ket_qua is dich
@@ -0,0 +1,85 @@
+"""
+Kiểm thử GiamSatDaCamera với worker giả thoát ngay (tiến trình spawn thật):
+nguồn hữu hạn thoát 0 là xong, nguồn trực tiếp khởi động lại với mọi mã thoát,
+đếm khởi động lại được đặt lại sau khi worker chạy ổn định.
+
+Chạy: python -m pytest tests
+"""
+
+import sys
+from dms.supervisor import GiamSatDaCamera, la_nguon_huu_han
+
+CHO_TOI_DA = 0.01  # Backoff gần như bằng 0 cho kiểm thử nhanh
+
+
+def thoat_loi(nguon, bao_cao):
+    sys.exit(3)
+
+
+def thoat_binh_thuong(nguon, bao_cao):
+    bao_cao({'fps': 1.0})
+
+
+def tao_giam_sat(nguon, ham_worker, **kw):
+    kw.setdefault('so_lan_khoi_dong_lai_toi_da', 2)
+    return GiamSatDaCamera(nguon, ham_worker, ghim_nhan=False, cho_toi_da=CHO_TOI_DA,
+                           chu_ky_bao_cao=1e9, **kw)
+
+
+def test_la_nguon_huu_han(tmp_path):
+    video = tmp_path / "chuyen_di.mp4"
+    video.write_bytes(b"")
+    assert la_nguon_huu_han(str(video))
+    assert la_nguon_huu_han(str(tmp_path))
+    assert not la_nguon_huu_han("0")
+    assert not la_nguon_huu_han("rtsp://camera/luong")
+
+
+def test_worker_chet_lien_tuc_thi_bo_cuoc():
+    giam_sat = tao_giam_sat(["0"], thoat_loi)
+    giam_sat.chay()
+    trang_thai, = giam_sat.trang_thai()
+    assert trang_thai['da_xong'] and trang_thai['khoi_dong_lai'] == 2
+
+
+def test_nguon_huu_han_thoat_0_la_xong(tmp_path):
+    video = tmp_path / "chuyen_di.mp4"
+    video.write_bytes(b"")
+    giam_sat = tao_giam_sat([str(video)], thoat_binh_thuong)
+    giam_sat.chay()
+    assert giam_sat.trang_thai()[0]['khoi_dong_lai'] == 0
+
+
+def test_nguon_truc_tiep_thoat_0_van_khoi_dong_lai():
+    giam_sat = tao_giam_sat(["0"], thoat_binh_thuong, so_lan_khoi_dong_lai_toi_da=1)
+    giam_sat.chay()
+    assert giam_sat.trang_thai()[0]['khoi_dong_lai'] == 1
+
+
+def test_dat_lai_dem_sau_khi_chay_on_dinh():
+    gio = [1000.0]
+    giam_sat = tao_giam_sat(["0"], thoat_loi, thoi_gian_on_dinh=60.0, dong_ho=lambda: gio[0])
+    cam = giam_sat._camera[0]
+
+    def cho_thoat_roi_kiem_tra(chay_them):
+        cam.tien_trinh.join(30)
+        gio[0] += chay_them  # Thời gian worker đã chạy trước khi thoát
+        giam_sat._kiem_tra_worker()  # Phát hiện thoát, hẹn khởi động lại
+        gio[0] += CHO_TOI_DA
+        giam_sat._kiem_tra_worker()  # Khởi động lại (hoặc bỏ cuộc)
+
+    try:
+        giam_sat._khoi_dong(0)
+        cho_thoat_roi_kiem_tra(1.0)
+        cho_thoat_roi_kiem_tra(1.0)
+        assert cam.so_lan_khoi_dong_lai == 2 and not cam.da_xong
+        # Chạy ổn định 2 phút rồi mới chết → không bỏ cuộc, đếm lại từ 1
+        cho_thoat_roi_kiem_tra(120.0)
+        assert not cam.da_xong and cam.so_lan_khoi_dong_lai == 1
+        # Chết ngay lần nữa vẫn được khởi động lại; lần tiếp theo mới vượt giới hạn
+        cho_thoat_roi_kiem_tra(1.0)
+        assert not cam.da_xong and cam.so_lan_khoi_dong_lai == 2
+        cho_thoat_roi_kiem_tra(1.0)
+        assert cam.da_xong
+    finally:
+        giam_sat.dung()